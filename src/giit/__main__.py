@@ -19,9 +19,39 @@ import giit.factory
 @click.option(
     "variables", "--variable", nargs=2, type=click.Tuple([str, str]), multiple=True
 )
+@click.option("-j", "--jobs", default=1, type=click.IntRange(min=1))
+@click.option("--artifact_budget", type=click.IntRange(min=0))
+@click.option("--clone_filter")
+@click.option("--clone_depth", type=click.IntRange(min=1))
+@click.option("sparse_paths", "--sparse_path", multiple=True)
+@click.option("--mirror_path", envvar="GIIT_MIRROR_PATH")
+@click.option("--checkout_backend", type=click.Choice(["reset", "worktree", "archive"]))
+@click.option(
+    "--pip_refresh",
+    type=click.Choice(["always", "once", "daily", "never"]),
+    default="once",
+    show_default=True,
+)
+@click.option(
+    "--pip_install",
+    type=click.Choice(["index", "wheelhouse", "offline"]),
+    default="index",
+    show_default=True,
+)
+@click.option(
+    "--command_runner",
+    type=click.Choice(["subprocess", "asyncio"]),
+    default="subprocess",
+    show_default=True,
+)
+@click.option("--timeout", type=click.FloatRange(min=0, min_open=True))
+@click.option("--task_timeout", type=click.FloatRange(min=0, min_open=True))
+@click.option("--resume", is_flag=True)
+@click.option("--gc_max_age", type=click.IntRange(min=0))
+@click.option("--gc_max_size", type=click.IntRange(min=0))
 @click.option("-v", "--verbose", is_flag=True)
 @click.argument("step")
-@click.argument("repository")
+@click.argument("repository", required=False)
 def cli(
     step,
     repository,
@@ -31,9 +61,27 @@ def cli(
     config_path,
     task_filters,
     variables,
+    jobs,
+    artifact_budget,
+    clone_filter,
+    clone_depth,
+    sparse_paths,
+    mirror_path,
+    checkout_backend,
+    pip_refresh,
+    pip_install,
+    command_runner,
+    timeout,
+    task_timeout,
+    resume,
+    gc_max_age,
+    gc_max_size,
     verbose,
 ):
 
+    if not repository and step != "gc":
+        raise click.UsageError("Missing argument 'REPOSITORY'.")
+
     build = giit.build.Build(
         step=step,
         repository=repository,
@@ -45,6 +93,21 @@ def cli(
         task_filters=task_filters,
         variables=variables,
         verbose=verbose,
+        jobs=jobs,
+        artifact_budget=artifact_budget,
+        clone_filter=clone_filter,
+        clone_depth=clone_depth,
+        sparse_paths=list(sparse_paths),
+        mirror_path=mirror_path,
+        checkout_backend=checkout_backend,
+        pip_refresh=pip_refresh,
+        pip_install=pip_install,
+        command_runner=command_runner,
+        timeout=timeout,
+        task_timeout=task_timeout,
+        resume=resume,
+        gc_max_age=gc_max_age,
+        gc_max_size=gc_max_size,
     )
 
     try:
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import stat
+import shutil
+import hashlib
+import threading
+
+import giit.file_lock
+
+
+class ArtifactStore(object):
+    """Content addressed store for the output of the tasks.
+
+    The store has the following layout:
+
+        store_path/objects/<xx>/<hash>  The unique files stored by content
+        store_path/<key>/...            A snapshot of a task output where
+                                        every file is a hardlink to an object
+
+    Identical files in different snapshots share the same object, so e.g.
+    the static assets of Sphinx builds for different tags are only stored
+    once. The modification time of a snapshot directory is used to track
+    when it was last used.
+
+    The store may be shared by several giit processes. Storing and
+    restoring take a shared lock on store_path.lock, evicting takes an
+    exclusive lock, such that objects are not removed while linked.
+    """
+
+    def __init__(self, store_path, size_budget, log):
+        """Create a new store.
+
+        :param store_path: The path to the store directory as a string
+        :param size_budget: The maximum size of the stored objects in bytes
+            or None if the store should not be limited.
+        :param log: A logging object
+        """
+        self.store_path = os.path.abspath(os.path.expanduser(store_path))
+        self.objects_path = os.path.join(self.store_path, "objects")
+        self.size_budget = size_budget
+        self.log = log
+        self.lock_path = self.store_path + ".lock"
+
+    def contains(self, key):
+        """:return: True if a snapshot for the key exists otherwise False"""
+        return os.path.isdir(self._snapshot_path(key=key))
+
+    def store(self, key, path):
+        """Snapshot the directory path under the key.
+
+        :param key: The key of the task as a string
+        :param path: The output directory of the task
+        """
+        with giit.file_lock.FileLock(path=self.lock_path, shared=True):
+            self._store(key=key, path=path)
+
+        self.log.debug("Stored %s as %s", path, key)
+
+    def _store(self, key, path):
+
+        snapshot_path = self._snapshot_path(key=key)
+
+        if os.path.isdir(snapshot_path):
+            self._touch(path=snapshot_path)
+            return
+
+        # Build the snapshot in a temporary directory, such that an
+        # interrupted snapshot is never mistaken for a complete one
+        temp_path = "{}.tmp-{}-{}".format(
+            snapshot_path, os.getpid(), threading.get_ident()
+        )
+
+        for root, dirs, files in os.walk(path):
+
+            relative_root = os.path.relpath(root, path)
+            snapshot_root = os.path.normpath(os.path.join(temp_path, relative_root))
+
+            os.makedirs(snapshot_root, exist_ok=True)
+
+            for filename in files:
+                from_file = os.path.join(root, filename)
+                to_file = os.path.join(snapshot_root, filename)
+
+                if os.path.islink(from_file):
+                    os.symlink(os.readlink(from_file), to_file)
+                    continue
+
+                object_path = self._add_object(filename=from_file)
+                self._link(from_file=object_path, to_file=to_file)
+
+        try:
+            os.rename(temp_path, snapshot_path)
+        except OSError:
+            # Someone else stored the same key in the meantime
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+    def restore(self, key, path):
+        """Restore the snapshot of key into the directory path.
+
+        The files are hardlinked from the store. Anything already in the
+        output directory is removed, such that it holds exactly the files
+        of the snapshot.
+
+        :param key: The key of the task as a string
+        :param path: The output directory of the task
+        :return: True if the snapshot was restored, False if it is not in
+            the store e.g. because it was evicted
+        """
+        with giit.file_lock.FileLock(path=self.lock_path, shared=True):
+
+            if not self.contains(key=key):
+                return False
+
+            self._restore(key=key, path=path)
+
+        self.log.debug("Restored %s into %s", key, path)
+        return True
+
+    def _restore(self, key, path):
+
+        snapshot_path = self._snapshot_path(key=key)
+
+        # Restore into a temporary directory next to the output and swap it
+        # into place, such that an interrupted restore never leaves a mix
+        # of old and restored files behind
+        path = os.path.abspath(path)
+        temp_path = "{}.giit-restore-{}-{}".format(
+            path, os.getpid(), threading.get_ident()
+        )
+
+        for root, dirs, files in os.walk(snapshot_path):
+
+            relative_root = os.path.relpath(root, snapshot_path)
+            output_root = os.path.normpath(os.path.join(temp_path, relative_root))
+
+            os.makedirs(output_root, exist_ok=True)
+
+            for filename in files:
+                from_file = os.path.join(root, filename)
+                to_file = os.path.join(output_root, filename)
+
+                if os.path.islink(from_file):
+                    os.symlink(os.readlink(from_file), to_file)
+                else:
+                    self._link(from_file=from_file, to_file=to_file)
+
+        if os.path.lexists(path):
+            shutil.rmtree(path)
+
+        os.rename(temp_path, path)
+
+        self._touch(path=snapshot_path)
+
+    def detach(self, path):
+        """Replace the hardlinked files in path with copies.
+
+        Files restored from the store share their content with the store.
+        This must be called before a task writes to its output directory,
+        otherwise the stored objects could be modified.
+
+        :param path: The output directory of the task
+        """
+        for root, dirs, files in os.walk(path):
+            for filename in files:
+                filepath = os.path.join(root, filename)
+                info = os.lstat(filepath)
+
+                if not stat.S_ISREG(info.st_mode) or info.st_nlink == 1:
+                    continue
+
+                temp_file = filepath + ".giit-detach"
+                shutil.copy2(filepath, temp_file)
+                os.replace(temp_file, filepath)
+
+    def size(self):
+        """:return: The size of the stored objects in bytes"""
+
+        size = 0
+
+        for root, dirs, files in os.walk(self.objects_path):
+            for filename in files:
+                size += os.lstat(os.path.join(root, filename)).st_size
+
+        return size
+
+    def evict(self):
+        """Remove the least recently used snapshots until the objects fit
+        in the size budget.
+        """
+        if self.size_budget is None or not os.path.isdir(self.objects_path):
+            return
+
+        with giit.file_lock.FileLock(path=self.lock_path):
+            self._evict()
+
+    def _evict(self):
+
+        # Find the objects by inode. For each we count how many snapshots
+        # use it, so we know how much is freed by removing a snapshot.
+        objects = {}
+
+        for root, dirs, files in os.walk(self.objects_path):
+            for filename in files:
+                object_path = os.path.join(root, filename)
+                info = os.lstat(object_path)
+                objects[info.st_ino] = [object_path, info.st_size, 0]
+
+        size = sum(size for _, size, _ in objects.values())
+
+        if size <= self.size_budget:
+            return
+
+        snapshots = []
+
+        for key in os.listdir(self.store_path):
+
+            if key == "objects" or ".tmp-" in key:
+                continue
+
+            snapshot_path = self._snapshot_path(key=key)
+            inodes = self._snapshot_inodes(path=snapshot_path)
+
+            for inode in inodes:
+                if inode in objects:
+                    objects[inode][2] += 1
+
+            snapshots.append((os.stat(snapshot_path).st_mtime, key, inodes))
+
+        # Objects not used by any snapshot are removed regardless
+        size = sum(size for _, size, users in objects.values() if users > 0)
+
+        # Oldest first
+        snapshots.sort()
+
+        for _, key, inodes in snapshots:
+
+            if size <= self.size_budget:
+                break
+
+            self.log.info("Evicting %s from the artifact store", key)
+            shutil.rmtree(self._snapshot_path(key=key))
+
+            for inode in inodes:
+                if inode not in objects:
+                    continue
+
+                objects[inode][2] -= 1
+
+                if objects[inode][2] == 0:
+                    size -= objects[inode][1]
+
+        for object_path, _, users in objects.values():
+            if users == 0:
+                os.remove(object_path)
+
+    @staticmethod
+    def _snapshot_inodes(path):
+        """:return: The set of inodes of the files in the snapshot"""
+
+        inodes = set()
+
+        for root, dirs, files in os.walk(path):
+            for filename in files:
+                inodes.add(os.lstat(os.path.join(root, filename)).st_ino)
+
+        return inodes
+
+    def _add_object(self, filename):
+        """Add the file to the objects if its content is not already there.
+
+        :return: The path to the object
+        """
+        digest = self._hash(filename=filename)
+        object_path = os.path.join(self.objects_path, digest[:2], digest)
+
+        if os.path.isfile(object_path):
+            return object_path
+
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+
+        # We copy rather than link the file, the output directory is
+        # written to by the next build of the task
+        temp_file = "{}.tmp-{}-{}".format(
+            object_path, os.getpid(), threading.get_ident()
+        )
+        shutil.copy2(filename, temp_file)
+        os.replace(temp_file, object_path)
+
+        return object_path
+
+    @staticmethod
+    def _hash(filename):
+        """:return: The hash of the content and executable bit of the file"""
+
+        sha1 = hashlib.sha1()
+
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha1.update(chunk)
+
+        # Files with the same content but different permissions are stored
+        # as different objects
+        if os.stat(filename).st_mode & stat.S_IXUSR:
+            sha1.update(b"executable")
+
+        return sha1.hexdigest()
+
+    @staticmethod
+    def _link(from_file, to_file):
+        try:
+            os.link(from_file, to_file)
+        except OSError:
+            # Hardlinks are not supported by all file systems
+            shutil.copy2(from_file, to_file)
+
+    @staticmethod
+    def _touch(path):
+        os.utime(path, None)
+
+    def _snapshot_path(self, key):
+        return os.path.join(self.store_path, key)
@@ -0,0 +1,392 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import shlex
+import asyncio
+import logging
+import threading
+import subprocess
+import collections
+import locale
+import time
+
+from . import compat
+from . import logs
+from . import prompt
+from . import run_result
+from . import run_error
+
+
+class AsyncPrompt(object):
+    """Runs the commands as asyncio subprocesses in a single event loop.
+
+    The event loop runs in a background thread, so run(...) can be called
+    from any thread like giit.prompt.Prompt.run(...). Coroutines can use
+    run_async(...) directly.
+
+    The number of processes running at once is limited by a global limit
+    and a limit per category of command:
+
+    * git: The git commands.
+    * pip: The pip commands.
+    * scripts: Everything else e.g. the scripts of a step.
+
+    The resource usage of the processes is not available, so only the wall
+    clock time and output size is recorded in the report.
+    """
+
+    # The number of output lines kept in the RunResult of a streamed command
+    TAIL_LINES = 100
+
+    # The maximum length of a line in a streamed output
+    LINE_LIMIT = 1024 * 1024
+
+    def __init__(
+        self,
+        cwd=None,
+        env=None,
+        log=None,
+        report=None,
+        max_processes=None,
+        limits=None,
+    ):
+        """Create a new prompt.
+
+        :param cwd: The default working directory of the commands
+        :param env: The default environment of the commands as a dict
+        :param log: A logging object
+        :param report: The giit.run_report.RunReport recording the commands
+            or None
+        :param max_processes: The maximum number of processes running at
+            once or None for no limit.
+        :param limits: Dict with the maximum number of processes running at
+            once per category e.g. {"pip": 2}. Categories not in the dict
+            are not limited.
+        """
+        self.cwd = cwd if cwd else os.getcwd()
+        self.env = env if env else dict(os.environ)
+        self.log = log if log else logging.getLogger(__name__)
+        self.report = report
+
+        self.max_processes = max_processes
+        self.limits = limits or {}
+
+        # The semaphores are created in the event loop when first used, since
+        # before Python 3.10 they are bound to the loop of the thread
+        # creating them
+        self.semaphore = None
+        self.semaphores = None
+
+        # The event loop is started when the first command is run
+        self.loop = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def run(self, command, stream=False, timeout=None, **kwargs):
+        """Runs the command, blocking the calling thread until it exits.
+
+        :param command: String or list of arguments
+        :param stream: If True the output is logged line by line while the
+            command runs, see giit.prompt.Prompt.run(...)
+        :param timeout: The time in seconds the command may take or None,
+            see giit.prompt.Prompt.run(...)
+        :param kwargs: Keyword arguments passed to the subprocess e.g. cwd
+            and env
+        :return: A RunResult object representing the result of the command
+        """
+        # The task log, name and timeout belong to the calling thread, not
+        # the event loop
+        log_file = logs.task_log_file()
+        task = logs.task_name()
+        timeout = prompt.command_timeout(timeout=timeout)
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(
+                command=command,
+                stream=stream,
+                timeout=timeout,
+                log_file=log_file,
+                task=task,
+                **kwargs
+            ),
+            self._start(),
+        )
+
+        return self._check(result=future.result(), stream=stream, timeout=timeout)
+
+    async def run_async(self, command, stream=False, timeout=None, **kwargs):
+        """Runs the command in the event loop of the prompt.
+
+        Must be awaited in the event loop of the prompt, see
+        run_coroutine(...).
+
+        :param command: String or list of arguments
+        :param stream: If True the output is logged line by line while the
+            command runs
+        :param timeout: The time in seconds the command may take or None
+        :param kwargs: Keyword arguments passed to the subprocess
+        :return: A RunResult object representing the result of the command
+        """
+        result = await self._run(
+            command=command, stream=stream, timeout=timeout, **kwargs
+        )
+
+        return self._check(result=result, stream=stream, timeout=timeout)
+
+    def run_coroutine(self, coroutine):
+        """Run the coroutine in the event loop of the prompt.
+
+        :return: The result of the coroutine
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._start()).result()
+
+    def close(self):
+        """Stop the event loop"""
+
+        with self.lock:
+            if not self.loop:
+                return
+
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+
+            self.loop = None
+            self.thread = None
+
+    def _start(self):
+        """:return: The event loop, started if not already running"""
+
+        with self.lock:
+            if self.loop:
+                return self.loop
+
+            self.loop = asyncio.new_event_loop()
+
+            # The thread does not keep the process alive if close(...) is
+            # never called
+            self.thread = threading.Thread(
+                target=self.loop.run_forever, name="giit-prompt", daemon=True
+            )
+            self.thread.start()
+
+            return self.loop
+
+    def _check(self, result, stream, timeout):
+        """Record the result and raise RunError if the command failed.
+
+        :return: The result
+        """
+        if self.report:
+            self.report.add_command(run_result=result)
+
+        if stream and result.returncode != 0:
+            prompt.log_failed_output(log=self.log, result=result)
+
+        if result.timed_out:
+            raise run_error.RunTimeoutError(result, timeout=timeout)
+
+        if result.returncode != 0:
+            raise run_error.RunError(result)
+
+        return result
+
+    async def _run(
+        self, command, stream=False, timeout=None, log_file=None, task=None, **kwargs
+    ):
+        """Run the command once the limits allow it.
+
+        :param log_file: The log file of the task running the command or None
+        :param task: The name of the task running the command or None, used
+            to prefix the logged output
+        :return: A RunResult object representing the result of the command
+        """
+        if self.semaphores is None:
+            if self.max_processes:
+                self.semaphore = asyncio.Semaphore(self.max_processes)
+
+            self.semaphores = {
+                category: asyncio.Semaphore(limit)
+                for category, limit in self.limits.items()
+            }
+
+        # The category is acquired first, so a command waiting for its
+        # category does not hold a global slot
+        semaphores = [self.semaphores.get(_category(command)), self.semaphore]
+
+        async with _Acquired([s for s in semaphores if s]):
+            return await self._spawn(
+                command=command,
+                stream=stream,
+                timeout=timeout,
+                log_file=log_file,
+                task=task,
+                **kwargs
+            )
+
+    async def _spawn(self, command, stream, timeout, log_file, task, **kwargs):
+
+        kwargs.setdefault("env", self.env)
+        kwargs.setdefault("cwd", self.cwd)
+        kwargs.setdefault("stdout", subprocess.PIPE)
+        kwargs.setdefault("stderr", subprocess.PIPE)
+
+        if stream:
+            kwargs["stdout"] = subprocess.PIPE
+            kwargs["stderr"] = subprocess.STDOUT
+            kwargs["limit"] = AsyncPrompt.LINE_LIMIT
+
+        if timeout is not None:
+            # Run the command in its own process group, such that the
+            # processes it starts can be killed with it
+            kwargs["start_new_session"] = True
+
+        self.log.debug(
+            "command=%s, cwd=%s", command, kwargs["cwd"], extra={"task_name": task}
+        )
+
+        start_time = time.time()
+
+        if isinstance(command, compat.string_type):
+            process = await asyncio.create_subprocess_shell(command, **kwargs)
+        else:
+            process = await asyncio.create_subprocess_exec(*command, **kwargs)
+            command = " ".join(command)
+
+        # Killing the processes closes their output, so reading the output
+        # stops in both modes
+        timer = None
+        timed_out = []
+
+        def kill():
+            timed_out.append(True)
+            prompt.kill_process_group(pid=process.pid)
+
+        if timeout is not None:
+            timer = asyncio.get_running_loop().call_later(timeout, kill)
+
+        try:
+            if stream:
+                stdout, stderr, output_bytes = await self._stream(
+                    process=process, command=command, log_file=log_file, task=task
+                )
+            else:
+                stdout, stderr = await process.communicate()
+                output_bytes = sum(len(o) for o in (stdout, stderr) if o)
+                stdout = _decode(stdout)
+                stderr = _decode(stderr)
+
+            await process.wait()
+        finally:
+            if timer:
+                timer.cancel()
+
+        return run_result.RunResult(
+            command=command,
+            path=kwargs["cwd"],
+            stdout=stdout,
+            stderr=stderr,
+            returncode=process.returncode,
+            time=time.time() - start_time,
+            env=kwargs["env"],
+            output_bytes=output_bytes,
+            timed_out=bool(timed_out) and process.returncode != 0,
+        )
+
+    async def _stream(self, process, command, log_file, task):
+        """Forward the output of the process line by line until it closes.
+
+        :return: Tuple with the last lines of the output, an empty standard
+            error (it is merged into the output) and the size of the output
+            in bytes.
+        """
+        tail = collections.deque(maxlen=AsyncPrompt.TAIL_LINES)
+        output_bytes = 0
+
+        if log_file:
+            log_file.write("$ {}\n".format(command))
+
+        while True:
+            line = await _readline(process.stdout)
+
+            if not line:
+                break
+
+            output_bytes += len(line)
+            line = _decode(line)
+            tail.append(line)
+
+            if log_file:
+                log_file.write(line)
+                log_file.flush()
+
+            self.log.debug("%s", line.rstrip("\n"), extra={"task_name": task})
+
+        return "".join(tail), "", output_bytes
+
+
+class _Acquired(object):
+    """Asynchronous context manager acquiring several semaphores"""
+
+    def __init__(self, semaphores):
+        self.semaphores = semaphores
+
+    async def __aenter__(self):
+        for semaphore in self.semaphores:
+            await semaphore.acquire()
+
+    async def __aexit__(self, *args):
+        for semaphore in reversed(self.semaphores):
+            semaphore.release()
+
+
+def _category(command):
+    """:return: The category of the command: git, pip or scripts"""
+
+    if isinstance(command, compat.string_type):
+        try:
+            args = shlex.split(command)
+        except ValueError:
+            args = command.split()
+    else:
+        args = list(command)
+
+    if not args:
+        return "scripts"
+
+    program = os.path.basename(args[0])
+
+    if program in ("git", "git.exe"):
+        return "git"
+
+    if program.startswith("pip") or args[1:3] == ["-m", "pip"]:
+        return "pip"
+
+    return "scripts"
+
+
+async def _readline(stream):
+    """:return: The next line of the stream. A line longer than the limit
+    of the stream is returned in chunks. At the end of the stream an empty
+    bytes object is returned.
+    """
+    try:
+        return await stream.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:
+        # The last line did not end with a newline
+        return e.partial
+    except asyncio.LimitOverrunError as e:
+        return await stream.read(e.consumed)
+
+
+def _decode(output):
+    """:return: The output as a string with universal newlines like
+    subprocess.Popen(..., universal_newlines=True)
+    """
+    if output is None:
+        return None
+
+    text = output.decode(locale.getpreferredencoding(False), errors="replace")
+
+    return text.replace("\r\n", "\n").replace("\r", "\n")
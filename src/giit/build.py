@@ -4,12 +4,19 @@
 import tempfile
 import os
 import fnmatch
+import itertools
 import logging
 import shutil
+import time
 
 import giit.logs
+import giit.prompt
 import giit.giit_json
 import giit.config
+import giit.refspecs
+import giit.run_report
+import giit.task_graph
+import giit.variables_reader
 
 
 class Build(object):
@@ -25,6 +32,21 @@ class Build(object):
         task_filters=None,
         variables=[],
         verbose=False,
+        jobs=1,
+        artifact_budget=None,
+        clone_filter=None,
+        clone_depth=None,
+        sparse_paths=None,
+        mirror_path=None,
+        checkout_backend=None,
+        pip_refresh="once",
+        pip_install="index",
+        command_runner="subprocess",
+        timeout=None,
+        task_timeout=None,
+        resume=False,
+        gc_max_age=None,
+        gc_max_size=None,
     ):
 
         self.step = step
@@ -37,6 +59,21 @@ class Build(object):
         self.task_filters = task_filters
         self.extra_variables = variables
         self.verbose = verbose
+        self.jobs = jobs
+        self.artifact_budget = artifact_budget
+        self.clone_filter = clone_filter
+        self.clone_depth = clone_depth
+        self.sparse_paths = sparse_paths
+        self.mirror_path = mirror_path
+        self.checkout_backend = checkout_backend
+        self.pip_refresh = pip_refresh
+        self.pip_install = pip_install
+        self.command_runner = command_runner
+        self.timeout = timeout
+        self.task_timeout = task_timeout
+        self.resume = resume
+        self.gc_max_age = gc_max_age
+        self.gc_max_size = gc_max_size
 
     def _expand_path(self, path):
         if path:
@@ -64,97 +101,536 @@ class Build(object):
         log.debug("giit_path=%s", self.giit_path)
         log.debug("config_branch=%s", self.config_branch)
         log.debug("config_path=%s", self.config_path)
+        log.debug("jobs=%s", self.jobs)
 
         log.info("Lets go: %s", self.step)
 
+        # The gc step does not use the repository
+        if self.step == "gc":
+            self._collect_garbage()
+            return
+
+        # Records the time and resources used by the tasks and commands
+        self.report = giit.run_report.RunReport(
+            log=logging.getLogger("giit.run_report")
+        )
+
+        # All commands are run by the same prompt
+        self.prompt = self.factory.prompt_factory(
+            command_runner=self.command_runner, jobs=self.jobs, run_report=self.report
+        ).build()
+
         # Resolve the repository
         factory = self.factory.resolve_factory(
-            giit_path=self.giit_path, repository=self.repository
+            giit_path=self.giit_path,
+            repository=self.repository,
+            jobs=self.jobs,
+            clone_filter=self.clone_filter,
+            clone_depth=self.clone_depth,
+            sparse_paths=self.sparse_paths,
+            mirror_path=self.mirror_path,
+            checkout_backend=self.checkout_backend,
+            run_report=self.report,
         )
 
+        factory.provide_value(name="prompt", value=self.prompt, override=True)
+
         git_repository = factory.build()
 
-        # Set the build path
-        if not self.build_path:
-            self.build_path = os.path.join(
-                self.giit_path, "build", git_repository.unique_name()
+        # The garbage collector must not remove the clone while we use it
+        with git_repository.use_lock():
+
+            # Set the build path
+            if not self.build_path:
+                self.build_path = os.path.join(
+                    self.giit_path, "build", git_repository.unique_name()
+                )
+
+            # If the step is clean we do it without fetching or cloning
+            if self.step == "clean":
+
+                log.info("Cleaning: %s", self.build_path)
+
+                if os.path.isdir(self.build_path):
+                    shutil.rmtree(self.build_path, ignore_errors=True)
+
+                return
+
+            # Make sure the build directory exists
+            if not os.path.isdir(self.build_path):
+                os.makedirs(self.build_path)
+
+            log.info("Building into: %s", self.build_path)
+
+            # Make sure the repository is available
+            git_repository.clone()
+
+            # Read the 'giit.json'
+            json_config = giit.giit_json.GiitJson(
+                git_repository=git_repository,
+                log=logging.getLogger("giit.giit_json"),
+                config_path=self.config_path,
+                config_branch=self.config_branch,
             )
 
-        # If the step is clean we do it without fetching or cloning
-        if self.step == "clean":
+            json_config = json_config.read()
 
-            log.info("Cleaning: %s", self.build_path)
+            # The step and the steps it needs, each step after the steps it needs
+            steps = self._resolve_steps(json_config=json_config)
 
-            if os.path.isdir(self.build_path):
-                shutil.rmtree(self.build_path, ignore_errors=True)
+            log.info("Steps: %s", ", ".join(step for step, _ in steps))
 
-            return
+            configs = [subconfig for _, config in steps for subconfig in config]
+
+            # Fetch what the filters can match
+            current_branch = None
 
-        # Make sure the build directory exists
-        if not os.path.isdir(self.build_path):
-            os.makedirs(self.build_path)
+            if any(c["branches"]["source_branch"] for c in configs):
+                current_branch = git_repository.current_branch()
 
-        log.info("Building into: %s", self.build_path)
+            refspecs, tags = giit.refspecs.from_configs(
+                configs=configs, current_branch=current_branch
+            )
+
+            git_repository.sync(refspecs=refspecs, tags=tags)
+
+            # Get the tasks for all the substeps of all the steps. The tasks of a
+            # step depend on all the tasks of the steps it needs.
+            graph = giit.task_graph.TaskGraph()
+            nodes = []
+            step_nodes = {}
+
+            if self.task_filters:
+                log.info("Task filters: %s", ", ".join(self.task_filters))
+
+            for step, config in steps:
+
+                dependencies = [
+                    node
+                    for need in self._needs(config=config)
+                    for node in step_nodes[need]
+                ]
+
+                tasks = []
+
+                for subconfig in config:
+                    tasks += self._generate_tasks(
+                        config=subconfig, git_repository=git_repository
+                    )
+
+                if self.task_filters:
+                    tasks = self._filter_tasks(tasks=tasks)
+
+                step_nodes[step] = []
+
+                for task in tasks:
+                    # The graph runs the index of the task in the nodes. The
+                    # workingtree task runs first, so its failures are found
+                    # quickly.
+                    index = graph.add(
+                        item=len(nodes),
+                        dependencies=dependencies,
+                        first=task.context["scope"] == "workingtree",
+                    )
+                    step_nodes[step].append(index)
+                    nodes.append((step, task))
+
+            if len(graph) == 0:
+                raise RuntimeError(
+                    "No tasks were generated. Check your filters, "
+                    "they did not match any of the available "
+                    "branches or tags."
+                )
+
+            log.info("Tasks generated %d", len(graph))
+
+            # The cache tracks the output of the tasks we already ran
+            cache = self.factory.cache_factory(
+                giit_path=self.giit_path, unique_name=git_repository.unique_name()
+            ).build()
+
+            # The journal records the tasks run, such that an interrupted build
+            # can be resumed
+            journal = self.factory.journal_factory(
+                giit_path=self.giit_path,
+                unique_name=git_repository.unique_name(),
+                step=self.step,
+                resume=self.resume,
+            ).build()
+
+            # The artifact store keeps a snapshot of the task outputs, the budget
+            # is given in megabytes
+            if self.artifact_budget is None:
+                size_budget = None
+            else:
+                size_budget = self.artifact_budget * 1024 * 1024
+
+            store = self.factory.artifact_store_factory(
+                giit_path=self.giit_path, size_budget=size_budget
+            ).build()
+
+            # The output of the commands run by a task is written to a log file
+            # per task
+            self.task_log_path = os.path.join(
+                self.giit_path, "logs", git_repository.unique_name()
+            )
+
+            start_time = time.time()
+            start_times = os.times()
+
+            # Computing the keys reads the requirements of every task from git,
+            # we do that in one pass before running anything
+            keys = [task.key() for _, task in nodes]
+
+            # The tasks of different steps may have the same name
+            qualify = len(steps) > 1
+
+            # The tasks are numbered in the order they are started
+            started = itertools.count(1)
+
+            def run(index):
+                step, task = nodes[index]
+                name = "{}:{}".format(step, task.name()) if qualify else task.name()
+                idx = next(started)
+
+                with giit.logs.task_scope(name=name if self.jobs > 1 else None):
+                    return self._run_task(
+                        step=step,
+                        name=name,
+                        task=task,
+                        key=keys[index],
+                        cache=cache,
+                        store=store,
+                        journal=journal,
+                        idx=idx,
+                        count=len(graph),
+                    )
+
+            try:
+                with cache, journal:
+                    costs = self._expected_durations(nodes=nodes, cache=cache)
+                    task_time = sum(
+                        graph.run(function=run, jobs=self.jobs, costs=costs)
+                    )
+            finally:
+                # The report is also written if a task failed
+                self.report.write(
+                    report_path=os.path.join(
+                        self.giit_path,
+                        "reports",
+                        git_repository.unique_name() + ".json",
+                    )
+                )
+                self.report.summary()
+
+                # Stop the git cat-file processes and the prompt event loop
+                git_repository.git.close()
+                self.prompt.close()
+
+            store.evict()
+
+            wall_time = time.time() - start_time
+
+            # The CPU time includes the commands run by the tasks
+            end_times = os.times()
+            cpu_time = sum(end_times[:4]) - sum(start_times[:4])
+
+            log.info(
+                "Ran %d tasks in %.1fs wall-clock (%.1fs task time, %.1fs CPU time)",
+                len(graph),
+                wall_time,
+                task_time,
+                cpu_time,
+            )
 
-        # Make sure the repository is available
-        git_repository.clone()
+    def _collect_garbage(self):
+        """Remove the least recently used data in giit_path"""
 
-        # Read the 'giit.json'
-        json_config = giit.giit_json.GiitJson(
-            git_repository=git_repository,
-            log=logging.getLogger("giit.giit_json"),
-            config_path=self.config_path,
-            config_branch=self.config_branch,
+        log = logging.getLogger("giit.main")
+
+        collector = self.factory.garbage_collector_factory(
+            giit_path=self.giit_path
+        ).build()
+
+        # The max age is given in days and the max size in megabytes
+        max_age = None
+        max_size = None
+
+        if self.gc_max_age is not None:
+            max_age = self.gc_max_age * 24 * 60 * 60
+
+        if self.gc_max_size is not None:
+            max_size = self.gc_max_size * 1024 * 1024
+
+        if max_age is None and max_size is None:
+            log.info("No --gc_max_age or --gc_max_size given, nothing removed")
+        else:
+            removed = collector.collect(max_age=max_age, max_size=max_size)
+            log.info("Removed %d items from %s", len(removed), self.giit_path)
+
+        collector.log_usage()
+
+    def _run_task(self, step, name, task, key, cache, store, journal, idx, count):
+        """Run a single task.
+
+        The task is skipped if the cache shows that its output was already
+        built for the same commit, config and Python environment. If the
+        output was removed it is restored from the artifact store.
+
+        :param step: The step the task is part of
+        :param name: The name of the task in the report
+        :param key: The key of the task or None if it has no output
+        :param journal: The giit.journal.Journal recording the tasks run
+        :return: The time it took to run the task in seconds
+        """
+
+        task_log_path = os.path.join(
+            self.task_log_path, step, task.name().replace("/", "_") + ".log"
         )
 
-        config = json_config.read()
+        with giit.logs.task_log(path=task_log_path), self.report.task(
+            name=name
+        ) as record, giit.prompt.task_timeout(timeout=task.config["task_timeout"]):
+            try:
+                return self._run_task_recorded(
+                    step=step,
+                    task=task,
+                    key=key,
+                    cache=cache,
+                    store=store,
+                    journal=journal,
+                    idx=idx,
+                    count=count,
+                    record=record,
+                )
+            finally:
+                if record["timed_out"] and record["status"] != "ran":
+                    record["status"] = "timed_out"
+
+    def _run_task_recorded(
+        self, step, task, key, cache, store, journal, idx, count, record
+    ):
 
-        if self.step not in config:
-            raise RuntimeError(
-                "Error step {} not found in {}".format(self.step, config)
+        log = logging.getLogger("giit.main")
+
+        # Tasks without a git checkout have no revision and are always run
+        revision = task.revision()
+
+        # A task with an output path is only skipped if its output is
+        # still there, otherwise it is restored or run
+        if (
+            revision
+            and (not key or os.path.isdir(task.output_path()))
+            and journal.completed(step=step, task=task.name(), revision=revision)
+        ):
+            log.info("Resumed task [%d/%d]: %s", idx, count, task)
+            record["status"] = "resumed"
+            return 0.0
+
+        if key and cache.match(sha1=key):
+            log.info("Up to date task [%d/%d]: %s", idx, count, task)
+            record["status"] = "up_to_date"
+            return 0.0
+
+        if key and store.restore(key=key, path=task.output_path()):
+            log.info("Restored task [%d/%d]: %s", idx, count, task)
+
+            output_path = task.output_path()
+            cache.update(
+                sha1=key,
+                path=output_path,
+                task=task.name(),
+                step=step,
+                **task.key_fields()
             )
+            record["status"] = "restored"
+            return 0.0
+
+        if key:
+            # The output directory is overwritten, so it no longer holds
+            # the build it was recorded with until the task succeeds
+            cache.invalidate(path=task.output_path())
+
+        if key and os.path.isdir(task.output_path()):
+            # The output may have been restored from the store earlier
+            store.detach(path=task.output_path())
+
+        log.info("Running task [%d/%d]: %s", idx, count, task)
+
+        if revision:
+            journal.start(step=step, task=task.name(), revision=revision)
+
+        start_time = time.time()
+
+        try:
+            success = task.run()
+        except BaseException:
+            if revision:
+                journal.failure(step=step, task=task.name(), revision=revision)
+            raise
 
-        # We will only use the configuration for the step
-        config = config[self.step]
+        task_time = time.time() - start_time
+
+        if revision:
+            if success:
+                journal.success(step=step, task=task.name(), revision=revision)
+            else:
+                journal.failure(step=step, task=task.name(), revision=revision)
 
-        # There can be several "sub-configurations" in a step, lets
-        # make sure the config is a list. So we can handle the cases
-        # uniformly
-        if not isinstance(config, list):
-            config = [config]
+        record["status"] = "ran" if success else "failed"
 
-        # Get the tasks for all the substeps
-        tasks = []
+        if success:
+            cache.record_duration(step=step, task=task.name(), duration=task_time)
+
+        log.debug("Finished task [%d/%d] in %.1fs: %s", idx, count, task_time, task)
+
+        if key and success:
+            output_path = task.output_path()
+
+            if os.path.isdir(output_path):
+                store.store(key=key, path=output_path)
+                cache.update(
+                    sha1=key,
+                    path=output_path,
+                    task=task.name(),
+                    step=step,
+                    duration=task_time,
+                    **task.key_fields()
+                )
+            else:
+                log.debug("No output found in %s for task %s", output_path, task)
+
+        return task_time
+
+    def _expected_durations(self, nodes, cache):
+        """Estimate how long each task takes from the durations recorded by
+        earlier builds.
+
+        Tasks which have not run before, e.g. a new tag, are expected to
+        take the average time of the tasks of their step.
+
+        :param nodes: List of (step, task) tuples
+        :return: List with the expected duration of each task in seconds
+        """
+        durations = cache.durations()
+
+        averages = {}
+
+        for step, _ in nodes:
+            if step in averages:
+                continue
+
+            known = [d for (s, _), d in durations.items() if s == step]
+            averages[step] = sum(known) / len(known) if known else 0.0
+
+        return [
+            durations.get((step, task.name()), averages[step]) for step, task in nodes
+        ]
+
+    def _resolve_steps(self, json_config):
+        """Find the step and the steps it needs.
+
+        :param json_config: The content of the giit.json as a dict
+        :return: List of (step, config) tuples where config is the list of
+            validated sub-configurations of the step. Each step comes after
+            the steps it needs, the step we build comes last.
+        """
+        steps = []
+        resolved = set()
+
+        def resolve(step, path):
+
+            if step in resolved:
+                return
+
+            if step in path:
+                raise RuntimeError(
+                    "The steps need each other in a cycle: {}".format(
+                        " -> ".join(path[path.index(step) :] + [step])
+                    )
+                )
+
+            if step not in json_config:
+                raise RuntimeError(
+                    "Error step {} not found in {}".format(step, json_config)
+                )
+
+            config = json_config[step]
+
+            # There can be several "sub-configurations" in a step, lets
+            # make sure the config is a list. So we can handle the cases
+            # uniformly
+            if not isinstance(config, list):
+                config = [config]
+
+            # Validate the configuration
+            config = [giit.config.validate_config(config=c) for c in config]
+
+            # The timeouts given on the command line are used if the step
+            # does not set them
+            for subconfig in config:
+                if subconfig["timeout"] is None:
+                    subconfig["timeout"] = self.timeout
+
+                if subconfig["task_timeout"] is None:
+                    subconfig["task_timeout"] = self.task_timeout
+
+            for need in self._needs(config=config):
+                resolve(step=need, path=path + [step])
+
+            resolved.add(step)
+            steps.append((step, config))
+
+        resolve(step=self.step, path=[])
+
+        return steps
+
+    def _needs(self, config):
+        """:return: The steps needed by any of the sub-configurations"""
+
+        needs = []
 
         for subconfig in config:
-            tasks += self._generate_tasks(
-                config=subconfig, git_repository=git_repository
-            )
+            needs += [need for need in subconfig["needs"] if need not in needs]
 
-        if len(tasks) == 0:
-            raise RuntimeError(
-                "No tasks were generated. Check your filters, "
-                "they did not match any of the available "
-                "branches or tags."
-            )
+        return needs
 
-        log.info("Tasks generated %d", len(tasks))
+    def _filter_tasks(self, tasks):
+        """:return: The tasks matching the task filters"""
+
+        log = logging.getLogger("giit.main")
 
-        if self.task_filters:
-            log.info("Task filters: %s", ", ".join(self.task_filters))
-            filtered_tasks = []
-            for task in tasks:
-                if any(
-                    fnmatch.fnmatch(task.name(), filter) for filter in self.task_filters
-                ):
-                    filtered_tasks.append(task)
-                else:
-                    log.info("Skipped task: %s", task)
-            tasks = filtered_tasks
+        filtered_tasks = []
 
-        for idx, task in enumerate(tasks, 1):
-            log.info("Running task [%d/%d]: %s", idx, len(tasks), task)
-            task.run()
+        for task in tasks:
+            if any(
+                fnmatch.fnmatch(task.name(), filter) for filter in self.task_filters
+            ):
+                filtered_tasks.append(task)
+            else:
+                log.info("Skipped task: %s", task)
+
+        return filtered_tasks
+
+    def _pip_refresh_time(self):
+        """:return: The time before which the Python environments are
+        updated using pip, or None if pip is always run.
+        """
+        if self.pip_refresh == "always":
+            # Every task runs pip
+            return None
+
+        if self.pip_refresh == "once":
+            # Once per run
+            return self.report.start_time
+
+        if self.pip_refresh == "daily":
+            return time.time() - 24 * 60 * 60
+
+        if self.pip_refresh == "never":
+            return 0.0
+
+        raise RuntimeError("Unknown pip refresh policy {}".format(self.pip_refresh))
 
     def _generate_tasks(self, config, git_repository):
 
@@ -162,9 +638,6 @@ class Build(object):
 
         build_factory = self.factory.build_factory()
 
-        # Validate the configuration
-        config = giit.config.validate_config(config=config)
-
         for key, value in self.extra_variables:
             if key not in config["variables"]:
                 log.debug("Adding extra variable '%s': %s", key, value)
@@ -172,9 +645,23 @@ class Build(object):
 
         # Provide the different needed by the factory
         build_factory.provide_value(name="config", value=config)
+
+        # The variables are compiled once and shared by the tasks
+        build_factory.provide_value(
+            name="variables",
+            value=giit.variables_reader.CompiledVariables(
+                variables=config["variables"]
+            ),
+        )
         build_factory.provide_value(name="build_path", value=self.build_path)
         build_factory.provide_value(name="giit_path", value=self.giit_path)
         build_factory.provide_value(name="git_repository", value=git_repository)
+        build_factory.provide_value(name="run_report", value=self.report)
+        build_factory.provide_value(name="prompt", value=self.prompt, override=True)
+        build_factory.provide_value(
+            name="pip_refresh_time", value=self._pip_refresh_time()
+        )
+        build_factory.provide_value(name="pip_install", value=self.pip_install)
 
         task_generator = build_factory.build()
         tasks = task_generator.tasks()
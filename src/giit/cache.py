@@ -1,63 +1,335 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
+import collections
 import json
 import os
+import sqlite3
+import threading
+import time
 
 
 class Cache(object):
+    """Records the builds of the tasks in a SQLite database.
+
+    The database is shared by all repositories and processes using the same
+    giit_path, it is opened in WAL mode so readers do not block the writer.
+    Every lookup and update is its own transaction, so nothing is lost if
+    giit is interrupted.
+    """
+
+    # The name of the database file in the cache directory
+    DATABASE_FILE = "cache.sqlite"
+
+    # The time in milliseconds we wait for other processes writing to the
+    # database
+    BUSY_TIMEOUT = 60000
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS builds (
+            repository TEXT NOT NULL,
+            key TEXT NOT NULL,
+            task TEXT,
+            step TEXT,
+            commit_sha TEXT,
+            config_hash TEXT,
+            environment_name TEXT,
+            output_path TEXT NOT NULL,
+            size INTEGER,
+            duration REAL,
+            last_access REAL NOT NULL,
+            PRIMARY KEY (repository, key)
+        );
+        CREATE INDEX IF NOT EXISTS builds_last_access
+            ON builds (repository, last_access);
+        CREATE TABLE IF NOT EXISTS outputs (
+            output_path TEXT NOT NULL PRIMARY KEY,
+            repository TEXT NOT NULL,
+            key TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS durations (
+            repository TEXT NOT NULL,
+            step TEXT NOT NULL,
+            task TEXT NOT NULL,
+            duration REAL NOT NULL,
+            last_run REAL NOT NULL,
+            PRIMARY KEY (repository, step, task)
+        );
+        """
+
     def __init__(self, cache_path, unique_name):
         """Open or create a new cache
 
         :param cache_path: The path to the cache directory as a string. The
-            cache directory is where the cache files (json) which contains
+            cache directory is where the database which contains
             information about the different builds will be stored.
         :param unique_name: The unique name of the repository as a string
         """
-
-        # Read the "cache" from json
-        filename = "cache-" + unique_name + ".json"
         cache_path = os.path.abspath(os.path.expanduser(cache_path))
 
-        self.filepath = os.path.join(cache_path, filename)
+        self.unique_name = unique_name
+        self.filepath = os.path.join(cache_path, Cache.DATABASE_FILE)
 
-        # Dict which will hold the cached values
-        self.cache = None
+        # The JSON file used by earlier versions of giit
+        self.legacy_filepath = os.path.join(
+            cache_path, "cache-" + unique_name + ".json"
+        )
+
+        # The connection is shared by the threads running tasks
+        self.connection = None
+        self.lock = threading.Lock()
 
     def __enter__(self):
 
-        if os.path.isfile(self.filepath):
+        directory = os.path.dirname(self.filepath)
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        # With isolation_level=None every statement is committed when it
+        # completes, unless a transaction is started explicitly
+        self.connection = sqlite3.connect(
+            self.filepath,
+            timeout=Cache.BUSY_TIMEOUT / 1000.0,
+            isolation_level=None,
+            check_same_thread=False,
+        )
 
-            with open(self.filepath, "r") as json_file:
-                self.cache = json.load(json_file)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA busy_timeout={}".format(Cache.BUSY_TIMEOUT))
+        self.connection.executescript(Cache.SCHEMA)
 
-        else:
-            self.cache = {}
+        self._import_legacy()
 
         return self
 
     def __exit__(self, *args):
 
-        with open(self.filepath, "w") as json_file:
-
-            json.dump(
-                self.cache, json_file, indent=2, sort_keys=True, separators=(",", ": ")
-            )
+        self.connection.close()
+        self.connection = None
 
     def match(self, sha1):
+        """:return: True if the task with the key was built and its output
+        still exists, otherwise False. Tasks for different commits or
+        configs may share the same output directory, so the output must
+        also be from the last build written to it.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT builds.output_path, outputs.key FROM builds "
+                "LEFT JOIN outputs ON outputs.output_path = builds.output_path "
+                "WHERE builds.repository = ? AND builds.key = ?",
+                (self.unique_name, sha1),
+            ).fetchone()
 
-        if sha1 in self.cache:
-            path = self.cache[sha1]
+            if row is None or row[1] != sha1 or not os.path.isdir(row[0]):
+                return False
 
-            return os.path.isdir(path)
+            self.connection.execute(
+                "UPDATE builds SET last_access = ? WHERE repository = ? AND key = ?",
+                (time.time(), self.unique_name, sha1),
+            )
 
-        return False
+        return True
 
-    def update(self, sha1, path):
+    def update(
+        self,
+        sha1,
+        path,
+        task=None,
+        step=None,
+        commit=None,
+        config_hash=None,
+        environment_name=None,
+        duration=None,
+    ):
+        """Record that the task with the key was built.
 
+        :param sha1: The key of the task as a string
+        :param path: The output directory of the task
+        :param task: The name of the task
+        :param step: The step the task was part of
+        :param commit: The commit the task was built from
+        :param config_hash: The hash of the task config
+        :param environment_name: The name of the Python environment used
+        :param duration: The time it took to run the task in seconds or None
+            if it was not run e.g. restored from the artifact store. Then any
+            earlier duration is kept.
+        """
         assert os.path.isdir(path)
 
-        self.cache[sha1] = path
+        size = _size(path=path)
+
+        with self.lock:
+            self.connection.execute(
+                """
+                INSERT INTO builds (repository, key, task, step, commit_sha,
+                    config_hash, environment_name, output_path, size,
+                    duration, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (repository, key) DO UPDATE SET
+                    task = excluded.task,
+                    step = excluded.step,
+                    commit_sha = excluded.commit_sha,
+                    config_hash = excluded.config_hash,
+                    environment_name = excluded.environment_name,
+                    output_path = excluded.output_path,
+                    size = excluded.size,
+                    duration = COALESCE(excluded.duration, builds.duration),
+                    last_access = excluded.last_access
+                """,
+                (
+                    self.unique_name,
+                    sha1,
+                    task,
+                    step,
+                    commit,
+                    config_hash,
+                    environment_name,
+                    path,
+                    size,
+                    duration,
+                    time.time(),
+                ),
+            )
+
+            self._set_output(path=path, sha1=sha1)
+
+    def invalidate(self, path):
+        """Record that the output directory no longer holds a complete build.
+
+        Must be called before a task writes to its output directory, such
+        that a build which fails or is interrupted is not matched.
+
+        :param path: The output directory of the task
+        """
+        with self.lock:
+            self.connection.execute(
+                "DELETE FROM outputs WHERE output_path = ?", (path,)
+            )
+
+    def _set_output(self, path, sha1):
+        """Record that the output directory holds the build with the key"""
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO outputs (output_path, repository, key) "
+            "VALUES (?, ?, ?)",
+            (path, self.unique_name, sha1),
+        )
+
+    def record_duration(self, step, task, duration):
+        """Record the time it took to run a task.
+
+        The durations are kept per step and task name, such that the next
+        build can estimate how long the task will take. The recorded
+        duration is the average of the previous duration and the new one,
+        which smooths out a single slow or fast run.
+
+        :param step: The step the task was part of
+        :param task: The name of the task
+        :param duration: The time it took to run the task in seconds
+        """
+        with self.lock:
+            self.connection.execute(
+                """
+                INSERT INTO durations (repository, step, task, duration, last_run)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (repository, step, task) DO UPDATE SET
+                    duration = (durations.duration + excluded.duration) / 2,
+                    last_run = excluded.last_run
+                """,
+                (self.unique_name, step, task, duration, time.time()),
+            )
+
+    def durations(self):
+        """:return: Dict mapping (step, task) to the expected duration of
+        the task in seconds, for the tasks run before.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT step, task, duration FROM durations WHERE repository = ?",
+                (self.unique_name,),
+            ).fetchall()
+
+        return {(step, task): duration for step, task, duration in rows}
+
+    def stats(self):
+        """:return: Dict with the number of builds recorded for the
+        repository, their total output size in bytes and total duration in
+        seconds.
+        """
+        with self.lock:
+            builds, size, duration = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), "
+                "COALESCE(SUM(duration), 0.0) FROM builds WHERE repository = ?",
+                (self.unique_name,),
+            ).fetchone()
+
+        return {"builds": builds, "size": size, "duration": duration}
+
+    def clear(self):
+        """Remove the builds, outputs and durations recorded for the
+        repository
+        """
+
+        with self.lock:
+            for table in ("builds", "outputs", "durations"):
+                self.connection.execute(
+                    "DELETE FROM {} WHERE repository = ?".format(table),
+                    (self.unique_name,),
+                )
+
+    def _import_legacy(self):
+        """Import the builds from the JSON file used by earlier versions of
+        giit and remove it.
+        """
+        if not os.path.isfile(self.legacy_filepath):
+            return
+
+        try:
+            with open(self.legacy_filepath, "r") as json_file:
+                legacy = json.load(json_file)
+        except (OSError, ValueError):
+            # Removed by another process or unreadable, either way there
+            # is nothing to import
+            legacy = {}
+
+        now = time.time()
+
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO builds "
+                "(repository, key, output_path, last_access) VALUES (?, ?, ?, ?)",
+                [(self.unique_name, sha1, path, now) for sha1, path in legacy.items()],
+            )
+
+            # Which build is in an output directory is only known if a
+            # single build used it
+            counts = collections.Counter(legacy.values())
+
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO outputs (output_path, repository, key) "
+                "VALUES (?, ?, ?)",
+                [
+                    (path, self.unique_name, sha1)
+                    for sha1, path in legacy.items()
+                    if counts[path] == 1
+                ],
+            )
+
+        try:
+            os.remove(self.legacy_filepath)
+        except FileNotFoundError:
+            pass
+
+
+def _size(path):
+    """:return: The size of the files in the directory in bytes"""
+
+    size = 0
 
+    for root, dirs, files in os.walk(path):
+        for filename in files:
+            size += os.lstat(os.path.join(root, filename)).st_size
 
-#
+    return size
@@ -86,7 +86,8 @@ def validate_config(config):
     default_branches = {"regex": {"filters": []}, "source_branch": False}
     default_tags = {
         "regex": {"filters": []},
-        "semver": {"filters": [], "relaxed": False},
+        "semver": {"filters": [], "relaxed": False, "latest_per": None},
+        "limit": None,
     }
 
     config_schema = schema.Schema(
@@ -96,6 +97,7 @@ def validate_config(config):
             schema.Optional("requirements", default=None): six.text_type,
             schema.Optional("cwd", default=os.getcwd()): six.text_type,
             schema.Optional("python_path", default=None): six.text_type,
+            schema.Optional("output_path", default=None): six.text_type,
             schema.Optional("branches", default=default_branches): {
                 schema.Optional("regex", default=default_branches["regex"]): {
                     "filters": list
@@ -106,6 +108,13 @@ def validate_config(config):
             },
             schema.Optional("workingtree", default=False): bool,
             schema.Optional("allow_failure", default=False): bool,
+            schema.Optional("needs", default=[]): [six.text_type],
+            schema.Optional("timeout", default=None): schema.Or(
+                None, schema.And(schema.Or(int, float), lambda t: t > 0)
+            ),
+            schema.Optional("task_timeout", default=None): schema.Or(
+                None, schema.And(schema.Or(int, float), lambda t: t > 0)
+            ),
             schema.Optional("pip_packages", default=None): list,
             schema.Optional("tags", default=default_tags): {
                 schema.Optional("regex", default=default_tags["regex"]): {
@@ -116,7 +125,13 @@ def validate_config(config):
                     schema.Optional(
                         "relaxed", default=default_tags["semver"]["relaxed"]
                     ): bool,
+                    schema.Optional(
+                        "latest_per", default=default_tags["semver"]["latest_per"]
+                    ): schema.Or(None, "major", "minor"),
                 },
+                schema.Optional("limit", default=default_tags["limit"]): schema.Or(
+                    None, schema.And(int, lambda limit: limit > 0)
+                ),
             },
         }
     )
@@ -129,32 +144,42 @@ def validate_config(config):
     return config
 
 
-def fill_dict(context, config):
-    """Visit all the values in the dict and expand the string"""
+def fill_dict(context, config, variables=None):
+    """Visit all the values in the dict and expand the string
 
-    # Make sure we do not modify the original dicts.
-    config = copy.deepcopy(config)
-    context = copy.deepcopy(context)
+    :param context: Dict with the context of the task
+    :param config: The validated config
+    :param variables: The giit.variables_reader.CompiledVariables of the
+        config or None to compile them.
+    :return: A new dict with the strings expanded
+    """
 
-    variables = giit.variables_reader.VariablesReader(
-        variables=config["variables"], context=context
-    )
+    if variables is None:
+        variables = giit.variables_reader.CompiledVariables(
+            variables=config["variables"]
+        )
+
+    # Make sure we do not modify the original dict.
+    context = dict(context)
+
+    reader = variables.reader(context=context)
+
+    # Make the output path available to the scripts
+    if config.get("output_path") and "output_path" not in context:
+        context["output_path"] = reader.expand(element=config["output_path"])
 
     def visit(data):
 
         if isinstance(data, dict):
-            for k, v in data.items():
-                data[k] = visit(v)
+            return {k: visit(v) for k, v in data.items()}
 
         elif isinstance(data, list):
             return [visit(v) for v in data]
 
         if isinstance(data, giit.compat.string_type):
-            return variables.expand(element=data)
+            return reader.expand(element=data)
 
         else:
             return data
 
-    config = visit(config)
-
-    return config
+    return visit(config)
@@ -7,10 +7,14 @@ import logging
 import copy
 
 import giit.prompt
+import giit.async_prompt
 import giit.git
 import giit.git_url_parser
 import giit.git_repository
 import giit.cache
+import giit.journal
+import giit.artifact_store
+import giit.garbage_collector
 import giit.virtualenv
 import giit.tasks
 import giit.config
@@ -62,7 +66,22 @@ class Factory(object):
 
 
 def require_prompt(factory):
-    return giit.prompt.Prompt()
+    report = factory.require(name="run_report")
+
+    return giit.prompt.Prompt(report=report)
+
+
+def require_async_prompt(factory):
+    report = factory.require(name="run_report")
+    jobs = factory.require(name="jobs")
+
+    # Each task runs one command at a time, the git commands made while
+    # resolving the tasks may run alongside them
+    return giit.async_prompt.AsyncPrompt(
+        report=report,
+        max_processes=2 * jobs,
+        limits={"git": jobs, "pip": jobs, "scripts": jobs},
+    )
 
 
 def require_git(factory):
@@ -99,6 +118,12 @@ def require_git_repository(factory):
     repository = factory.require(name="repository")
     log = logging.getLogger(name="giit.git_repository")
     clone_path = factory.require(name="clone_path")
+    worktree_path = factory.require(name="worktree_path")
+    clone_filter = factory.require(name="clone_filter")
+    clone_depth = factory.require(name="clone_depth")
+    sparse_paths = factory.require(name="sparse_paths")
+    mirror_path = factory.require(name="mirror_path")
+    export_path = factory.require(name="export_path")
 
     return giit.git_repository.GitRepository(
         git=git,
@@ -106,6 +131,12 @@ def require_git_repository(factory):
         clone_path=clone_path,
         log=log,
         repository=repository,
+        worktree_path=worktree_path,
+        clone_filter=clone_filter,
+        clone_depth=clone_depth,
+        sparse_paths=sparse_paths,
+        mirror_path=mirror_path,
+        export_path=export_path,
     )  # , remote_branch=remote_branch)
 
 
@@ -121,6 +152,36 @@ def provide_clone_path(factory):
     return os.path.join(giit_path, "clones")
 
 
+def provide_worktree_path(factory):
+
+    jobs = factory.require(name="jobs")
+    checkout_backend = factory.require(name="checkout_backend")
+
+    # When running tasks in parallel each checkout gets its own worktree,
+    # unless another backend was chosen
+    if checkout_backend is None and jobs > 1:
+        checkout_backend = "worktree"
+
+    if checkout_backend != "worktree":
+        return None
+
+    giit_path = factory.require(name="giit_path")
+
+    return os.path.join(giit_path, "worktrees")
+
+
+def provide_export_path(factory):
+
+    checkout_backend = factory.require(name="checkout_backend")
+
+    if checkout_backend != "archive":
+        return None
+
+    giit_path = factory.require(name="giit_path")
+
+    return os.path.join(giit_path, "exports")
+
+
 def provide_virtualenv_root_path(factory):
 
     giit_path = factory.require(name="giit_path")
@@ -128,6 +189,13 @@ def provide_virtualenv_root_path(factory):
     return os.path.join(giit_path, "virtualenvs")
 
 
+def provide_wheelhouse_path(factory):
+
+    giit_path = factory.require(name="giit_path")
+
+    return os.path.join(giit_path, "wheelhouse")
+
+
 def require_cache(factory):
 
     giit_path = factory.require(name="giit_path")
@@ -136,17 +204,55 @@ def require_cache(factory):
     return giit.cache.Cache(cache_path=giit_path, unique_name=unique_name)
 
 
+def require_journal(factory):
+
+    giit_path = factory.require(name="giit_path")
+    unique_name = factory.require(name="unique_name")
+    step = factory.require(name="step")
+    resume = factory.require(name="resume")
+
+    # One journal per step given on the command line
+    journal_path = os.path.join(
+        giit_path, "build", unique_name, ".journal-{}.jsonl".format(step)
+    )
+
+    return giit.journal.Journal(path=journal_path, resume=resume)
+
+
+def require_artifact_store(factory):
+
+    giit_path = factory.require(name="giit_path")
+    size_budget = factory.require(name="size_budget")
+    log = logging.getLogger(name="giit.artifact_store")
+
+    return giit.artifact_store.ArtifactStore(
+        store_path=os.path.join(giit_path, "artifacts"),
+        size_budget=size_budget,
+        log=log,
+    )
+
+
+def require_garbage_collector(factory):
+
+    giit_path = factory.require(name="giit_path")
+    log = logging.getLogger(name="giit.garbage_collector")
+
+    return giit.garbage_collector.GarbageCollector(giit_path=giit_path, log=log)
+
+
 def require_branch_generator(factory):
 
     git_repository = factory.require(name="git_repository")
     command = factory.require(name="command")
     config = factory.require(name="config")
+    variables = factory.require(name="variables")
     build_path = factory.require(name="build_path")
 
     return giit.tasks.GitBranchGenerator(
         git_repository=git_repository,
         command=command,
         config=copy.deepcopy(config),
+        variables=variables,
         build_path=build_path,
     )
 
@@ -156,12 +262,14 @@ def require_tag_generator(factory):
     git_repository = factory.require(name="git_repository")
     command = factory.require(name="command")
     config = factory.require(name="config")
+    variables = factory.require(name="variables")
     build_path = factory.require(name="build_path")
 
     return giit.tasks.GitTagGenerator(
         git_repository=git_repository,
         command=command,
         config=copy.deepcopy(config),
+        variables=variables,
         build_path=build_path,
     )
 
@@ -171,12 +279,14 @@ def require_workingtree_generator(factory):
     git_repository = factory.require(name="git_repository")
     command = factory.require(name="command")
     config = factory.require(name="config")
+    variables = factory.require(name="variables")
     build_path = factory.require(name="build_path")
 
     return giit.tasks.WorkingtreeGenerator(
         git_repository=git_repository,
         command=command,
         config=copy.deepcopy(config),
+        variables=variables,
         build_path=build_path,
     )
 
@@ -185,10 +295,14 @@ def require_no_git_generator(factory):
 
     command = factory.require(name="command")
     config = factory.require(name="config")
+    variables = factory.require(name="variables")
     build_path = factory.require(name="build_path")
 
     return giit.tasks.NoGitGenerator(
-        command=command, config=copy.deepcopy(config), build_path=build_path
+        command=command,
+        config=copy.deepcopy(config),
+        variables=variables,
+        build_path=build_path,
     )
 
 
@@ -215,7 +329,17 @@ def require_task_generator(factory):
     return task_generator
 
 
-def resolve_factory(giit_path, repository):
+def resolve_factory(
+    giit_path,
+    repository,
+    jobs=1,
+    clone_filter=None,
+    clone_depth=None,
+    sparse_paths=None,
+    mirror_path=None,
+    checkout_backend=None,
+    run_report=None,
+):
 
     factory = Factory()
     factory.set_default_build(default_build="git_repository")
@@ -223,9 +347,18 @@ def resolve_factory(giit_path, repository):
     factory.provide_value(name="git_binary", value="git")
     factory.provide_value(name="giit_path", value=giit_path)
     factory.provide_value(name="repository", value=repository)
+    factory.provide_value(name="jobs", value=jobs)
+    factory.provide_value(name="clone_filter", value=clone_filter)
+    factory.provide_value(name="clone_depth", value=clone_depth)
+    factory.provide_value(name="sparse_paths", value=sparse_paths)
+    factory.provide_value(name="mirror_path", value=mirror_path)
+    factory.provide_value(name="checkout_backend", value=checkout_backend)
+    factory.provide_value(name="run_report", value=run_report)
     # factory.provide_value(name='remote_branch', value=remote_branch)
 
     factory.provide_function(name="clone_path", function=provide_clone_path)
+    factory.provide_function(name="worktree_path", function=provide_worktree_path)
+    factory.provide_function(name="export_path", function=provide_export_path)
     factory.provide_function(name="git_url_parser", function=require_git_url_parser)
     factory.provide_function(name="git", function=require_git)
     factory.provide_function(name="git_repository", function=require_git_repository)
@@ -234,6 +367,21 @@ def resolve_factory(giit_path, repository):
     return factory
 
 
+def prompt_factory(command_runner, jobs, run_report):
+
+    factory = Factory()
+    factory.set_default_build(default_build="prompt")
+    factory.provide_value(name="jobs", value=jobs)
+    factory.provide_value(name="run_report", value=run_report)
+
+    if command_runner == "asyncio":
+        factory.provide_function(name="prompt", function=require_async_prompt)
+    else:
+        factory.provide_function(name="prompt", function=require_prompt)
+
+    return factory
+
+
 def cache_factory(giit_path, unique_name):
 
     factory = Factory()
@@ -245,14 +393,58 @@ def cache_factory(giit_path, unique_name):
     return factory
 
 
+def journal_factory(giit_path, unique_name, step, resume):
+
+    factory = Factory()
+    factory.set_default_build(default_build="journal")
+    factory.provide_value(name="giit_path", value=giit_path)
+    factory.provide_value(name="unique_name", value=unique_name)
+    factory.provide_value(name="step", value=step)
+    factory.provide_value(name="resume", value=resume)
+    factory.provide_function(name="journal", function=require_journal)
+
+    return factory
+
+
+def artifact_store_factory(giit_path, size_budget):
+
+    factory = Factory()
+    factory.set_default_build(default_build="artifact_store")
+    factory.provide_value(name="giit_path", value=giit_path)
+    factory.provide_value(name="size_budget", value=size_budget)
+    factory.provide_function(name="artifact_store", function=require_artifact_store)
+
+    return factory
+
+
+def garbage_collector_factory(giit_path):
+
+    factory = Factory()
+    factory.set_default_build(default_build="garbage_collector")
+    factory.provide_value(name="giit_path", value=giit_path)
+    factory.provide_function(
+        name="garbage_collector", function=require_garbage_collector
+    )
+
+    return factory
+
+
 def require_python_environment(factory):
 
     prompt = factory.require(name="prompt")
     virtual_environment = factory.require(name="virtual_environment")
+    refresh_time = factory.require(name="pip_refresh_time")
+    wheelhouse_path = factory.require(name="wheelhouse_path")
+    install = factory.require(name="pip_install")
     log = logging.getLogger(name="giit.python_environment")
 
     return giit.python_environment.PythonEnvironment(
-        prompt=prompt, virtual_environment=virtual_environment, log=log
+        prompt=prompt,
+        virtual_environment=virtual_environment,
+        log=log,
+        refresh_time=refresh_time,
+        wheelhouse_path=wheelhouse_path,
+        install=install,
     )
 
 
@@ -288,6 +480,8 @@ def build_factory():
         name="virtualenv_root_path", function=provide_virtualenv_root_path
     )
 
+    factory.provide_function(name="wheelhouse_path", function=provide_wheelhouse_path)
+
     factory.provide_value(name="git_binary", value="git")
 
     factory.provide_function(name="git_url_parser", function=require_git_url_parser)
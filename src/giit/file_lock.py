@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+    import msvcrt
+
+
+class FileLock(object):
+    """Inter-process lock backed by a lock file.
+
+    Usage:
+
+        with giit.file_lock.FileLock(path="/tmp/mirror.lock"):
+            ...
+
+    The lock is released when the process exits, so a crashed process
+    never leaves a stale lock behind. The lock file itself is not removed.
+    """
+
+    def __init__(self, path, shared=False):
+        """Create a new lock.
+
+        :param path: The path to the lock file as a string
+        :param shared: If True take a shared lock, which can be held by
+            several processes at once, but not while an exclusive lock is
+            held. Shared locks are not supported on Windows, where an
+            exclusive lock is taken instead.
+        """
+        self.path = path
+        self.shared = shared
+        self.fd = None
+
+    def acquire(self, blocking=True):
+        """Acquire the lock.
+
+        :param blocking: If True block until the lock is acquired, otherwise
+            give up if the lock is held by others.
+        :return: True if the lock was acquired otherwise False
+        """
+
+        directory = os.path.dirname(self.path)
+
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+
+        try:
+            if fcntl:
+                operation = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+
+                if not blocking:
+                    operation |= fcntl.LOCK_NB
+
+                fcntl.flock(self.fd, operation)
+            elif not blocking:
+                msvcrt.locking(self.fd, msvcrt.LK_NBLCK, 1)
+            else:
+                # LK_LOCK retries for 10 seconds before giving up, so we
+                # keep trying
+                while True:
+                    try:
+                        msvcrt.locking(self.fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+        except OSError:
+            os.close(self.fd)
+            self.fd = None
+
+            if blocking:
+                raise
+
+            return False
+        except BaseException:
+            os.close(self.fd)
+            self.fd = None
+            raise
+
+        return True
+
+    def release(self):
+        """Release the lock"""
+
+        if fcntl:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+
+        os.close(self.fd)
+        self.fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import re
+import functools
+
+import semantic_version
+
+# Back references refer to groups by number or name, which changes when the
+# regular expressions are combined
+_BACK_REFERENCE = re.compile(r"\\[1-9]|\(\?P=")
+
+
+def compile_regex_filters(regex_filters):
+    """Compile the regular expressions into a single match function.
+
+    The regular expressions are combined into one alternation, such that a
+    name is matched in a single pass.
+
+    :param regex_filters: List of regular expressions as strings
+    :return: A function taking a name and returning True if any of the
+        regular expressions match the start of the name.
+    """
+    if not regex_filters:
+        return lambda name: False
+
+    if not any(_BACK_REFERENCE.search(f) for f in regex_filters):
+        try:
+            combined = re.compile("|".join("(?:{})".format(f) for f in regex_filters))
+            return lambda name: combined.match(name) is not None
+        except re.error:
+            # E.g. the same group name used in several filters
+            pass
+
+    compiled = [re.compile(f) for f in regex_filters]
+
+    return lambda name: any(c.match(name) for c in compiled)
+
+
+@functools.lru_cache(maxsize=None)
+def parse_version(tag, relaxed):
+    """Parse the tag as a semantic version.
+
+    The result is cached, since the same tags are matched by every step.
+
+    :param tag: The tag as a string
+    :param relaxed: If True versions like 1.2 are accepted
+    :return: The semantic_version.Version or None if the tag is not a
+        version.
+    """
+    try:
+        if relaxed:
+            return semantic_version.Version.coerce(tag)
+        else:
+            return semantic_version.Version(tag)
+    except ValueError:
+        return None
+
+
+class BranchFilter(object):
+    """Matches the remote branches against the branches filters of a config"""
+
+    def __init__(self, config, source_branch):
+        """Compile the filters.
+
+        :param config: The validated config
+        :param source_branch: A function returning the source branch, see
+            giit.git_repository.GitRepository.source_branch(). It is called
+            at most once and only if the config has source_branch set.
+        """
+        self.regex_match = compile_regex_filters(
+            regex_filters=config["branches"]["regex"]["filters"]
+        )
+
+        self.use_source_branch = config["branches"]["source_branch"]
+        self.source_branch = source_branch
+
+        # The source branch once resolved
+        self.resolved = None
+
+    def match(self, branch):
+        """:return: True if the branch matches the filters otherwise False"""
+
+        if self.regex_match(branch):
+            return True
+
+        if not self.use_source_branch:
+            return False
+
+        if self.resolved is None:
+            self.resolved = (self.source_branch(),)
+
+        return self.resolved[0] == branch
+
+
+class TagFilter(object):
+    """Matches the tags against the tags filters of a config"""
+
+    def __init__(self, config):
+        """Compile the filters.
+
+        :param config: The validated config
+        """
+        self.regex_match = compile_regex_filters(
+            regex_filters=config["tags"]["regex"]["filters"]
+        )
+
+        self.specs = [
+            semantic_version.Spec(semver_filter)
+            for semver_filter in config["tags"]["semver"]["filters"]
+        ]
+
+        self.relaxed = config["tags"]["semver"]["relaxed"]
+
+    def match(self, tag):
+        """:return: True if the tag matches the filters otherwise False.
+        Tags which are not semantic versions only match the regular
+        expressions.
+        """
+        if self.regex_match(tag):
+            return True
+
+        if not self.specs:
+            return False
+
+        version = parse_version(tag=tag, relaxed=self.relaxed)
+
+        if version is None:
+            return False
+
+        return any(spec.match(version) for spec in self.specs)
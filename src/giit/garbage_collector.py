@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import time
+import shutil
+
+import giit.cache
+import giit.logs
+import giit.file_lock
+
+
+class GarbageCollector(object):
+    """Removes the least recently used data in giit_path.
+
+    The data is grouped in items which are removed together:
+
+    * A repository: The clone and the worktrees, exports, build directory,
+      cached builds, task logs and report of the repository.
+    * A virtualenv.
+
+    When an item is used its modification time is updated, this is used as
+    the time it was last used.
+    """
+
+    # The directories in giit_path with an entry per repository
+    REPOSITORY_DIRECTORIES = ["clones", "worktrees", "exports", "build", "logs"]
+
+    class Item(object):
+        def __init__(self, kind, name):
+            """Create a new item.
+
+            :param kind: Either repository or virtualenv
+            :param name: The unique name of the repository or the name of
+                the virtualenv
+            """
+            self.kind = kind
+            self.name = name
+            self.paths = []
+            self.size = 0
+            self.last_used = 0.0
+
+            # The lock held while the item is changed
+            self.lock_path = None
+
+            # The lock shared by the builds using the item
+            self.use_lock_path = None
+
+        def __str__(self):
+            return "{} {}".format(self.kind, self.name)
+
+    def __init__(self, giit_path, log):
+        """Create a new garbage collector.
+
+        :param giit_path: The path to the giit data as a string
+        :param log: A logging object
+        """
+        self.giit_path = os.path.abspath(os.path.expanduser(giit_path))
+        self.log = log
+
+    def items(self):
+        """:return: List of the items in giit_path, the least recently used
+        item first.
+        """
+        items = {}
+
+        def add(kind, name, path):
+            if (kind, name) not in items:
+                items[(kind, name)] = GarbageCollector.Item(kind=kind, name=name)
+
+            items[(kind, name)].paths.append(path)
+
+        for directory in GarbageCollector.REPOSITORY_DIRECTORIES:
+            for name in self._listdir(directory):
+                add("repository", name, os.path.join(self.giit_path, directory, name))
+
+        for name in self._listdir():
+            if name.startswith("cache-") and name.endswith(".json"):
+                add("repository", name[6:-5], os.path.join(self.giit_path, name))
+
+        for name in self._listdir("reports"):
+            if name.endswith(".json"):
+                add(
+                    "repository",
+                    name[:-5],
+                    os.path.join(self.giit_path, "reports", name),
+                )
+
+        for name in self._listdir("virtualenvs"):
+            add("virtualenv", name, os.path.join(self.giit_path, "virtualenvs", name))
+
+        for (kind, name), item in items.items():
+            directory = "clones" if kind == "repository" else "virtualenvs"
+            item.lock_path = os.path.join(self.giit_path, directory, name + ".lock")
+            item.use_lock_path = os.path.join(
+                self.giit_path, directory, name + ".use.lock"
+            )
+
+            item.size = sum(self._size(path) for path in item.paths)
+            item.last_used = max(os.lstat(path).st_mtime for path in item.paths)
+
+        return sorted(items.values(), key=lambda item: item.last_used)
+
+    def collect(self, max_age=None, max_size=None):
+        """Remove items.
+
+        :param max_age: Remove the items not used for this many seconds, or
+            None.
+        :param max_size: Remove the least recently used items until the
+            items take up at most this many bytes, or None.
+        :return: List of the removed items
+        """
+        items = self.items()
+        size = sum(item.size for item in items)
+
+        removed = []
+
+        for item in items:
+
+            too_old = max_age is not None and item.last_used < time.time() - max_age
+            too_big = max_size is not None and size > max_size
+
+            if not too_old and not too_big:
+                continue
+
+            # Running builds hold a shared lock while they use the item, we
+            # leave it alone until they are done
+            use_lock = giit.file_lock.FileLock(path=item.use_lock_path)
+
+            if not use_lock.acquire(blocking=False):
+                self.log.info("Skipping %s, it is in use", item)
+                continue
+
+            self.log.info(
+                "Removing %s (%s, last used %s)",
+                item,
+                _format_size(item.size),
+                time.strftime("%Y-%m-%d %H:%M", time.localtime(item.last_used)),
+            )
+
+            # Wait for others changing the item to finish. The lock files
+            # are kept, since others may be waiting for them.
+            try:
+                with giit.file_lock.FileLock(path=item.lock_path):
+                    for path in item.paths:
+                        if os.path.isdir(path) and not os.path.islink(path):
+                            shutil.rmtree(path, ignore_errors=True)
+                        elif os.path.exists(path):
+                            os.remove(path)
+
+                    if item.kind == "repository":
+                        with self._cache(unique_name=item.name) as cache:
+                            cache.clear()
+            finally:
+                use_lock.release()
+
+            size -= item.size
+            removed.append(item)
+
+        return removed
+
+    def log_usage(self):
+        """Log the disk usage of the items and other data in giit_path"""
+
+        for item in reversed(self.items()):
+
+            builds = ""
+
+            if item.kind == "repository":
+                with self._cache(unique_name=item.name) as cache:
+                    builds = " ({} builds cached)".format(cache.stats()["builds"])
+
+            self.log.info(
+                "%10s  %s  %s%s",
+                _format_size(item.size),
+                time.strftime("%Y-%m-%d %H:%M", time.localtime(item.last_used)),
+                item,
+                builds,
+            )
+
+        # Data which is not removed by the garbage collector
+        for name in [
+            "artifacts",
+            "wheelhouse",
+            giit.cache.Cache.DATABASE_FILE,
+        ] + giit.logs.log_files():
+            path = os.path.join(self.giit_path, name)
+
+            if os.path.exists(path):
+                self.log.info("%10s  %s", _format_size(self._size(path)), name)
+
+    def _cache(self, unique_name):
+        """:return: The giit.cache.Cache of the repository"""
+        return giit.cache.Cache(cache_path=self.giit_path, unique_name=unique_name)
+
+    def _listdir(self, *directory):
+        """:return: The entries in the directory, except lock files and
+        temporary entries.
+        """
+        path = os.path.join(self.giit_path, *directory)
+
+        if not os.path.isdir(path):
+            return []
+
+        return sorted(
+            name
+            for name in os.listdir(path)
+            if not name.endswith(".lock") and ".tmp-" not in name
+        )
+
+    @staticmethod
+    def _size(path):
+        """:return: The size of the file or directory in bytes. Files
+        hardlinked several times in the directory are only counted once.
+        """
+        if not os.path.isdir(path) or os.path.islink(path):
+            return os.lstat(path).st_size
+
+        inodes = set()
+        size = 0
+
+        for root, dirs, files in os.walk(path):
+            for filename in files:
+                info = os.lstat(os.path.join(root, filename))
+
+                if info.st_ino in inodes:
+                    continue
+
+                inodes.add(info.st_ino)
+                size += info.st_size
+
+        return size
+
+
+def _format_size(size):
+    """:return: The size in bytes as a human readable string"""
+
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return "{:.1f} {}".format(size, unit)
+        size /= 1024.0
+
+    return "{:.1f} TB".format(size)
@@ -4,6 +4,8 @@
 import os
 import json
 
+import giit.refspecs
+
 
 class GiitJson(object):
     def __init__(self, git_repository, log, config_path=None, config_branch=None):
@@ -41,12 +43,9 @@ class GiitJson(object):
     def _from_branch(self):
         self.log.info("Using giit.json from branch %s", self.config_branch)
 
-        self.git_repository.checkout_branch(remote_branch=self.config_branch)
-
-        config_path = os.path.join(self.git_repository.repository_path(), "giit.json")
+        self._sync(remote_branch=self.config_branch)
 
-        with open(config_path, "r") as config_file:
-            return json.load(config_file)
+        return self._from_remote_branch(remote_branch=self.config_branch)
 
     def _from_workingtree(self):
 
@@ -60,9 +59,30 @@ class GiitJson(object):
     def _from_default_branch(self):
         default_branch = self.git_repository.default_branch()
         self.log.info(f"Using giit.json from default branch origin/{default_branch}")
-        self.git_repository.checkout_branch(remote_branch=f"origin/{default_branch}")
+        self._sync(remote_branch=f"origin/{default_branch}")
 
-        config_path = os.path.join(self.git_repository.repository_path(), "giit.json")
+        return self._from_remote_branch(remote_branch=f"origin/{default_branch}")
 
-        with open(config_path, "r") as config_file:
-            return json.load(config_file)
+    def _from_remote_branch(self, remote_branch):
+        """Read the giit.json from the branch without checking it out"""
+
+        if remote_branch not in self.git_repository.remote_branches():
+            raise RuntimeError(
+                "No remote branch %s. These branches exits in the "
+                "repository %s" % (remote_branch, self.git_repository.remote_branches())
+            )
+
+        content = self.git_repository.read_file(
+            checkout=remote_branch, path="giit.json"
+        )
+
+        if content is None:
+            raise RuntimeError("No giit.json found on branch %s" % remote_branch)
+
+        return json.loads(content)
+
+    def _sync(self, remote_branch):
+        """Make sure we read the newest giit.json by fetching the branch"""
+
+        refspec = giit.refspecs.branch_refspec(remote_branch=remote_branch)
+        self.git_repository.sync(refspecs=[refspec], tags=False)
@@ -3,6 +3,13 @@
 
 import os
 import re
+import tarfile
+import threading
+
+import giit.git_refs
+import giit.git_cat_file
+import giit.prompt
+import giit.run_error
 
 
 class Git(object):
@@ -16,6 +23,10 @@ class Git(object):
         self.prompt = prompt
         self.log = log
 
+        # The running 'git cat-file --batch' processes by directory
+        self._cat_files = {}
+        self._cat_files_lock = threading.Lock()
+
     def version(self):
         """
         Runs 'git version' and return the version information as a tuple
@@ -41,11 +52,147 @@ class Git(object):
 
         return result.stdout.strip()
 
-    def clone(self, repository, directory, cwd):
+    def cat_file(self, ref, path, cwd):
+        """
+        Reads <ref>:<path> using 'git cat-file --batch' in the directory cwd.
+
+        The process is kept running and reused for the following reads in
+        the same directory until close() is called.
+
+        :param ref: The branch, tag or commit to read the file from
+        :param path: The path to the file relative to the root of the
+            repository, using / as separator.
+        :param cwd: The current working directory as a string
+        :return: The content of the file as bytes or None if it does not
+            exist.
+        """
+        with self._cat_files_lock:
+            if cwd not in self._cat_files:
+                self._cat_files[cwd] = giit.git_cat_file.GitCatFile(
+                    git_binary=self.git_binary,
+                    cwd=cwd,
+                    log=self.log,
+                    report=self.prompt.report,
+                )
+
+            cat_file = self._cat_files[cwd]
+
+        try:
+            return cat_file.read(
+                obj="{}:{}".format(ref, path),
+                timeout=giit.prompt.command_timeout(),
+            )
+        except giit.run_error.RunTimeoutError:
+            # The process was killed, the next read starts a new one
+            with self._cat_files_lock:
+                if self._cat_files.get(cwd) is cat_file:
+                    del self._cat_files[cwd]
+
+            cat_file.close()
+            raise
+
+    def close(self):
+        """
+        Stops the running 'git cat-file --batch' processes.
+        """
+        with self._cat_files_lock:
+            for cat_file in self._cat_files.values():
+                cat_file.close()
+
+            self._cat_files = {}
+
+    def clone(
+        self,
+        repository,
+        directory,
+        cwd,
+        filter_spec=None,
+        depth=None,
+        sparse=False,
+        bare=False,
+        reference=None,
+    ):
         """
         Runs 'git clone <repository> <directory>' in the directory cwd.
+
+        :param filter_spec: Partial clone filter e.g. blob:none or None
+        :param depth: Create a shallow clone with the history truncated to
+            depth commits for every branch, or None for the full history.
+        :param sparse: If True, initialize the sparse checkout such that
+            only the files in the root of the repository are checked out.
+        :param bare: If True, make a bare clone without a working tree.
+        :param reference: Path to a local repository to borrow objects from
+            using git alternates, or None.
+        """
+        args = [self.git_binary, "clone"]
+
+        if bare:
+            args.append("--bare")
+
+        if reference:
+            args += ["--reference", reference]
+
+        if filter_spec:
+            args.append("--filter={}".format(filter_spec))
+
+        if depth:
+            # The shallow clone should contain all branches
+            args += ["--depth", str(depth), "--no-single-branch"]
+
+        if sparse:
+            args.append("--sparse")
+
+        args += [repository, directory]
+
+        self.prompt.run(args, cwd=cwd)
+
+    def config(self, key, value, cwd):
+        """
+        Runs 'git config <key> <value>' in the directory cwd.
+        """
+        args = [self.git_binary, "config", key, value]
+        self.prompt.run(args, cwd=cwd)
+
+    def archive(self, ref, directory, cwd, paths=None):
+        """
+        Runs 'git archive <ref>' in the directory cwd and extracts the
+        files into directory.
+
+        The archive is written next to the directory and removed once it
+        is extracted. The index and working tree in cwd are not used.
+
+        :param ref: The commit or tree to export
+        :param directory: The directory to extract to
+        :param paths: List of pathspecs limiting the exported files or None
+        """
+        archive_path = os.path.normpath(directory) + ".tar"
+
+        args = [self.git_binary, "archive", "--format=tar", "-o", archive_path, ref]
+
+        if paths:
+            args += ["--"] + list(paths)
+
+        try:
+            # Run by the prompt, such that the timeouts and limits apply and
+            # the command is recorded in the run report
+            self.prompt.run(args, cwd=cwd)
+
+            with tarfile.open(archive_path, mode="r") as tar:
+                if hasattr(tarfile, "tar_filter"):
+                    tar.extractall(path=directory, filter="tar")
+                else:
+                    tar.extractall(path=directory)
+        finally:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+
+    def sparse_checkout(self, paths, cwd):
         """
-        args = [self.git_binary, "clone", repository, directory]
+        Runs 'git sparse-checkout set <paths>' in the directory cwd.
+
+        :param paths: List of the directories to check out
+        """
+        args = [self.git_binary, "sparse-checkout", "set"] + list(paths)
         self.prompt.run(args, cwd=cwd)
 
     def pull(self, cwd):
@@ -56,12 +203,21 @@ class Git(object):
         args = [self.git_binary, "pull"]
         self.prompt.run(args, cwd=cwd)
 
-    def fetch(self, repository, all, prune, cwd):
+    def fetch(self, repository, all, prune, cwd, tags=None, refspecs=None, depth=None):
         """
         Runs 'git fetch' in the directory cwd
+
+        :param tags: If True all tags are fetched, if False no tags are
+            fetched. If None git's default is used.
+        :param refspecs: List of refspecs to fetch or None
+        :param depth: Limit the history fetched for every ref to depth
+            commits, or None.
         """
 
-        args = [self.git_binary, "fetch", repository]
+        args = [self.git_binary, "fetch"]
+
+        if depth:
+            args += ["--depth", str(depth)]
 
         if all:
             args.append("--all")
@@ -69,18 +225,30 @@ class Git(object):
         if prune:
             args.append("--prune")
 
+        if tags is True:
+            args.append("--tags")
+
+        elif tags is False:
+            args.append("--no-tags")
+
+        if repository:
+            args.append(repository)
+
+        if refspecs:
+            args += refspecs
+
         self.prompt.run(args, cwd=cwd)
 
     def default_branch(self, cwd):
         """
         Returns the default branch, this is usually master or main.
         """
-        args = [self.git_binary, "symbolic-ref", "--short HEAD"]
+        args = [self.git_binary, "symbolic-ref", "--short", "HEAD"]
 
         result = self.prompt.run(args, cwd=cwd)
 
-        self.log.debug("default_branch=%s", result)
-        return result
+        self.log.debug("default_branch=%s", result.stdout)
+        return result.stdout.strip()
 
     def current_branch(self, cwd):
         """
@@ -202,6 +370,25 @@ class Git(object):
 
         self.prompt.run(args, cwd=cwd)
 
+    def worktree_add(self, path, ref, cwd):
+        """
+        Runs 'git worktree add --detach --force <path> <ref>' in the directory
+        cwd.
+
+        The worktree is created with a detached HEAD such that several
+        worktrees can have the same ref checked out.
+        """
+        args = [self.git_binary, "worktree", "add", "--detach", "--force", path, ref]
+        self.prompt.run(args, cwd=cwd)
+
+    def worktree_prune(self, cwd):
+        """
+        Runs 'git worktree prune' in the directory cwd. This removes the
+        administrative files of worktrees which have been deleted.
+        """
+        args = [self.git_binary, "worktree", "prune"]
+        self.prompt.run(args, cwd=cwd)
+
     def has_submodules(run, cwd):
         """
         Returns true if the repository in directory cwd contains the
@@ -252,6 +439,26 @@ class Git(object):
         tags = result.stdout.split("\n")
         return [t for t in tags if t != ""]
 
+    def refs(self, cwd):
+        """
+        Runs 'git for-each-ref' in the directory cwd and returns a snapshot of
+        the remote branches and tags with the commits they point to.
+
+        :param cwd: The current working directory as a string
+        :return: A giit.git_refs.GitRefs instance
+        """
+        args = [
+            self.git_binary,
+            "for-each-ref",
+            "--format=%(refname)%09%(objectname)%09%(*objectname)%09%(symref)"
+            "%09%(tree)%09%(*tree)",
+            "refs/remotes",
+            "refs/tags",
+        ]
+        result = self.prompt.run(args, cwd=cwd)
+
+        return giit.git_refs.GitRefs.from_for_each_ref(output=result.stdout)
+
     def remote_origin_url(self, cwd):
         """
         Runs 'git config --get remote.origin.url' in the directory cwd and
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import subprocess
+import threading
+import time
+
+from . import run_error
+from . import run_result
+
+
+class GitCatFile(object):
+    """Long running 'git cat-file --batch' process.
+
+    Reads objects such as <ref>:<path> from a repository without checking
+    them out and without starting a process per read.
+    """
+
+    def __init__(self, git_binary, cwd, log, report=None):
+        """Start the process.
+
+        :param git_binary: A string containing the path to a git executable.
+        :param cwd: The path to the repository as a string
+        :param log: A logging object
+        :param report: The giit.run_report.RunReport recording the process
+            when it is stopped, or None
+        """
+        self.cwd = cwd
+        self.log = log
+        self.report = report
+
+        # The requests and responses must not be interleaved
+        self.lock = threading.Lock()
+
+        self.args = [git_binary, "cat-file", "--batch"]
+
+        self.log.debug("command=%s, cwd=%s", self.args, cwd)
+
+        self.start_time = time.time()
+        self.output_bytes = 0
+        self.timed_out = False
+
+        self.popen = subprocess.Popen(
+            self.args,
+            cwd=cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def read(self, obj, timeout=None):
+        """Read an object.
+
+        :param obj: The object name e.g. origin/master:giit.json
+        :param timeout: The time in seconds the read may take or None. If
+            the read takes too long the process is killed and
+            RunTimeoutError is raised, the process cannot be used after.
+        :return: The content of the object as bytes or None if it does not
+            exist.
+        """
+        if "\n" in obj:
+            raise ValueError("Object names cannot contain newlines: %r" % obj)
+
+        with self.lock:
+            if self.timed_out:
+                raise RuntimeError("git cat-file --batch was killed in %s" % self.cwd)
+
+            timer = None
+
+            if timeout is not None:
+                timer = threading.Timer(timeout, self._kill)
+                timer.start()
+
+            try:
+                return self._read(obj=obj)
+            except Exception:
+                # Killing the process closes its pipes, which fails the read
+                if self.timed_out:
+                    raise run_error.RunTimeoutError(self._result(), timeout=timeout)
+                raise
+            finally:
+                if timer:
+                    timer.cancel()
+
+    def _read(self, obj):
+        """:return: The content of the object or None, see read(...)"""
+
+        self.popen.stdin.write(obj.encode("utf-8") + b"\n")
+        self.popen.stdin.flush()
+
+        header = self.popen.stdout.readline()
+
+        if not header:
+            raise RuntimeError("git cat-file --batch stopped in %s" % self.cwd)
+
+        # The header is "<sha1> <type> <size>" or "<obj> missing", where
+        # the object name may contain spaces
+        if header.endswith((b" missing\n", b" ambiguous\n")):
+            return None
+
+        size = int(header.rsplit(None, 2)[2])
+        content = self.popen.stdout.read(size)
+
+        if len(content) != size:
+            raise RuntimeError("git cat-file --batch stopped in %s" % self.cwd)
+
+        # The content is followed by a newline
+        self.popen.stdout.read(1)
+
+        self.output_bytes += len(header) + size + 1
+
+        return content
+
+    def close(self):
+        """Stop the process and record it in the report"""
+
+        try:
+            self.popen.stdin.close()
+        except OSError:
+            # The process was killed
+            pass
+
+        self.popen.wait()
+        self.popen.stdout.close()
+
+        if self.report:
+            self.report.add_command(run_result=self._result())
+
+    def _kill(self):
+        """Kill the process, e.g. when a read took too long"""
+
+        self.timed_out = True
+        self.popen.kill()
+
+    def _result(self):
+        """:return: A RunResult describing the process"""
+
+        return run_result.RunResult(
+            command=" ".join(self.args),
+            path=self.cwd,
+            stdout="",
+            stderr="",
+            returncode=self.popen.returncode,
+            time=time.time() - self.start_time,
+            env=None,
+            output_bytes=self.output_bytes,
+            timed_out=self.timed_out,
+        )
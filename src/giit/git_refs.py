@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import giit.tag_index
+
+
+class GitRefs(object):
+    """Snapshot of the remote branches and tags of a repository.
+
+    Both branches and tags map to the SHA1 of the commit they point to, for
+    annotated tags this is the commit the tag object points to.
+    """
+
+    def __init__(self, branches, tags, trees=None):
+        """Create a new snapshot.
+
+        :param branches: Dict mapping remote branches e.g. origin/master to
+            commit SHA1s. In the order returned by git.
+        :param tags: Dict mapping tags to commit SHA1s. In the order returned
+            by git.
+        :param trees: Dict mapping the remote branches and tags to the SHA1
+            of the tree of their commit, or None if not known.
+        """
+        self.branches = branches
+        self.tags = tags
+        self.trees = trees if trees else {}
+
+        # The giit.tag_index.TagIndex of the tags per relaxed setting
+        self.tag_indexes = {}
+
+    def remote_branches(self):
+        """:return: List of the remote branches"""
+        return list(self.branches)
+
+    def tag_names(self):
+        """:return: List of the tags"""
+        return list(self.tags)
+
+    def tag_index(self, relaxed=False):
+        """:return: The giit.tag_index.TagIndex of the tags, built the
+        first time it is needed.
+
+        :param relaxed: If True versions like 1.2 are accepted
+        """
+        if relaxed not in self.tag_indexes:
+            self.tag_indexes[relaxed] = giit.tag_index.TagIndex(
+                tags=self.tag_names(), relaxed=relaxed
+            )
+
+        return self.tag_indexes[relaxed]
+
+    def commit(self, ref):
+        """:return: The commit SHA1 of a remote branch or tag, or None if
+        the ref is not in the snapshot.
+        """
+        if ref in self.branches:
+            return self.branches[ref]
+
+        return self.tags.get(ref)
+
+    def tree(self, ref):
+        """:return: The tree SHA1 of a remote branch or tag, or None if
+        the ref is not in the snapshot.
+        """
+        return self.trees.get(ref)
+
+    @staticmethod
+    def from_for_each_ref(output):
+        """Parse the output of git for-each-ref.
+
+        Each line must contain the refname, objectname, *objectname, symref,
+        tree and *tree fields separated by tabs.
+
+        :param output: The output as a string
+        :return: A GitRefs instance
+        """
+        branches = {}
+        tags = {}
+        trees = {}
+
+        for line in output.splitlines():
+
+            if not line:
+                continue
+
+            refname, objectname, peeled, symref, tree, peeled_tree = line.split("\t")
+
+            # Skip symbolic refs such as origin/HEAD
+            if symref:
+                continue
+
+            commit = peeled if peeled else objectname
+            tree = peeled_tree if peeled_tree else tree
+
+            if refname.startswith("refs/remotes/"):
+                name = refname[len("refs/remotes/") :]
+                branches[name] = commit
+
+            elif refname.startswith("refs/tags/"):
+                name = refname[len("refs/tags/") :]
+                tags[name] = commit
+
+            else:
+                continue
+
+            if tree:
+                trees[name] = tree
+
+        return GitRefs(branches=branches, tags=tags, trees=trees)
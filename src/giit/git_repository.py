@@ -2,12 +2,31 @@
 # encoding: utf-8
 
 import os
+import pathlib
 import hashlib
 import shutil
+import threading
+import contextlib
+
+import giit.refspecs
+import giit.file_lock
 
 
 class GitRepository(object):
-    def __init__(self, repository, git, git_url_parser, clone_path, log):
+    def __init__(
+        self,
+        repository,
+        git,
+        git_url_parser,
+        clone_path,
+        log,
+        worktree_path=None,
+        clone_filter=None,
+        clone_depth=None,
+        sparse_paths=None,
+        mirror_path=None,
+        export_path=None,
+    ):
         """Create a new instance.
 
         :param repository: The repository either as an URL or path to a
@@ -18,6 +37,18 @@ class GitRepository(object):
         :param clone_path: The user specified where clones should
             be made
         :param log: A logging object
+        :param worktree_path: Where to create a git worktree per checkout. If
+            None all checkouts are made in the clone itself.
+        :param clone_filter: Partial clone filter e.g. blob:none or None
+        :param clone_depth: The number of commits to fetch for every branch
+            and tag or None to fetch the full history.
+        :param sparse_paths: List of the directories to check out or None
+            to check out the entire repository.
+        :param mirror_path: Directory with bare mirrors shared between
+            giit_path instances. The clone borrows the objects from the
+            mirror. If None the clone is made directly from the repository.
+        :param export_path: Where to export the tree of each checkout using
+            git archive. If None the checkouts are made using git.
         """
         if os.path.isdir(repository):
             self.repository = os.path.abspath(os.path.expanduser(repository))
@@ -29,8 +60,30 @@ class GitRepository(object):
         self.clone_path = os.path.abspath(os.path.expanduser(clone_path))
         self.log = log
 
-        # Cache some values
-        self._remote_branches = None
+        if worktree_path:
+            self.worktree_path = os.path.abspath(os.path.expanduser(worktree_path))
+        else:
+            self.worktree_path = None
+
+        self.clone_filter = clone_filter
+        self.clone_depth = clone_depth
+        self.sparse_paths = sparse_paths
+
+        if mirror_path:
+            self.mirror_path = os.path.abspath(os.path.expanduser(mirror_path))
+        else:
+            self.mirror_path = None
+
+        if export_path:
+            self.export_path = os.path.abspath(os.path.expanduser(export_path))
+        else:
+            self.export_path = None
+
+        # The mirror is updated at most once per run
+        self._mirror_updated = False
+
+        # Snapshot of the branches and tags, taken when first needed
+        self._refs = None
 
     def workingtree_path(self):
         """:return: The path to the workingtree if there is not workingtree
@@ -65,6 +118,51 @@ class GitRepository(object):
 
         return os.path.join(self.clone_path, self.unique_name())
 
+    def checkout_path(self, checkout):
+        """:return: The path where the checkout will be available. Without
+        worktrees or exports this is the path to the clone.
+        """
+        if self.export_path:
+            return os.path.join(
+                self.export_path, self.unique_name(), self._export_name(checkout)
+            )
+
+        if not self.worktree_path:
+            return self.repository_path()
+
+        # Branch names such as origin/bug/567 would otherwise result in
+        # nested directories
+        name = checkout.replace("/", "_")
+
+        return os.path.join(self.worktree_path, self.unique_name(), name)
+
+    def tree(self, checkout):
+        """:return: The SHA1 of the tree a branch or tag points to"""
+
+        tree = self.refs().tree(ref=checkout)
+
+        if tree:
+            return tree
+
+        return self.git.current_commit(
+            cwd=self.repository_path(), ref=checkout + "^{tree}"
+        )
+
+    def _export_name(self, checkout):
+        """:return: The name of the export directory for the checkout.
+
+        Checkouts with the same tree share the export, e.g. a branch and
+        the tag made from it.
+        """
+        tree = self.tree(checkout=checkout)
+
+        if not self.sparse_paths:
+            return tree
+
+        paths = "\n".join(self.sparse_paths).encode("utf-8")
+
+        return tree + "-" + hashlib.sha1(paths).hexdigest()[:6]
+
     def source_branch(self):
         """The source branch.
 
@@ -82,7 +180,7 @@ class GitRepository(object):
         current = self.git.current_branch(cwd=self.workingtree_path())
 
         # Fetch a list of remote branches
-        remote_branches = self.git.remote_branches(cwd=self.repository_path())
+        remote_branches = self.remote_branches()
 
         # The remote branches are in a list of "remote/branch"
         match = []
@@ -118,7 +216,10 @@ class GitRepository(object):
         return remote
 
     def clone(self):
-        """Clones the repository."""
+        """Clones the repository if it has not been cloned already.
+
+        Use sync(...) to update an existing clone.
+        """
 
         if not os.path.isdir(self.clone_path):
             os.makedirs(self.clone_path)
@@ -133,40 +234,298 @@ class GitRepository(object):
 
         self.log.debug("repository_path=%s", repository_path)
 
-        # Get the updates
-        if os.path.isdir(repository_path):
-            self.log.info("Running: git pull in %s", repository_path)
-            self.git.pull(cwd=repository_path)
+        # The branches and tags may change
+        self._refs = None
+
+        with self._repository_lock():
+
+            if not os.path.isdir(repository_path):
+                self._clone(repository_path=repository_path)
+
+            # The modification time tells the garbage collector when the
+            # clone was last used
+            os.utime(repository_path, None)
+
+            if self.sparse_paths:
+                self.git.sparse_checkout(paths=self.sparse_paths, cwd=repository_path)
+
+            if self.worktree_path:
+                # Forget about worktrees which have been deleted since last time
+                self.git.worktree_prune(cwd=repository_path)
+
+    def _clone(self, repository_path):
+        """Make the clone.
+
+        We clone into a temporary directory, such that an interrupted clone
+        is not mistaken for a complete one.
+        """
+        temp_path = "{}.tmp-{}".format(repository_path, os.getpid())
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+        if self.mirror_path:
+            self._clone_from_mirror(repository_path=temp_path)
 
         else:
             self.log.info("Running: git clone into %s", repository_path)
             self.git.clone(
-                repository=self.repository,
+                repository=self._clone_url(),
+                directory=temp_path,
+                cwd=self.clone_path,
+                filter_spec=self.clone_filter,
+                depth=self.clone_depth,
+                sparse=bool(self.sparse_paths),
+            )
+
+        os.rename(temp_path, repository_path)
+
+    def _repository_lock(self):
+        """:return: The lock which must be held while changing the clone
+        e.g. when fetching or adding worktrees.
+        """
+        return giit.file_lock.FileLock(path=self.repository_path() + ".lock")
+
+    def use_lock(self):
+        """:return: The lock shared by the builds using the clone and the
+        other data of the repository in giit_path. The garbage collector
+        only removes the data if it can take the lock exclusively.
+        """
+        return giit.file_lock.FileLock(
+            path=self.repository_path() + ".use.lock", shared=True
+        )
+
+    def checkout_lock(self, checkout):
+        """The lock which must be held while checking out a branch or tag
+        and using the checkout.
+
+        With the reset backend all checkouts share the same lock, since they
+        are made in the clone. Exports are never changed so they need no
+        lock.
+
+        :param checkout: The branch or tag
+        :return: The lock
+        """
+        if self.export_path:
+            return contextlib.nullcontext()
+
+        checkout_path = self.checkout_path(checkout=checkout)
+
+        return giit.file_lock.FileLock(path=checkout_path + ".checkout.lock")
+
+    def mirror_repository_path(self):
+        """:return: The path to the shared mirror or None if not used"""
+
+        if not self.mirror_path:
+            return None
+
+        return os.path.join(self.mirror_path, self.unique_name() + ".git")
+
+    def _mirror_lock(self, shared):
+        """:return: The lock protecting the mirror against concurrent updates
+
+        :param shared: True if we only read from the mirror
+        """
+        return giit.file_lock.FileLock(
+            path=self.mirror_repository_path() + ".lock", shared=shared
+        )
+
+    def _update_mirror(self):
+        """Create the shared mirror or fetch the latest changes into it."""
+
+        if self._mirror_updated:
+            return
+
+        mirror_path = self.mirror_repository_path()
+
+        with self._mirror_lock(shared=False):
+
+            if not os.path.isdir(mirror_path):
+                self.log.info("Running: git clone --bare into %s", mirror_path)
+
+                # Clone into a temporary directory, such that an interrupted
+                # clone is not mistaken for a mirror
+                temp_path = "{}.tmp-{}".format(mirror_path, os.getpid())
+                shutil.rmtree(temp_path, ignore_errors=True)
+
+                self.git.clone(
+                    repository=self.repository,
+                    directory=temp_path,
+                    cwd=self.mirror_path,
+                    bare=True,
+                )
+
+                # The clones borrowing objects from the mirror break if
+                # git gc prunes objects which are no longer reachable in
+                # the mirror
+                self.git.config(key="gc.pruneExpire", value="never", cwd=temp_path)
+
+                os.rename(temp_path, mirror_path)
+
+            else:
+                self.log.info("Running: git fetch in %s", mirror_path)
+                self.git.fetch(
+                    repository="origin",
+                    all=False,
+                    prune=True,
+                    refspecs=[giit.refspecs.MIRROR_BRANCHES, giit.refspecs.ALL_TAGS],
+                    cwd=mirror_path,
+                )
+
+        self._mirror_updated = True
+
+    def _clone_from_mirror(self, repository_path):
+        """Clone the repository from the mirror, borrowing its objects."""
+
+        self._update_mirror()
+
+        mirror_path = self.mirror_repository_path()
+
+        self.log.info("Running: git clone from %s", mirror_path)
+
+        with self._mirror_lock(shared=True):
+            # Cloning from a local path would hardlink the objects, using
+            # an URL only the alternates are set up.
+            self.git.clone(
+                repository=pathlib.Path(mirror_path).as_uri(),
                 directory=repository_path,
                 cwd=self.clone_path,
+                sparse=bool(self.sparse_paths),
+                reference=mirror_path,
             )
 
+    def _clone_url(self):
+        """:return: The URL to clone from"""
+
+        if not os.path.isdir(self.repository):
+            return self.repository
+
+        # Git ignores the filter and depth options when cloning from a
+        # local path, unless the path is given as an URL
+        if self.clone_filter or self.clone_depth:
+            return pathlib.Path(self.repository).as_uri()
+
+        return self.repository
+
+    def sync(self, refspecs=None, tags=True):
+        """Fetch the remote branches and tags into the clone.
+
+        The working tree of the clone is not touched, remote branches and
+        tags which have been deleted are pruned.
+
+        :param refspecs: List of the branch refspecs to fetch. If None all
+            branches are fetched.
+        :param tags: If True all tags are fetched.
+        """
+        if refspecs is None:
+            refspecs = [giit.refspecs.ALL_BRANCHES]
+
+        if not refspecs and not tags:
+            return
+
+        self.log.info("Running: git fetch in %s", self.repository_path())
+        self.log.debug("refspecs=%s tags=%s", refspecs, tags)
+
+        # We pass the tags as a refspec, such that deleted tags are pruned
+        if tags:
+            refspecs = refspecs + [giit.refspecs.ALL_TAGS]
+
+        if not self.mirror_path:
+            with self._repository_lock():
+                self.git.fetch(
+                    repository="origin",
+                    all=False,
+                    prune=True,
+                    tags=None if tags else False,
+                    refspecs=refspecs,
+                    depth=self.clone_depth,
+                    cwd=self.repository_path(),
+                )
+
+        else:
+            self._update_mirror()
+
+            # The locks are always taken in the same order
+            with self._repository_lock(), self._mirror_lock(shared=True):
+                self.git.fetch(
+                    repository=self.mirror_repository_path(),
+                    all=False,
+                    prune=True,
+                    tags=None if tags else False,
+                    refspecs=refspecs,
+                    cwd=self.repository_path(),
+                )
+
+        # The branches and tags may have changed, also make sure the files
+        # are read by a git cat-file process started after the fetch
+        self._refs = None
+        self.git.close()
+
+    def current_branch(self):
+        """:return: The branch checked out in the workingtree or None if
+        there is no workingtree.
+        """
+        if not self.workingtree_path():
+            return None
+
+        current = self.git.current_branch(cwd=self.workingtree_path())
+
+        # Detached HEAD e.g. (HEAD detached at 1.0.0)
+        if current.startswith("(") and current.endswith(")"):
+            return None
+
+        return current
+
     def default_branch(self):
         """:return: The default branch for the repository"""
         assert os.path.isdir(self.repository_path())
         return self.git.default_branch(cwd=self.repository_path())
 
+    def refs(self):
+        """:return: A giit.git_refs.GitRefs snapshot of the remote branches
+        and tags in the repository. The snapshot is only taken once.
+        """
+        if self._refs is None:
+            self._refs = self.git.refs(cwd=self.repository_path())
+
+        return self._refs
+
     def remote_branches(self):
         """:return: The remote branches specified for the repository"""
-        assert os.path.isdir(self.repository_path())
+        return self.refs().remote_branches()
 
-        if self._remote_branches is not None:
-            return self._remote_branches
+    def tags(self):
+        """:return: The tags specified for the repository"""
+        return self.refs().tag_names()
 
-        self._remote_branches = self.git.remote_branches(cwd=self.repository_path())
+    def commit(self, checkout):
+        """:return: The SHA1 of the commit a branch or tag points to"""
 
-        return self._remote_branches
+        commit = self.refs().commit(ref=checkout)
 
-    def tags(self):
-        """:return: The tags specified for the repository"""
+        if commit:
+            return commit
+
+        return self.git.current_commit(
+            cwd=self.repository_path(), ref=checkout + "^{commit}"
+        )
+
+    def read_file(self, checkout, path):
+        """Read a file from a branch or tag without checking it out.
+
+        :param checkout: The branch or tag
+        :param path: The path to the file relative to the root of the
+            repository
+        :return: The content of the file or None if it does not exist
+        """
         assert os.path.isdir(self.repository_path())
 
-        return self.git.tags(cwd=self.repository_path())
+        path = path.replace(os.path.sep, "/")
+
+        content = self.git.cat_file(ref=checkout, path=path, cwd=self.repository_path())
+
+        if content is None:
+            return None
+
+        return content.decode("utf-8")
 
     def checkout_branch(self, remote_branch):
         """Checkout a specific branch.
@@ -175,12 +534,12 @@ class GitRepository(object):
         """
 
         # Check if the branch exists
-        remotes = self.remote_branches()
+        remotes = self.refs().branches
 
         if remote_branch not in remotes:
             raise RuntimeError(
                 "No remote branch %s. These branches exits "
-                "in the repository %s" % (remote_branch, remotes)
+                "in the repository %s" % (remote_branch, list(remotes))
             )
 
         self._checkout(checkout=remote_branch)
@@ -189,19 +548,82 @@ class GitRepository(object):
         """Checkout a specific tag."""
 
         # Check if the tag exists
-        tags = self.tags()
+        tags = self.refs().tags
 
         if tag not in tags:
             raise RuntimeError(
-                "No tag %s. These tags exits " "in the repository %s" % (tag, tags)
+                "No tag %s. These tags exits "
+                "in the repository %s" % (tag, list(tags))
             )
 
         self._checkout(checkout=tag)
 
     def _checkout(self, checkout):
-        # https://stackoverflow.com/a/8888015/1717320
-        self.git.reset(branch=checkout, hard=True, cwd=self.repository_path())
+
+        checkout_path = self.checkout_path(checkout=checkout)
+
+        if self.export_path:
+            self._export(checkout=checkout, export_path=checkout_path)
+            return
+
+        if checkout_path == self.repository_path():
+            # https://stackoverflow.com/a/8888015/1717320
+            self.git.reset(branch=checkout, hard=True, cwd=checkout_path)
+
+        else:
+            with self._repository_lock():
+                added = not os.path.isdir(checkout_path)
+
+                if added:
+                    self.git.worktree_add(
+                        path=checkout_path, ref=checkout, cwd=self.repository_path()
+                    )
+
+            if not added:
+                self.git.reset(branch=checkout, hard=True, cwd=checkout_path)
+
         self.log.debug(
             "GitRepository: on commit %s",
-            self.git.current_commit(cwd=self.repository_path()),
+            self.git.current_commit(cwd=checkout_path),
+        )
+
+    def _export(self, checkout, export_path):
+        """Export the tree of the checkout using git archive.
+
+        The clone is only read, so several exports can run at the same time.
+        """
+        if os.path.isdir(export_path):
+            self.log.debug("GitRepository: using export %s", export_path)
+            return
+
+        # Export into a temporary directory, such that an interrupted
+        # export is not mistaken for a complete one
+        temp_path = "{}.tmp-{}-{}".format(
+            export_path, os.getpid(), threading.get_ident()
         )
+        os.makedirs(temp_path)
+
+        paths = None
+
+        if self.sparse_paths:
+            # As for sparse checkouts the files in the root are included
+            paths = list(self.sparse_paths) + [":(glob)*"]
+
+        try:
+            self.git.archive(
+                ref=self.tree(checkout=checkout),
+                directory=temp_path,
+                cwd=self.repository_path(),
+                paths=paths,
+            )
+        except BaseException:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            raise
+
+        try:
+            os.rename(temp_path, export_path)
+        except OSError:
+            # Someone else exported the same tree in the meantime
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+        self.log.debug("GitRepository: exported %s into %s", checkout, export_path)
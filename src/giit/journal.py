@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import json
+import os
+import threading
+import time
+
+
+class Journal(object):
+    """Append-only record of the tasks run by a build.
+
+    Each line of the journal is a JSON record telling that a task started,
+    succeeded or failed together with the commit and config hash it was
+    run with. Every record is synced to disk before the task carries on,
+    so the journal survives the build being killed.
+
+    Usage:
+
+        with giit.journal.Journal(path=path, resume=True) as journal:
+
+            if journal.completed(step="docs", task="1.0.0", revision=revision):
+                ...
+
+    When resuming, the tasks which succeeded with the same commit and
+    config are skipped.
+    """
+
+    def __init__(self, path, resume):
+        """Create a new journal.
+
+        :param path: The path to the journal file as a string
+        :param resume: If True the records of the earlier build are read and
+            new records are appended, otherwise the journal is started over.
+        """
+        self.path = path
+        self.resume = resume
+
+        # The last record of each (step, task) in the earlier build
+        self.records = {}
+
+        # The file is shared by the threads running tasks
+        self.file = None
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+
+        directory = os.path.dirname(self.path)
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        if self.resume:
+            self.records = self._read()
+            self._truncate_partial()
+
+        self.file = open(self.path, "a" if self.resume else "w", encoding="utf-8")
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.file.close()
+        self.file = None
+
+    def completed(self, step, task, revision):
+        """:return: True if the task succeeded in the earlier build with the
+        same commit and config, otherwise False.
+        """
+        record = self.records.get((step, task))
+
+        if record is None or record["event"] != "success":
+            return False
+
+        return (
+            record["commit"] == revision["commit"]
+            and record["config_hash"] == revision["config_hash"]
+        )
+
+    def start(self, step, task, revision):
+        """Record that the task started"""
+        self._append(event="start", step=step, task=task, revision=revision)
+
+    def success(self, step, task, revision):
+        """Record that the task succeeded"""
+        self._append(event="success", step=step, task=task, revision=revision)
+
+    def failure(self, step, task, revision):
+        """Record that the task failed"""
+        self._append(event="failure", step=step, task=task, revision=revision)
+
+    def _append(self, event, step, task, revision):
+
+        record = {
+            "event": event,
+            "step": step,
+            "task": task,
+            "commit": revision["commit"],
+            "config_hash": revision["config_hash"],
+            "time": time.time(),
+        }
+
+        with self.lock:
+            self.file.write(json.dumps(record, sort_keys=True) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def _truncate_partial(self):
+        """Remove the last record if it was cut short, such that the next
+        record starts on its own line.
+        """
+        try:
+            with open(self.path, "rb+") as journal_file:
+                size = journal_file.seek(0, os.SEEK_END)
+
+                if size == 0:
+                    return
+
+                journal_file.seek(size - 1)
+
+                if journal_file.read(1) == b"\n":
+                    return
+
+                # Find the end of the last complete record
+                journal_file.seek(0)
+                end = journal_file.read().rfind(b"\n") + 1
+
+                journal_file.truncate(end)
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+
+        except FileNotFoundError:
+            pass
+
+    def _read(self):
+        """:return: Dict with the last record of each (step, task)"""
+
+        records = {}
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as journal_file:
+                for line in journal_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # The last record may be cut short if the build was
+                        # killed while writing it
+                        continue
+
+                    records[(record["step"], record["task"])] = record
+
+        except FileNotFoundError:
+            pass
+
+        return records
@@ -4,6 +4,97 @@
 import os
 import sys
 import logging
+import logging.handlers
+import threading
+import contextlib
+
+# The size giit.log may grow to before it is rotated and the number of
+# rotated files kept
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 2
+
+# Keeps track of the task running in the current thread
+_task = threading.local()
+
+
+class TaskFilter(logging.Filter):
+    """Prefix the log records with the task running in the current thread.
+
+    When tasks run in parallel their output is interleaved, the prefix makes
+    it possible to tell which task a line belongs to.
+    """
+
+    def filter(self, record):
+
+        # Records logged on behalf of a task by another thread carry the
+        # name of the task, see task_name()
+        name = getattr(record, "task_name", None) or getattr(_task, "name", None)
+        record.task = "[{}] ".format(name) if name else ""
+
+        return True
+
+
+@contextlib.contextmanager
+def task_scope(name):
+    """Mark the log records emitted by the current thread with the task name.
+
+    :param name: The name of the task as a string
+    """
+    _task.name = name
+
+    try:
+        yield
+    finally:
+        _task.name = None
+
+
+def task_name():
+    """:return: The name of the task running in the current thread or None.
+    Pass it as extra={"task_name": name} when logging for the task from
+    another thread.
+    """
+    return getattr(_task, "name", None)
+
+
+@contextlib.contextmanager
+def task_log(path):
+    """Write the output of the commands streamed by the current thread to a
+    log file, see giit.prompt.Prompt.run(...). The file is replaced.
+
+    :param path: The path to the log file as a string
+    """
+    directory = os.path.dirname(path)
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path, "w") as log_file:
+        _task.log_file = log_file
+
+        try:
+            yield
+        finally:
+            _task.log_file = None
+
+
+def task_log_file():
+    """:return: The log file of the task running in the current thread or
+    None.
+    """
+    return getattr(_task, "log_file", None)
+
+
+def write_task_log(text):
+    """Write to the log file of the task running in the current thread, if
+    any.
+
+    :param text: The text to write as a string
+    """
+    log_file = task_log_file()
+
+    if log_file:
+        log_file.write(text)
+        log_file.flush()
 
 
 def setup_logging(giit_path, verbose):
@@ -11,9 +102,12 @@ def setup_logging(giit_path, verbose):
     logger = logging.getLogger("giit")
     logger.setLevel(logging.DEBUG)
 
-    # Create file handler which logs even debug messages
+    # Create file handler which logs even debug messages, the file is
+    # rotated so it does not grow forever
     logfile = os.path.join(giit_path, "giit.log")
-    fh = logging.FileHandler(logfile)
+    fh = logging.handlers.RotatingFileHandler(
+        logfile, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT
+    )
     fh.setLevel(logging.DEBUG)
 
     # Create console handler with a higher log level
@@ -22,13 +116,22 @@ def setup_logging(giit_path, verbose):
 
     # Create formatter and add it to the handlers
     fh_formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        "%(asctime)s - %(name)s - %(levelname)s - %(task)s%(message)s"
     )
     fh.setFormatter(fh_formatter)
+    fh.addFilter(TaskFilter())
 
-    ch_formatter = logging.Formatter("%(message)s")
+    ch_formatter = logging.Formatter("%(task)s%(message)s")
     ch.setFormatter(ch_formatter)
+    ch.addFilter(TaskFilter())
 
     # Add the handlers to the logger
     logger.addHandler(fh)
     logger.addHandler(ch)
+
+
+def log_files():
+    """:return: The names of giit.log and its rotated files in giit_path"""
+    return ["giit.log"] + [
+        "giit.log.{}".format(index) for index in range(1, LOG_BACKUP_COUNT + 1)
+    ]
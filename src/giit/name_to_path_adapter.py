@@ -9,8 +9,42 @@ class NameToPathAdapter(object):
         self.env = env
         self.root_path = root_path
 
-    def create_environment(self, name):
+    def create_environment(self, name, base_name=None):
+        """Create the environment.
 
-        path = os.path.join(self.root_path, name)
+        :param name: The name of the environment
+        :param base_name: The name of an existing environment to copy the
+            installed packages from, or None.
+        """
+        path = self.path(name=name)
 
-        return self.env.create_environment(path=path)
+        if not base_name:
+            env = self.env.create_environment(path=path)
+        else:
+            env = self.env.create_environment(
+                path=path, base_path=self.path(name=base_name)
+            )
+
+        # The modification time tells the garbage collector when the
+        # environment was last used
+        if os.path.isdir(path):
+            os.utime(path, None)
+
+        return env
+
+    def path(self, name):
+        """:return: The path to the environment with the given name"""
+
+        return os.path.join(self.root_path, name)
+
+    def names(self):
+        """:return: List of the names of the existing environments"""
+
+        if not os.path.isdir(self.root_path):
+            return []
+
+        return sorted(
+            name
+            for name in os.listdir(self.root_path)
+            if os.path.isdir(os.path.join(self.root_path, name))
+        )
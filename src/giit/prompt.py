@@ -2,17 +2,152 @@
 # encoding: utf-8
 
 import os
+import sys
 import subprocess
 import time
 import logging
+import signal
+import threading
+import contextlib
+import collections
 
 from . import compat
+from . import logs
 from . import run_result
 from . import run_error
 
+# Keeps track of the deadline of the task running in the current thread
+_task = threading.local()
+
+
+@contextlib.contextmanager
+def task_timeout(timeout):
+    """Limit the time the commands run by the current thread may take
+    together. A command still running when the time is up is killed.
+
+    :param timeout: The time in seconds or None for no limit
+    """
+    _task.deadline = time.time() + timeout if timeout else None
+
+    try:
+        yield
+    finally:
+        _task.deadline = None
+
+
+def command_timeout(timeout=None):
+    """:return: The time in seconds a command run by the current thread may
+    take, the smallest of timeout and the time left of the task, or None
+    for no limit.
+    """
+    deadline = getattr(_task, "deadline", None)
+
+    if deadline is None:
+        return timeout
+
+    remaining = max(0.0, deadline - time.time())
+
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def kill_process_group(pid):
+    """Kill the process and the processes it started.
+
+    The process must have been started in its own session, see
+    start_new_session in subprocess.Popen(...). On Windows only the
+    process itself is killed.
+
+    :param pid: The id of the process
+    """
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(pid, signal.SIGKILL)
+        else:
+            os.kill(pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        # The process already exited
+        pass
+
+
+def log_failed_output(log, result):
+    """Log the last lines of the output of a streamed command which failed.
+
+    While the command runs its output is only logged at debug level, so
+    the console is not flooded by e.g. Sphinx or pip.
+
+    :param log: A logging object
+    :param result: The RunResult of the command
+    """
+    log.error(
+        "Command failed with returncode %s: %s\n%s",
+        result.returncode,
+        result.command,
+        result.stdout.rstrip("\n"),
+    )
+
+
+def _communicate(popen):
+    """Read the standard output and error until the process closes them.
+
+    Unlike Popen.communicate(...) the process is not waited for, such that
+    _wait(...) can collect its resource usage.
+
+    :return: Tuple with the standard output and error, None if not piped
+    """
+    stderr = []
+    thread = None
+
+    if popen.stderr:
+        thread = threading.Thread(target=lambda: stderr.append(popen.stderr.read()))
+        thread.daemon = True
+        thread.start()
+
+    stdout = None
+
+    if popen.stdout:
+        with popen.stdout:
+            stdout = popen.stdout.read()
+
+    if thread:
+        thread.join()
+        popen.stderr.close()
+
+    return stdout, stderr[0] if stderr else None
+
+
+def _wait(popen):
+    """Wait for the process to exit and set its returncode.
+
+    :return: The resource usage of the process or None where os.wait4 is
+        not available.
+    """
+    if not hasattr(os, "wait4"):
+        popen.wait()
+        return None
+
+    try:
+        pid, status, rusage = os.wait4(popen.pid, 0)
+    except ChildProcessError:
+        # Same as Popen, this happens if SIGCLD is ignored
+        popen.wait()
+        return None
+
+    if os.WIFSIGNALED(status):
+        popen.returncode = -os.WTERMSIG(status)
+    else:
+        popen.returncode = os.WEXITSTATUS(status)
+
+    return rusage
+
 
 class Prompt(object):
-    def __init__(self, cwd=None, env=None, stdout=None, stderr=None, log=None):
+
+    # The number of output lines kept in the RunResult of a streamed command
+    TAIL_LINES = 100
+
+    def __init__(
+        self, cwd=None, env=None, stdout=None, stderr=None, log=None, report=None
+    ):
 
         self.cwd = cwd if cwd else os.getcwd()
         self.env = env if env else dict(os.environ)
@@ -20,9 +155,23 @@ class Prompt(object):
         self.stderr = stderr if stderr else subprocess.PIPE
         self.log = log if log else logging.getLogger(__name__)
 
-    def run(self, command, **kwargs):
+        # The giit.run_report.RunReport recording the commands or None
+        self.report = report
+
+    def run(self, command, stream=False, timeout=None, **kwargs):
         """Runs the command
         :param command: String or list of arguments
+        :param stream: If True the output is logged line by line while the
+            command runs and written to the log file of the current task,
+            see giit.logs.task_log(...). The standard error is merged into
+            the standard output and only the last TAIL_LINES lines are
+            kept in the RunResult. Otherwise the output is collected and
+            returned when the command exits.
+        :param timeout: The time in seconds the command may take or None.
+            If the current task has a timeout, see task_timeout(...), the
+            command is also killed when the task is out of time. A command
+            which takes too long is killed with the processes it started
+            and RunTimeoutError is raised.
         :param kwargs: Keyword arguments passed to Popen(...)
         :return: A RunResult object representing the result of the command
         """
@@ -33,6 +182,10 @@ class Prompt(object):
         if "env" not in kwargs:
             kwargs["env"] = self.env
 
+        if stream:
+            kwargs["stdout"] = subprocess.PIPE
+            kwargs["stderr"] = subprocess.STDOUT
+
         if "stdout" not in kwargs:
             kwargs["stdout"] = self.stdout
 
@@ -42,6 +195,13 @@ class Prompt(object):
         if "cwd" not in kwargs:
             kwargs["cwd"] = self.cwd
 
+        timeout = command_timeout(timeout=timeout)
+
+        if timeout is not None:
+            # Run the command in its own process group, such that the
+            # processes it starts can be killed with it
+            kwargs["start_new_session"] = True
+
         self.log.debug("command=%s, cwd=%s", command, kwargs["cwd"])
 
         start_time = time.time()
@@ -54,13 +214,48 @@ class Prompt(object):
             **kwargs
         )
 
-        stdout, stderr = popen.communicate()
-
-        end_time = time.time()
-
         if isinstance(command, list):
             command = " ".join(command)
 
+        # The timer kills the processes which closes their output, so
+        # reading the output stops in both modes
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            kill_process_group(pid=popen.pid)
+
+        timer = None
+
+        if timeout is not None:
+            timer = threading.Timer(timeout, kill)
+            timer.daemon = True
+            timer.start()
+
+        try:
+            if stream:
+                stdout, stderr, output_bytes = self._stream(
+                    popen=popen, command=command
+                )
+            else:
+                stdout, stderr = _communicate(popen=popen)
+                output_bytes = sum(
+                    len(o.encode("utf-8")) for o in (stdout, stderr) if o
+                )
+
+            rusage = _wait(popen=popen)
+        except BaseException:
+            # E.g. KeyboardInterrupt, processes in their own session would
+            # not get it
+            if timer:
+                kill()
+            raise
+        finally:
+            if timer:
+                timer.cancel()
+
+        end_time = time.time()
+
         result = run_result.RunResult(
             command=command,
             path=kwargs["cwd"],
@@ -69,9 +264,56 @@ class Prompt(object):
             returncode=popen.returncode,
             time=end_time - start_time,
             env=kwargs["env"],
+            output_bytes=output_bytes,
+            timed_out=timed_out.is_set() and popen.returncode != 0,
         )
 
+        if rusage:
+            result.user_time = rusage.ru_utime
+            result.system_time = rusage.ru_stime
+
+            # The maximum resident set size is in kilobytes on Linux
+            if sys.platform == "darwin":
+                result.max_rss = rusage.ru_maxrss
+            else:
+                result.max_rss = rusage.ru_maxrss * 1024
+
+        if self.report:
+            self.report.add_command(run_result=result)
+
+        if stream and result.returncode != 0:
+            log_failed_output(log=self.log, result=result)
+
+        if result.timed_out:
+            raise run_error.RunTimeoutError(result, timeout=timeout)
+
         if popen.returncode != 0:
             raise run_error.RunError(result)
 
         return result
+
+    def close(self):
+        """Nothing to release, the processes are waited for by run(...)"""
+        pass
+
+    def _stream(self, popen, command):
+        """Forward the output of the process line by line until it closes.
+
+        :return: Tuple with the last lines of the output, an empty standard
+            error (it is merged into the output) and the size of the output
+            in bytes.
+        """
+        tail = collections.deque(maxlen=Prompt.TAIL_LINES)
+        output_bytes = 0
+
+        logs.write_task_log("$ {}\n".format(command))
+
+        with popen.stdout:
+            for line in popen.stdout:
+                output_bytes += len(line.encode("utf-8"))
+                tail.append(line)
+
+                logs.write_task_log(line)
+                self.log.debug("%s", line.rstrip("\n"))
+
+        return "".join(tail), "", output_bytes
@@ -13,7 +13,28 @@ class PythonCommand(object):
         self.prompt = prompt
         self.log = log
 
+    def environment_name(self, config, requirements_content):
+        """:return: The name of the Python environment the config will use.
+
+        :param config: The config with the context filled in
+        :param requirements_content: The content of the requirements file
+            as a string
+        """
+        if config["requirements"] is None and config["pip_packages"] is None:
+            return "system"
+
+        return self.environment.environment_name(
+            requirements_content=requirements_content,
+            pip_packages=config["pip_packages"],
+        )
+
     def run(self, config):
+        """Run the scripts in the config.
+
+        :param config: The config with the context filled in
+        :return: True if the scripts ran successfully. False if they failed
+            but the config allows failures.
+        """
 
         self.log.debug("config_without_context =%s", config)
 
@@ -29,25 +50,33 @@ class PythonCommand(object):
         # repository here. This may fail on older tags etc. and
         # that is OK if allow_failure is true
         try:
-            env = self.environment.from_requirements(
+            with self.environment.use(
                 requirements=config["requirements"], pip_packages=config["pip_packages"]
-            )
+            ) as env:
+                if config["python_path"]:
+                    if "PYTHONPATH" in env:
+                        env["PYTHONPATH"] = os.path.pathsep.join(
+                            [config["python_path"], env["PYTHONPATH"]]
+                        )
+                    else:
+                        env["PYTHONPATH"] = config["python_path"]
 
-            if config["python_path"]:
-                if "PYTHONPATH" in env:
-                    env["PYTHONPATH"] = os.path.pathsep.join(
-                        [config["python_path"], env["PYTHONPATH"]]
+                for script in config["scripts"]:
+                    self.log.info("Python: %s", script)
+                    self.prompt.run(
+                        command=script,
+                        cwd=config["cwd"],
+                        env=env,
+                        stream=True,
+                        timeout=config["timeout"],
                     )
-                else:
-                    env["PYTHONPATH"] = config["python_path"]
-
-            for script in config["scripts"]:
-                self.log.info("Python: %s", script)
-                self.prompt.run(command=script, cwd=config["cwd"], env=env)
 
         except Exception:
 
             if config["allow_failure"]:
                 self.log.exception("PythonCommand")
+                return False
             else:
                 raise
+
+        return True
@@ -4,11 +4,50 @@
 import sys
 import hashlib
 import os
+import re
 import json
+import time
+import contextlib
+
+import giit.file_lock
+
+
+def _requirement(line):
+    """Parse a line in a requirements file or the output of pip freeze.
+
+    :return: A tuple with the normalized project name and the pinned version
+        or None, or None if the line is not a requirement.
+    """
+    line = line.split("#")[0].split(";")[0].strip()
+
+    if not line or line.startswith("-") or "://" in line:
+        return None
+
+    name = re.split(r"[<>=!~\[\s@]", line)[0]
+    name = re.sub(r"[-_.]+", "-", name).lower()
+
+    version = None
+
+    if "==" in line:
+        version = line.split("==")[1].strip()
+
+    return (name, version)
 
 
 class PythonEnvironment(object):
-    def __init__(self, prompt, virtual_environment, log):
+
+    # Written to the environment after the packages have been installed
+    SEAL_FILE = "giit-seal.json"
+
+    def __init__(
+        self,
+        prompt,
+        virtual_environment,
+        log,
+        refresh_time=None,
+        wheelhouse_path=None,
+        install="index",
+    ):
         """Create new environments for running python commands.
 
         Essentially, if needed, we just create a virtual
@@ -18,10 +57,22 @@ class PythonEnvironment(object):
         :param prompt: A Prompt object
         :param virtual_environment: A Virtual Envionment object
         :param log: A log object
+        :param refresh_time: Environments sealed before this time (in seconds
+            since the epoch) are updated using pip. Environments sealed
+            after are used as they are. If None pip is always run.
+        :param wheelhouse_path: Directory with the wheels built for the
+            environments. Must be given unless install is index.
+        :param install: Where pip installs the packages from. Either index
+            to install from the package index, wheelhouse to first build
+            the wheels into the wheelhouse and install from there, or
+            offline to only install from the wheelhouse.
         """
         self.prompt = prompt
         self.virtual_environment = virtual_environment
         self.log = log
+        self.refresh_time = refresh_time
+        self.wheelhouse_path = wheelhouse_path
+        self.install = install
 
     def from_requirements(self, requirements, pip_packages):
         """Create an environment from a requirements file.
@@ -35,7 +86,73 @@ class PythonEnvironment(object):
             requirements=requirements, pip_packages=pip_packages
         )
 
-        env = self.virtual_environment.create_environment(name=name)
+        return self._from_name(
+            name=name, requirements=requirements, pip_packages=pip_packages
+        )
+
+    @contextlib.contextmanager
+    def use(self, requirements, pip_packages):
+        """Create the environment like from_requirements(...) and keep the
+        garbage collector from removing it while it is used.
+
+        Usage:
+
+            with environment.use(requirements=path, pip_packages=None) as env:
+                ...
+
+        :param requirements: Path to the requirements
+        :param pip_packages: List of additional pip packages or None
+        """
+        if requirements is None and pip_packages is None:
+            yield self.from_system()
+            return
+
+        name = self._environment_name(
+            requirements=requirements, pip_packages=pip_packages
+        )
+
+        # The garbage collector only removes the environment if it can take
+        # the lock exclusively
+        lock_path = self.virtual_environment.path(name=name) + ".use.lock"
+
+        with giit.file_lock.FileLock(path=lock_path, shared=True):
+            yield self._from_name(
+                name=name, requirements=requirements, pip_packages=pip_packages
+            )
+
+    def _from_name(self, name, requirements, pip_packages):
+
+        # Tasks running in parallel, also in other processes, may need the
+        # same environment. Only one of them should create and update it at
+        # a time.
+        lock_path = self.virtual_environment.path(name=name) + ".lock"
+
+        with giit.file_lock.FileLock(path=lock_path):
+            return self._create_environment(
+                name=name, requirements=requirements, pip_packages=pip_packages
+            )
+
+    def _create_environment(self, name, requirements, pip_packages):
+
+        path = self.virtual_environment.path(name=name)
+
+        base_name = None
+
+        if not os.path.isdir(path):
+            base_name = self._closest_environment(
+                name=name, requirements=requirements, pip_packages=pip_packages
+            )
+
+        env = self.virtual_environment.create_environment(
+            name=name, base_name=base_name
+        )
+
+        seal = self._read_seal(path=path)
+
+        if seal and self.refresh_time is not None:
+            if seal["time"] >= self.refresh_time:
+                self.log.debug("Using sealed environment %s", name)
+                return env
 
         # We use the -U (--upgrade) to pip since otherwise it will
         # not update to the newest version available. Also when
@@ -45,18 +162,127 @@ class PythonEnvironment(object):
 
         if requirements:
             # Install the requirements
-            command = "python -m pip install -U -r {}".format(requirements)
-            self.prompt.run(command=command, env=env)
+            self._pip_install(arguments="-r {}".format(requirements), env=env)
 
         if pip_packages:
             # Install the pip packages
-            pip_packages = " ".join(pip_packages)
-            command = "python -m pip install -U {}".format(pip_packages)
+            self._pip_install(arguments=" ".join(pip_packages), env=env)
 
-            self.prompt.run(command=command, env=env)
+        self._write_seal(path=path, env=env)
 
         return env
 
+    def _pip_install(self, arguments, env):
+        """Install the packages using pip.
+
+        :param arguments: The requirements or packages to install as a
+            string e.g. "-r requirements.txt"
+        :param env: The environment to run pip in
+        """
+
+        if self.install == "index":
+            command = "python -m pip install -U {}".format(arguments)
+            self.prompt.run(command=command, env=env, stream=True)
+            return
+
+        if self.install == "wheelhouse":
+            # Wheels already in the wheelhouse are not downloaded or built
+            # again. Concurrent builds of the same wheel would clash.
+            command = "python -m pip wheel --find-links {0} -w {0} {1}".format(
+                self.wheelhouse_path, arguments
+            )
+
+            with giit.file_lock.FileLock(path=self.wheelhouse_path + ".lock"):
+                self.prompt.run(command=command, env=env, stream=True)
+
+        command = "python -m pip install -U --no-index --find-links {} {}".format(
+            self.wheelhouse_path, arguments
+        )
+        self.prompt.run(command=command, env=env, stream=True)
+
+    def _closest_environment(self, name, requirements, pip_packages):
+        """Find the sealed environment with the most packages in common.
+
+        :return: The name of the environment or None if no environment
+            has any of the packages installed.
+        """
+        wanted = []
+
+        if requirements:
+            with open(requirements, "r") as f:
+                wanted += f.read().splitlines()
+
+        if pip_packages:
+            wanted += pip_packages
+
+        wanted = [_requirement(line) for line in wanted]
+        wanted = [requirement for requirement in wanted if requirement]
+
+        # The environments must use the same Python
+        python_hash = name.split("-")[-1]
+
+        closest = None
+        closest_score = (0, 0)
+
+        for other in self.virtual_environment.names():
+
+            if other == name or other.split("-")[-1] != python_hash:
+                continue
+
+            seal = self._read_seal(path=self.virtual_environment.path(name=other))
+
+            if not seal:
+                continue
+
+            installed = [_requirement(line) for line in seal["freeze"]]
+            installed_names = set(n for n, _ in installed if n)
+
+            # Packages with the same version count the most
+            score = (
+                sum(1 for requirement in wanted if requirement in installed),
+                sum(1 for n, _ in wanted if n in installed_names),
+            )
+
+            if score > closest_score:
+                closest = other
+                closest_score = score
+
+        if closest:
+            self.log.debug("Closest environment to %s is %s", name, closest)
+
+        return closest
+
+    def _read_seal(self, path):
+        """:return: The seal of the environment as a dict or None if the
+        environment was not sealed.
+        """
+        seal_path = os.path.join(path, PythonEnvironment.SEAL_FILE)
+
+        if not os.path.isfile(seal_path):
+            return None
+
+        try:
+            with open(seal_path, "r") as seal_file:
+                return json.load(seal_file)
+        except ValueError:
+            return None
+
+    def _write_seal(self, path, env):
+        """Mark the environment as complete, recording the installed
+        packages.
+        """
+        result = self.prompt.run(command="python -m pip freeze", env=env)
+
+        seal = {"time": time.time(), "freeze": result.stdout.splitlines()}
+
+        seal_path = os.path.join(path, PythonEnvironment.SEAL_FILE)
+        temp_path = seal_path + ".tmp"
+
+        with open(temp_path, "w") as seal_file:
+            json.dump(seal, seal_file, indent=2)
+
+        os.replace(temp_path, seal_path)
+
     def from_system(self):
         """:return: The default environment."""
         return dict(os.environ)
@@ -72,6 +298,18 @@ class PythonEnvironment(object):
         else:
             requirements_content = ""
 
+        return self.environment_name(
+            requirements_content=requirements_content, pip_packages=pip_packages
+        )
+
+    def environment_name(self, requirements_content, pip_packages):
+        """Create an unique name for the environment.
+
+        :param requirements_content: The content of the requirements file as
+            a string
+        :param pip_packages: List of additional pip packages or None
+        """
+
         # We need to make a hashable name
         info = json.dumps(
             {"requirements": requirements_content, "pip_packages": pip_packages}
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import re
+
+# All branches of the origin remote
+ALL_BRANCHES = "+refs/heads/*:refs/remotes/origin/*"
+
+# All branches of the origin remote, as local branches in a mirror
+MIRROR_BRANCHES = "+refs/heads/*:refs/heads/*"
+
+# All tags, when given as a refspec deleted tags are also pruned
+ALL_TAGS = "+refs/tags/*:refs/tags/*"
+
+# Branch filters which are just a (prefix of a) branch name
+_literal_filter = re.compile(r"^origin/((?:[A-Za-z0-9_/-]|\\\.)*)(\$?)$")
+
+
+def branch_refspec(remote_branch):
+    """:return: The refspec for fetching a single remote branch
+
+    :param remote_branch: The remote branch e.g. origin/master
+    """
+    remote, branch = remote_branch.split("/", 1)
+
+    return "+refs/heads/{0}:refs/remotes/{1}/{0}".format(branch, remote)
+
+
+def _filter_refspec(regex_filter):
+    """:return: The refspec fetching the branches a regex filter can match,
+    or None if we cannot tell which branches that is.
+    """
+
+    match = _literal_filter.match(regex_filter)
+
+    if not match:
+        return None
+
+    branch, anchored = match.groups()
+    branch = branch.replace("\\.", ".")
+
+    if not branch:
+        return ALL_BRANCHES
+
+    if anchored:
+        return branch_refspec(remote_branch="origin/" + branch)
+
+    # The filters are matched using re.match(...) so e.g. origin/master
+    # also matches origin/master-lts
+    return "+refs/heads/{0}*:refs/remotes/origin/{0}*".format(branch)
+
+
+def from_configs(configs, current_branch):
+    """Find what needs to be fetched for the branch and tag filters.
+
+    :param configs: List of validated configs
+    :param current_branch: The branch checked out in the workingtree or
+        None. Used if the config builds the source branch.
+    :return: Tuple (refspecs, tags) where refspecs is the list of branch
+        refspecs to fetch and tags is True if the tags should be fetched.
+    """
+
+    refspecs = []
+    tags = False
+
+    for config in configs:
+
+        if config["no_git"]:
+            continue
+
+        for regex_filter in config["branches"]["regex"]["filters"]:
+            refspec = _filter_refspec(regex_filter=regex_filter)
+
+            if refspec is None:
+                refspec = ALL_BRANCHES
+
+            refspecs.append(refspec)
+
+        if config["branches"]["source_branch"]:
+            if current_branch:
+                refspecs.append(
+                    branch_refspec(remote_branch="origin/" + current_branch)
+                )
+            else:
+                refspecs.append(ALL_BRANCHES)
+
+        if config["tags"]["regex"]["filters"] or config["tags"]["semver"]["filters"]:
+            tags = True
+
+    if ALL_BRANCHES in refspecs:
+        refspecs = [ALL_BRANCHES]
+
+    # Remove duplicates but keep the order
+    refspecs = list(dict.fromkeys(refspecs))
+
+    return refspecs, tags
@@ -8,3 +8,16 @@ class RunError(RuntimeError):
     def __init__(self, run_result):
         super(RunError, self).__init__(str(run_result))
         self.run_result = run_result
+
+
+class RunTimeoutError(RunError):
+    """Raised when a command was killed because it took too long."""
+
+    def __init__(self, run_result, timeout):
+        super(RunTimeoutError, self).__init__(run_result)
+        self.timeout = timeout
+
+    def __str__(self):
+        return "Timed out after {:.1f}s\n{}".format(
+            self.timeout, super(RunTimeoutError, self).__str__()
+        )
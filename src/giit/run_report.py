@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import json
+import time
+import threading
+import contextlib
+
+
+class RunReport(object):
+    """Collects the timing and resource usage of the tasks and commands.
+
+    The commands are attributed to the task running in the same thread.
+    """
+
+    def __init__(self, log):
+        """Create a new report.
+
+        :param log: A logging object
+        """
+        self.log = log
+        self.start_time = time.time()
+        self.tasks = []
+        self.commands = []
+
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @contextlib.contextmanager
+    def task(self, name):
+        """Record a task.
+
+        Usage:
+
+            with report.task(name="1.0.0") as record:
+                record["status"] = "ran"
+
+        :param name: The name of the task
+        :return: The record of the task as a dict
+        """
+        record = {
+            "name": name,
+            "status": "failed",
+            "wall_time": 0.0,
+            "user_time": 0.0,
+            "system_time": 0.0,
+            "max_rss": 0,
+            "output_bytes": 0,
+            "commands": 0,
+            "timed_out": False,
+        }
+
+        with self.lock:
+            self.tasks.append(record)
+
+        self.local.task = record
+        start_time = time.time()
+
+        try:
+            yield record
+        finally:
+            record["wall_time"] = time.time() - start_time
+            self.local.task = None
+
+    def add_command(self, run_result):
+        """Record a command run by giit.prompt.Prompt.
+
+        :param run_result: The giit.run_result.RunResult of the command
+        """
+        task = getattr(self.local, "task", None)
+
+        record = {
+            "command": run_result.command,
+            "cwd": run_result.path,
+            "task": task["name"] if task else None,
+            "returncode": run_result.returncode,
+            "wall_time": run_result.time,
+            "user_time": run_result.user_time,
+            "system_time": run_result.system_time,
+            "max_rss": run_result.max_rss,
+            "output_bytes": run_result.output_bytes,
+            "timed_out": run_result.timed_out,
+        }
+
+        with self.lock:
+            self.commands.append(record)
+
+            if not task:
+                return
+
+            task["commands"] += 1
+            task["output_bytes"] += run_result.output_bytes
+            task["timed_out"] = task["timed_out"] or run_result.timed_out
+
+            # The resource usage is not available on all platforms
+            if run_result.user_time is not None:
+                task["user_time"] += run_result.user_time
+                task["system_time"] += run_result.system_time
+                task["max_rss"] = max(task["max_rss"], run_result.max_rss)
+
+    def write(self, report_path):
+        """Write the report as JSON.
+
+        :param report_path: The path to the report file
+        """
+        report = {
+            "start_time": self.start_time,
+            "wall_time": time.time() - self.start_time,
+            "tasks": self.tasks,
+            "commands": self.commands,
+        }
+
+        directory = os.path.dirname(report_path)
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        with open(report_path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+
+        self.log.info("Run report written to %s", report_path)
+
+    def summary(self, count=5):
+        """Log the slowest tasks and commands.
+
+        :param count: The number of tasks and commands to log
+        """
+        tasks = sorted(self.tasks, key=lambda t: t["wall_time"], reverse=True)
+
+        if tasks:
+            self.log.info("Slowest tasks:")
+
+        for task in tasks[:count]:
+            self.log.info(
+                "  %6.1fs (%.1fs CPU) %s [%s]",
+                task["wall_time"],
+                task["user_time"] + task["system_time"],
+                task["name"],
+                task["status"],
+            )
+
+        commands = sorted(self.commands, key=lambda c: c["wall_time"], reverse=True)
+
+        if commands:
+            self.log.info("Slowest commands:")
+
+        for command in commands[:count]:
+            self.log.info(
+                "  %6.1fs %s%s",
+                command["wall_time"],
+                "[{}] ".format(command["task"]) if command["task"] else "",
+                command["command"],
+            )
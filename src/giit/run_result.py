@@ -17,13 +17,34 @@ class RunResult:
     Attributes:
     :command: The command that was executed
     :path: Path where the command was executed
-    :stdout: The standard output stream generated by the command
+    :stdout: The standard output stream generated by the command. If the
+        output was streamed only the last lines, including the standard
+        error, are kept
     :stderr: The standard error stream generated by the command
     :returncode: The return code set after invoking the command
     :time: The time it took to execute the command
+    :user_time: The user CPU time of the command or None if not known
+    :system_time: The system CPU time of the command or None if not known
+    :max_rss: The maximum resident set size in bytes or None if not known
+    :output_bytes: The size of the standard output and error in bytes
+    :timed_out: True if the command was killed because it took too long
     """
 
-    def __init__(self, command, path, stdout, stderr, returncode, time, env):
+    def __init__(
+        self,
+        command,
+        path,
+        stdout,
+        stderr,
+        returncode,
+        time,
+        env,
+        user_time=None,
+        system_time=None,
+        max_rss=None,
+        output_bytes=0,
+        timed_out=False,
+    ):
         """Create a new RunResult object"""
 
         self.command = command
@@ -33,6 +54,11 @@ class RunResult:
         self.returncode = returncode
         self.time = time
         self.env = env
+        self.user_time = user_time
+        self.system_time = system_time
+        self.max_rss = max_rss
+        self.output_bytes = output_bytes
+        self.timed_out = timed_out
 
     def __str__(self):
         """Print the RunResult object as a string"""
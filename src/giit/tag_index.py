@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import giit.filters
+
+
+class TagIndex(object):
+    """The tags of a repository sorted by semantic version.
+
+    The index is built once from the tags of a giit.git_refs.GitRefs
+    snapshot and used to select the tags of a step e.g. the latest patch
+    release of each minor version.
+    """
+
+    # The fields of the version identifying a release series
+    SERIES = {"major": ("major",), "minor": ("major", "minor")}
+
+    def __init__(self, tags, relaxed):
+        """Build the index.
+
+        :param tags: List of the tags in the order returned by git
+        :param relaxed: If True versions like 1.2 are accepted
+        """
+        versions = []
+
+        # The tags which are not versions, newest first as returned by git
+        self.others = []
+
+        for tag in reversed(tags):
+
+            version = giit.filters.parse_version(tag=tag, relaxed=relaxed)
+
+            if version is None:
+                self.others.append(tag)
+            else:
+                versions.append((version, tag))
+
+        # Newest version first, the sort is stable so tags with the same
+        # version stay in the order of git
+        versions.sort(key=lambda item: item[0], reverse=True)
+
+        self.versions = versions
+
+    def select(self, match, latest_per=None, limit=None):
+        """Select the tags matching the filters.
+
+        :param match: Function taking a tag and returning True if it matches
+            the filters of the step, see giit.filters.TagFilter.match(...)
+        :param latest_per: If "major" or "minor" only the latest version of
+            each major or minor series is selected, otherwise None.
+        :param limit: The maximum number of tags to select or None
+        :return: List of the selected tags. The versions newest first,
+            followed by the tags which are not versions.
+        """
+        selected = []
+        series = set()
+
+        fields = TagIndex.SERIES[latest_per] if latest_per else None
+
+        for version, tag in self.versions:
+
+            if limit is not None and len(selected) >= limit:
+                break
+
+            if not match(tag):
+                continue
+
+            if fields:
+                key = tuple(getattr(version, field) for field in fields)
+
+                if key in series:
+                    continue
+
+                series.add(key)
+
+            selected.append(tag)
+
+        selected += [tag for tag in self.others if match(tag)]
+
+        if limit is not None:
+            selected = selected[:limit]
+
+        return selected
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import heapq
+import concurrent.futures
+
+
+class TaskGraph(object):
+    """Runs items once the items they depend on have completed.
+
+    Usage:
+
+        graph = giit.task_graph.TaskGraph()
+        sphinx = graph.add(item="sphinx")
+        graph.add(item="push", dependencies=[sphinx])
+
+        results = graph.run(function=run, jobs=4)
+
+    Items which do not depend on each other run in parallel. Of the items
+    ready to run, the items added with first=True are started first,
+    followed by the items on the longest remaining path through the graph,
+    such that a slow item is not left running alone at the end.
+    """
+
+    def __init__(self):
+        self.items = []
+
+        # The dependencies and dependents of each item by index
+        self.dependencies = []
+        self.dependents = []
+
+        # The indexes of the items started before the other ready items
+        self.first = set()
+
+    def add(self, item, dependencies=(), first=False):
+        """Add an item.
+
+        :param item: The item passed to the function when run
+        :param dependencies: The indexes of the items which must complete
+            before this item is run. The items must already be added, so
+            the graph cannot have cycles.
+        :param first: If True the item is started before the other items
+            ready to run.
+        :return: The index of the item
+        """
+        index = len(self.items)
+
+        for dependency in dependencies:
+            if not 0 <= dependency < index:
+                raise ValueError("Unknown dependency {}".format(dependency))
+
+            self.dependents[dependency].append(index)
+
+        self.items.append(item)
+        self.dependencies.append(set(dependencies))
+        self.dependents.append([])
+
+        if first:
+            self.first.add(index)
+
+        return index
+
+    def __len__(self):
+        return len(self.items)
+
+    def run(self, function, jobs=1, costs=None):
+        """Run the items.
+
+        If an item fails no new items are started, the running items are
+        allowed to complete and the error is re-raised.
+
+        :param function: The function called with each item
+        :param jobs: The number of items to run at once. With one job the
+            items are run in the calling thread.
+        :param costs: List with the expected time each item takes by index
+            or None. Without costs the items are run in the order they were
+            added.
+        :return: List with the result of each item by index
+        """
+        results = [None] * len(self.items)
+        waiting = [len(d) for d in self.dependencies]
+        priorities = self._priorities(costs=costs)
+
+        # The items ready to run as a heap of (priority, index)
+        ready = [
+            (priorities[index], index)
+            for index, count in enumerate(waiting)
+            if count == 0
+        ]
+        heapq.heapify(ready)
+
+        def complete(index):
+            for dependent in self.dependents[index]:
+                waiting[dependent] -= 1
+
+                if waiting[dependent] == 0:
+                    heapq.heappush(ready, (priorities[dependent], dependent))
+
+        if jobs <= 1:
+            while ready:
+                _, index = heapq.heappop(ready)
+                results[index] = function(self.items[index])
+                complete(index)
+
+            return results
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+
+            running = {}
+            error = None
+
+            while running or (ready and error is None):
+
+                # Only start as many items as we have workers, such that
+                # the next item is picked when a worker is free
+                while ready and error is None and len(running) < jobs:
+                    _, index = heapq.heappop(ready)
+                    future = pool.submit(function, self.items[index])
+                    running[future] = index
+
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+
+                for future in done:
+                    index = running.pop(future)
+
+                    try:
+                        results[index] = future.result()
+                    except BaseException as e:
+                        if error is None:
+                            error = e
+                        continue
+
+                    complete(index)
+
+        if error is not None:
+            raise error
+
+        return results
+
+    def _priorities(self, costs):
+        """:return: List with the priority of each item by index, lower
+        priorities are started first.
+        """
+        if costs is None:
+            costs = [0.0] * len(self.items)
+
+        # The cost of the longest path from each item to the end of the
+        # graph. The dependents are added after the items they depend on,
+        # so we compute the paths backwards.
+        paths = [0.0] * len(self.items)
+
+        for index in reversed(range(len(self.items))):
+            paths[index] = costs[index] + max(
+                (paths[dependent] for dependent in self.dependents[index]),
+                default=0.0,
+            )
+
+        return [
+            (index not in self.first, -paths[index]) for index in range(len(self.items))
+        ]
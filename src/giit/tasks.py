@@ -1,41 +1,77 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
+import os
 import re
-import semantic_version
+import json
+import hashlib
 import giit.config
+import giit.filters
 
 
 class NoGitTask(object):
-    def __init__(self, context, config, command):
+    def __init__(self, context, config, command, variables):
         self.context = context
         self.config = config
         self.command = command
+        self.variables = variables
+
+        # The config with the context filled in, when first needed
+        self._task_config = None
 
     def name(self):
         return self.context["name"]
 
-    def run(self):
+    def key(self):
+        """The output of tasks without a git checkout is never reused.
+
+        :return: None
+        """
+        return None
+
+    def revision(self):
+        """Tasks without a git checkout cannot be resumed, since we cannot
+        tell if their source changed.
+
+        :return: None
+        """
+        return None
+
+    def task_config(self):
+        """:return: The config with the context filled in"""
+
+        if self._task_config is None:
+            self._task_config = giit.config.fill_dict(
+                context=self.context, config=self.config, variables=self.variables
+            )
+
+        return self._task_config
+
+    def output_path(self):
+        return self.task_config()["output_path"]
 
-        task_config = giit.config.fill_dict(context=self.context, config=self.config)
+    def run(self):
 
-        self.command.run(config=task_config)
+        return self.command.run(config=self.task_config())
 
     def __str__(self):
         return "scope '{scope}'".format(**self.context)
 
 
 class NoGitGenerator(object):
-    def __init__(self, command, config, build_path):
+    def __init__(self, command, config, variables, build_path):
         """Create no_git task generator
 
         :param command: The command to run e.g. giit.python_command.PythonCommand
         :param config: The config e.g. giit.config.PythonConfig
+        :param variables: The giit.variables_reader.CompiledVariables of
+            the config
         :param build_path: The build path as a string
         """
 
         self.command = command
         self.config = config
+        self.variables = variables
         self.build_path = build_path
 
     def tasks(self):
@@ -49,24 +85,32 @@ class NoGitGenerator(object):
             "build_path": self.build_path,
         }
 
-        task = NoGitTask(config=self.config, context=context, command=self.command)
+        task = NoGitTask(
+            config=self.config,
+            context=context,
+            command=self.command,
+            variables=self.variables,
+        )
 
         return [task]
 
 
 class WorkingtreeGenerator(object):
-    def __init__(self, git_repository, command, config, build_path):
+    def __init__(self, git_repository, command, config, variables, build_path):
         """Create a tag generator.
 
         :param git_repository: A giit.git_repository.GitRepository instance
         :param command: The command to run e.g.giit.python_command.PythonCommand
         :param config: The config e.g. giit.config.PythonConfig
+        :param variables: The giit.variables_reader.CompiledVariables of
+            the config
         :param build_path: The build path as a string
         """
 
         self.git_repository = git_repository
         self.command = command
         self.config = config
+        self.variables = variables
         self.build_path = build_path
 
     def tasks(self):
@@ -84,7 +128,12 @@ class WorkingtreeGenerator(object):
                 "source_path": self.git_repository.workingtree_path(),
             }
 
-            task = NoGitTask(config=self.config, context=context, command=self.command)
+            task = NoGitTask(
+                config=self.config,
+                context=context,
+                command=self.command,
+                variables=self.variables,
+            )
 
             return [task]
 
@@ -94,29 +143,145 @@ class WorkingtreeGenerator(object):
 
 
 class GitTask(object):
-    def __init__(self, git_repository, config, context, command):
+    def __init__(self, git_repository, config, context, command, variables):
         self.git_repository = git_repository
         self.config = config
         self.context = context
         self.command = command
+        self.variables = variables
+
+        # The config with the context filled in, when first needed
+        self._task_config = None
+
+        # The fields of the key and revision, computed when first needed
+        self._key_fields = None
+        self._revision = None
+
+    def key(self):
+        """The key identifying the output of the task.
+
+        The key changes if the commit, the config or the Python environment
+        used by the task changes. Computing it does not require a checkout.
+
+        :return: The key as a string or None if the task has no output_path
+        """
+
+        fields = self.key_fields()
+
+        if not fields:
+            return None
+
+        key = ":".join(
+            [fields["commit"], fields["config_hash"], fields["environment_name"]]
+        )
+
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def key_fields(self):
+        """:return: Dict with the commit, config hash and Python environment
+        name the key is computed from, or None if the task has no
+        output_path.
+        """
+
+        if self._key_fields is not None:
+            return self._key_fields
+
+        task_config = self.task_config()
+
+        if not task_config["output_path"]:
+            return None
+
+        requirements_content = self._read_source_file(path=task_config["requirements"])
+
+        environment_name = self.command.environment_name(
+            config=task_config, requirements_content=requirements_content
+        )
+
+        self._key_fields = dict(self.revision(), environment_name=environment_name)
+
+        return self._key_fields
+
+    def revision(self):
+        """:return: Dict with the commit the task is built from and the hash
+        of the task config.
+        """
+
+        if self._revision is not None:
+            return self._revision
+
+        commit = self.git_repository.commit(checkout=self.context["checkout"])
+
+        config_hash = hashlib.sha1(
+            json.dumps(self.task_config(), sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+        self._revision = {"commit": commit, "config_hash": config_hash}
+
+        return self._revision
+
+    def task_config(self):
+        """:return: The config with the context filled in"""
+
+        if self._task_config is None:
+            self._task_config = giit.config.fill_dict(
+                context=self.context, config=self.config, variables=self.variables
+            )
+
+        return self._task_config
+
+    def output_path(self):
+        task_config = self.task_config()
+        return task_config["output_path"]
+
+    def _read_source_file(self, path):
+        """Read a file in the checkout without checking it out.
+
+        :param path: The path to the file after the context has been filled
+            in e.g. /tmp/clone/docs/requirements.txt
+        :return: The content of the file as a string
+        """
+
+        if not path:
+            return ""
+
+        relative_path = os.path.relpath(path, self.context["source_path"])
+
+        if relative_path.startswith(os.pardir) or os.path.isabs(relative_path):
+
+            # The file is not part of the repository
+            if not os.path.isfile(path):
+                return ""
+
+            with open(path, "r") as f:
+                return f.read()
+
+        content = self.git_repository.read_file(
+            checkout=self.context["checkout"], path=relative_path
+        )
+
+        return content if content is not None else ""
 
     def run(self):
 
         checkout = self.context["checkout"]
         scope = self.context["scope"]
 
-        if scope == "branch":
-            self.git_repository.checkout_branch(remote_branch=checkout)
+        # Other tasks, also in other processes, must not change the checkout
+        # while we use it
+        with self.git_repository.checkout_lock(checkout=checkout):
 
-        elif scope == "tag":
-            self.git_repository.checkout_tag(tag=checkout)
+            if scope == "branch":
+                self.git_repository.checkout_branch(remote_branch=checkout)
 
-        else:
-            raise RuntimeError("Unknown scope {}".format(scope))
+            elif scope == "tag":
+                self.git_repository.checkout_tag(tag=checkout)
+
+            else:
+                raise RuntimeError("Unknown scope {}".format(scope))
 
-        task_config = giit.config.fill_dict(context=self.context, config=self.config)
+            task_config = self.task_config()
 
-        self.command.run(config=task_config)
+            return self.command.run(config=task_config)
 
     def name(self):
         return self.context["name"]
@@ -128,13 +293,15 @@ class GitTask(object):
 
 
 class GitBranchGenerator(object):
-    def __init__(self, git_repository, command, config, build_path):
+    def __init__(self, git_repository, command, config, variables, build_path):
         """Create a branch generator.
 
         :param git_repository: A giit.git_repository.GitRepository instance
         :param repository_path: Path to where the repository is.
         :param command: The command to run e.g.
             giit.python_command.PythonCommand
+        :param variables: The giit.variables_reader.CompiledVariables of
+            the config
         :param build_path: The build path as a string
         :param branches: The list of branches to build
         :param log: A logging object
@@ -143,15 +310,22 @@ class GitBranchGenerator(object):
         self.git_repository = git_repository
         self.command = command
         self.config = config
+        self.variables = variables
         self.build_path = build_path
 
+        self.filter = giit.filters.BranchFilter(
+            config=config, source_branch=git_repository.source_branch
+        )
+
     def tasks(self):
 
         tasks = []
 
-        for branch in self.git_repository.remote_branches():
+        refs = self.git_repository.refs()
+
+        for branch in refs.remote_branches():
 
-            if not self._match_branch(branch=branch):
+            if not self.filter.match(branch):
                 continue
 
             # Create the human readable name for the branch. The "name"
@@ -171,7 +345,7 @@ class GitBranchGenerator(object):
                 "name": name,
                 "checkout": branch,
                 "build_path": self.build_path,
-                "source_path": self.git_repository.repository_path(),
+                "source_path": self.git_repository.checkout_path(checkout=branch),
             }
 
             task = GitTask(
@@ -179,68 +353,57 @@ class GitBranchGenerator(object):
                 context=context,
                 config=self.config,
                 command=self.command,
+                variables=self.variables,
             )
 
             tasks.append(task)
 
         return tasks
 
-    def _match_branch(self, branch):
-        """Checks the branch name against the filters.
-
-        :return: True if the branch matches the filter otherwise False
-        """
-
-        regex_filters = self.config["branches"]["regex"]["filters"]
-
-        for regex_filter in regex_filters:
-
-            if re.match(regex_filter, branch):
-                return True
-
-        if not self.config["branches"]["source_branch"]:
-            return False
-
-        source_branch = self.git_repository.source_branch()
-
-        if source_branch == branch:
-            return True
-
-        return False
-
 
 class GitTagGenerator(object):
-    def __init__(self, git_repository, command, config, build_path):
+    def __init__(self, git_repository, command, config, variables, build_path):
         """Create a tag generator.
 
         :param git_repository: A giit.git_repository.GitRepository instance
         :param command: The command to run e.g.giit.python_command.PythonCommand
         :param config: The config e.g. giit.config.PythonConfig
+        :param variables: The giit.variables_reader.CompiledVariables of
+            the config
         :param build_path: The build path as a string
         """
 
         self.git_repository = git_repository
         self.command = command
         self.config = config
+        self.variables = variables
         self.build_path = build_path
 
+        self.filter = giit.filters.TagFilter(config=config)
+
     def tasks(self):
 
         tasks = []
 
-        tags = self.git_repository.tags()
+        refs = self.git_repository.refs()
 
-        for tag in reversed(tags):
+        # The tags are selected newest version first
+        index = refs.tag_index(relaxed=self.config["tags"]["semver"]["relaxed"])
 
-            if not self._match_tag(tag=tag):
-                continue
+        tags = index.select(
+            match=self.filter.match,
+            latest_per=self.config["tags"]["semver"]["latest_per"],
+            limit=self.config["tags"]["limit"],
+        )
+
+        for tag in tags:
 
             context = {
                 "scope": "tag",
                 "name": tag,
                 "checkout": tag,
                 "build_path": self.build_path,
-                "source_path": self.git_repository.repository_path(),
+                "source_path": self.git_repository.checkout_path(checkout=tag),
             }
 
             task = GitTask(
@@ -248,41 +411,13 @@ class GitTagGenerator(object):
                 context=context,
                 config=self.config,
                 command=self.command,
+                variables=self.variables,
             )
 
             tasks.append(task)
 
         return tasks
 
-    def _match_tag(self, tag):
-        """Checks the tag name against the filters.
-
-        :return: True if the tag matches the filter otherwise False
-        """
-
-        regex_filters = self.config["tags"]["regex"]["filters"]
-
-        for regex_filter in regex_filters:
-
-            if re.match(regex_filter, tag):
-                return True
-
-        semver_filters = self.config["tags"]["semver"]["filters"]
-        semver_relaxed = self.config["tags"]["semver"]["relaxed"]
-
-        for semver_filter in semver_filters:
-
-            spec = semantic_version.Spec(semver_filter)
-            if semver_relaxed:
-                version = semantic_version.Version.coerce(tag)
-            else:
-                version = semantic_version.Version(tag)
-
-            if spec.match(version):
-                return True
-
-        return False
-
 
 class TaskFactory(object):
     def __init__(
@@ -1,89 +1,299 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-import string
-from collections import ChainMap as _ChainMap
+import re
 
 
-class PundTemplate(string.Template):
-    delimiter = "£"
+def _pattern(delimiters):
+    """:return: The regular expression matching the placeholders of
+    string.Template for each of the delimiters.
+    """
+    return re.compile(
+        r"""
+        (?P<delimiter>[{0}])(?:
+            (?P<escaped>(?P=delimiter))          |
+            (?P<named>[_a-z][_a-z0-9]*)          |
+            {{(?P<braced>[_a-z][_a-z0-9]*)}}     |
+            (?P<invalid>)
+        )
+        """.format(re.escape(delimiters)),
+        re.IGNORECASE | re.VERBOSE | re.ASCII,
+    )
+
+
+# The strings in the config may use both the $ and £ placeholders, the
+# variables only the $ placeholders
+_ELEMENT_PATTERN = _pattern(delimiters="$£")
+_VARIABLE_PATTERN = _pattern(delimiters="$")
+
+
+def _compile(template, pattern):
+    """Split a template into its literal text and placeholders.
+
+    :param template: The template as a string
+    :param pattern: The regular expression matching the placeholders
+    :return: A tuple where each part is either a string or a tuple
+        (name, optional). Optional placeholders (£) are replaced with the
+        empty string if the variable is not found.
+    """
+    if not isinstance(template, str):
+        return (str(template),)
+
+    parts = []
+    position = 0
+
+    for match in pattern.finditer(template):
+
+        parts.append(template[position : match.start()])
+        position = match.end()
+
+        delimiter = match.group("delimiter")
+        name = match.group("named") or match.group("braced")
+
+        if match.group("escaped") is not None:
+            parts.append(delimiter)
+
+        elif name is not None:
+            parts.append((name, delimiter == "£"))
+
+        elif delimiter == "£":
+            # Same as string.Template.safe_substitute(...)
+            parts.append(match.group())
 
-    # Copied from string.Template.safe_substitute (tag 3.6)
-    def safe_substitute_to_none(*args, **kws):
-        if not args:
-            raise TypeError(
-                "descriptor 'safe_substitute' of 'Template' object " "needs an argument"
-            )
-        self, *args = args  # allow the "self" keyword be passed
-        if len(args) > 1:
-            raise TypeError("Too many positional arguments")
-        if not args:
-            mapping = kws
-        elif kws:
-            mapping = _ChainMap(kws, args[0])
         else:
-            mapping = args[0]
-
-        # Helper function for .sub()
-        def convert(mo):
-            named = mo.group("named") or mo.group("braced")
-            if named is not None:
-                try:
-                    return str(mapping[named])
-                except KeyError:
-                    # This line is what's changed.
-                    return ""
-            if mo.group("escaped") is not None:
-                return self.delimiter
-            if mo.group("invalid") is not None:
-                return mo.group()
-            raise ValueError("Unrecognized named group in pattern", self.pattern)
-
-        return self.pattern.sub(convert, self.template)
+            # Same as string.Template.substitute(...)
+            lines = template[: match.start()].splitlines(keepends=True)
+            column = match.start() - sum(len(line) for line in lines[:-1]) + 1
+            raise ValueError(
+                "Invalid placeholder in string: line {}, col {}".format(
+                    max(len(lines), 1), column
+                )
+            )
+
+    parts.append(template[position:])
+
+    return tuple(part for part in parts if part != "")
+
+
+class CompiledVariables(object):
+    """The variables of a step parsed once and checked for cycles.
+
+    A variable is looked up in the following order:
+
+    1. scope:checkout:variable
+    2. scope:variable
+    3. variable
+    4. The context of the task
+
+    Which variable a name refers to only depends on the scope and checkout
+    of the task, so the lookups are shared by all tasks of the step.
+    """
+
+    # The scopes of the tasks
+    SCOPES = ["branch", "tag", "workingtree", "no_git"]
+
+    def __init__(self, variables):
+        """Compile the variables.
+
+        :param variables: Dict with the variables of the step, may be empty
+            or None
+        :raises RuntimeError: If the variables refer to each other in a cycle
+        """
+        self.variables = variables or {}
+
+        self.templates = {
+            key: _compile(template=value, pattern=_VARIABLE_PATTERN)
+            for key, value in self.variables.items()
+        }
+
+        # The key of the variable used for (scope, checkout, name) or None
+        # if the name is found in the context
+        self.lookups = {}
+
+        # The compiled context values and strings in the config
+        self.compiled = {}
+
+        self._check_cycles()
+
+    def lookup(self, scope, checkout, name):
+        """:return: The key of the variable the name refers to or None if
+        it is not a variable.
+        """
+        try:
+            return self.lookups[(scope, checkout, name)]
+        except KeyError:
+            pass
+
+        candidates = [":".join([scope, name]), name]
+
+        if checkout is not None:
+            candidates.insert(0, ":".join([scope, checkout, name]))
+
+        key = next((c for c in candidates if c in self.templates), None)
+
+        self.lookups[(scope, checkout, name)] = key
+
+        return key
+
+    def compile(self, template, pattern=_ELEMENT_PATTERN):
+        """:return: The compiled template, see _compile(...)"""
+
+        try:
+            return self.compiled[(template, pattern)]
+        except KeyError:
+            pass
+        except TypeError:
+            # Not hashable, e.g. a list of values
+            return _compile(template=template, pattern=pattern)
+
+        parts = _compile(template=template, pattern=pattern)
+        self.compiled[(template, pattern)] = parts
+
+        return parts
+
+    def reader(self, context):
+        """:return: A VariablesReader for the context of a task"""
+        return VariablesReader(variables=self, context=context)
+
+    def _check_cycles(self):
+        """Check that no variable depends on itself in any scope.
+
+        :raises RuntimeError: If a cycle is found
+        """
+        scopes = set(CompiledVariables.SCOPES)
+        checkouts = set()
+
+        for key in self.variables:
+            fields = key.split(":")
+
+            if len(fields) >= 2:
+                scopes.add(fields[0])
+
+            if len(fields) >= 3:
+                checkouts.add((fields[0], ":".join(fields[1:-1])))
+
+        contexts = [(scope, None) for scope in sorted(scopes)] + sorted(checkouts)
+
+        for scope, checkout in contexts:
+
+            # The variables fully checked in this context
+            done = set()
+
+            for key in self.templates:
+                self._visit(scope=scope, checkout=checkout, key=key, path=[], done=done)
+
+    def _visit(self, scope, checkout, key, path, done):
+
+        if key in done:
+            return
+
+        if key in path:
+            cycle = path[path.index(key) :] + [key]
+            raise RuntimeError(
+                "The variables refer to each other in a cycle: {}".format(
+                    " -> ".join(cycle)
+                )
+            )
+
+        path.append(key)
+
+        for part in self.templates[key]:
+            if isinstance(part, str):
+                continue
+
+            dependency = self.lookup(scope=scope, checkout=checkout, name=part[0])
+
+            if dependency is not None:
+                self._visit(
+                    scope=scope,
+                    checkout=checkout,
+                    key=dependency,
+                    path=path,
+                    done=done,
+                )
+
+        path.pop()
+        done.add(key)
 
 
 class VariablesReader(object):
     def __init__(self, variables, context):
+        """Create a new reader.
+
+        :param variables: Dict with the variables or CompiledVariables
+        :param context: Dict with the context of the task
+        """
+        if not isinstance(variables, CompiledVariables):
+            variables = CompiledVariables(variables=variables)
+
         self.variables = variables
         self.context = context
 
-    def _find_item(self, key):
+        self.scope = context["scope"]
+        self.checkout = context.get("checkout")
 
-        scope = self.context["scope"]
+        # The expanded variables and the ones being expanded
+        self.values = {}
+        self.expanding = []
 
-        if "checkout" in self.context:
-            checkout = self.context["checkout"]
+    def __getitem__(self, key):
 
-            # We first look in the variables dict using the following order:
-            #
-            # 1. scope:checkout:variable
-            # 2. scope:variable
-            # 3. variable
-            explicit = ":".join([scope, checkout, key])
+        try:
+            return self.values[key]
+        except KeyError:
+            pass
 
-            if explicit in self.variables:
-                return self.variables[explicit]
+        if key in self.expanding:
+            raise RuntimeError(
+                "The variables refer to each other in a cycle: {}".format(
+                    " -> ".join(self.expanding + [key])
+                )
+            )
 
-        partial = ":".join([scope, key])
+        variable = self.variables.lookup(
+            scope=self.scope, checkout=self.checkout, name=key
+        )
 
-        if partial in self.variables:
-            return self.variables[partial]
+        if variable is not None:
+            parts = self.variables.templates[variable]
 
-        if key in self.variables:
-            return self.variables[key]
+        elif key in self.context:
+            parts = self.variables.compile(
+                template=self.context[key], pattern=_VARIABLE_PATTERN
+            )
 
-        # Check if the variable is defined in the context
-        if key in self.context:
-            return self.context[key]
+        else:
+            raise KeyError("Not found {}".format(key))
 
-        raise KeyError("Not found {}".format(key))
+        self.expanding.append(key)
 
-    def __getitem__(self, key):
+        try:
+            value = self._render(parts=parts)
+        finally:
+            self.expanding.pop()
+
+        self.values[key] = value
 
-        variable = self._find_item(key=key)
-        return string.Template(variable).substitute(self)
+        return value
 
     def expand(self, element):
-        result = PundTemplate(element).safe_substitute_to_none(self)
-        result = string.Template(result).substitute(self)
-        return result
+        return self._render(parts=self.variables.compile(template=element))
+
+    def _render(self, parts):
+
+        result = []
+
+        for part in parts:
+            if isinstance(part, str):
+                result.append(part)
+                continue
+
+            name, optional = part
+
+            try:
+                result.append(self[name])
+            except KeyError:
+                if not optional:
+                    raise
+
+        return "".join(result)
@@ -3,31 +3,195 @@
 
 import os
 import sys
+import glob
+import shutil
 
 
 class VirtualEnv(object):
     """Simple object which can be used to work within a virtualenv."""
 
+    # Written to the virtualenv once it has been created
+    COMPLETE_FILE = "giit-complete"
+
+    # Written to the virtualenv before it is created
+    INCOMPLETE_FILE = "giit-incomplete"
+
     def __init__(self, prompt, log):
 
         self.prompt = prompt
         self.log = log
 
-    def create_environment(self, path):
+    def create_environment(self, path, base_path=None):
+        """Create the virtualenv if it does not exist.
+
+        :param path: The path to the virtualenv
+        :param base_path: Path to an existing virtualenv whose installed
+            packages are hardlinked into the new virtualenv, or None.
+        :return: The environment variables for using the virtualenv
+        """
+
+        complete_path = os.path.join(path, VirtualEnv.COMPLETE_FILE)
+        incomplete_path = os.path.join(path, VirtualEnv.INCOMPLETE_FILE)
+
+        if os.path.isdir(path) and not os.path.isfile(complete_path):
+
+            if not os.path.isfile(incomplete_path) and self._works(path=path):
+                # Created by an earlier version of giit, which did not write
+                # the markers
+                self.log.debug("Adopting virtualenv %s", path)
+
+                with open(complete_path, "w"):
+                    pass
+            else:
+                # E.g. if giit was stopped while creating the virtualenv
+                self.log.info("Removing incomplete virtualenv %s", path)
+                shutil.rmtree(path)
 
         if not os.path.isdir(path):
 
+            os.makedirs(path)
+
+            with open(incomplete_path, "w"):
+                pass
+
             self.prompt.run(command=["python", "-m", "virtualenv", path])
 
+            if base_path:
+                self.log.info("Copying packages from %s", base_path)
+                self._copy_packages(base_path=base_path, path=path)
+
+            with open(complete_path, "w"):
+                pass
+
+            os.remove(incomplete_path)
+
         # Create a new environment based on the new virtualenv
         env = dict(os.environ)
 
         # Make sure the virtualenv Python executable is first in PATH
-        if sys.platform == "win32":
-            python_path = os.path.join(path, "Scripts")
-        else:
-            python_path = os.path.join(path, "bin")
+        python_path = self._scripts(path=path)
 
         env["PATH"] = os.path.pathsep.join([python_path, env["PATH"]])
 
         return env
+
+    def _works(self, path):
+        """:return: True if the Python interpreter of the virtualenv runs and
+        has pip installed, otherwise False.
+        """
+        python = os.path.join(
+            self._scripts(path=path),
+            "python.exe" if sys.platform == "win32" else "python",
+        )
+
+        if not os.path.isfile(python):
+            return False
+
+        try:
+            self.prompt.run(command=[python, "-c", "import pip"])
+        except Exception:
+            return False
+
+        return True
+
+    def _copy_packages(self, base_path, path):
+        """Hardlink the packages and scripts installed in base_path into
+        the new virtualenv in path.
+
+        The packages installed when creating the virtualenv (e.g. pip) are
+        kept.
+        """
+        from_site_packages = self._site_packages(path=base_path)
+        to_site_packages = self._site_packages(path=path)
+
+        if not from_site_packages or not to_site_packages:
+            return
+
+        # Skip the metadata of e.g. another version of pip, otherwise the
+        # packages would be installed twice
+        installed = set(
+            self._project_name(entry) for entry in os.listdir(to_site_packages)
+        )
+
+        for entry in os.listdir(from_site_packages):
+
+            from_path = os.path.join(from_site_packages, entry)
+            to_path = os.path.join(to_site_packages, entry)
+
+            if os.path.lexists(to_path):
+                continue
+
+            if entry.endswith(".dist-info") and self._project_name(entry) in installed:
+                continue
+
+            if os.path.isdir(from_path) and not os.path.islink(from_path):
+                shutil.copytree(
+                    from_path, to_path, symlinks=True, copy_function=self._link
+                )
+            else:
+                self._link(from_path, to_path)
+
+        from_scripts = self._scripts(path=base_path)
+        to_scripts = self._scripts(path=path)
+
+        for entry in os.listdir(from_scripts):
+
+            from_path = os.path.join(from_scripts, entry)
+            to_path = os.path.join(to_scripts, entry)
+
+            if os.path.lexists(to_path) or not os.path.isfile(from_path):
+                continue
+
+            if os.path.islink(from_path):
+                continue
+
+            with open(from_path, "rb") as from_file:
+                content = from_file.read()
+
+            # Scripts such as sphinx-build run the Python of the virtualenv
+            # they were installed in
+            if not content.startswith(b"#!"):
+                self._link(from_path, to_path)
+                continue
+
+            content = content.replace(base_path.encode("utf-8"), path.encode("utf-8"))
+
+            with open(to_path, "wb") as to_file:
+                to_file.write(content)
+
+            shutil.copymode(from_path, to_path)
+
+    @staticmethod
+    def _project_name(entry):
+        """:return: The project name of an entry in site-packages"""
+        return entry.split("-")[0].lower()
+
+    @staticmethod
+    def _site_packages(path):
+        """:return: The site-packages directory of the virtualenv or None"""
+
+        if sys.platform == "win32":
+            site_packages = os.path.join(path, "Lib", "site-packages")
+            return site_packages if os.path.isdir(site_packages) else None
+
+        matches = glob.glob(os.path.join(path, "lib", "python*", "site-packages"))
+
+        return matches[0] if matches else None
+
+    @staticmethod
+    def _scripts(path):
+        """:return: The directory with the scripts of the virtualenv"""
+
+        if sys.platform == "win32":
+            return os.path.join(path, "Scripts")
+        else:
+            return os.path.join(path, "bin")
+
+    @staticmethod
+    def _link(from_path, to_path):
+        try:
+            os.link(from_path, to_path)
+        except OSError:
+            # Hardlinks are not supported by all file systems
+            shutil.copy2(from_path, to_path)
+        return to_path
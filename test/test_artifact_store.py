@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import mock
+
+import giit.artifact_store
+
+
+def test_artifact_store(testdirectory):
+
+    store_dir = testdirectory.mkdir("store")
+    output_a = testdirectory.mkdir("a")
+    output_b = testdirectory.mkdir("b")
+
+    output_a.write_text(filename="index.html", data="a", encoding="utf-8")
+    output_a.mkdir("static").write_text(
+        filename="style.css", data="shared", encoding="utf-8"
+    )
+
+    output_b.write_text(filename="index.html", data="b", encoding="utf-8")
+    output_b.mkdir("static").write_text(
+        filename="style.css", data="shared", encoding="utf-8"
+    )
+
+    store = giit.artifact_store.ArtifactStore(
+        store_path=store_dir.path(), size_budget=None, log=mock.Mock()
+    )
+
+    assert not store.contains(key="a")
+
+    store.store(key="a", path=output_a.path())
+    store.store(key="b", path=output_b.path())
+
+    assert store.contains(key="a")
+    assert store.contains(key="b")
+
+    # The style.css is only stored once
+    style_a = os.path.join(store_dir.path(), "a", "static", "style.css")
+    style_b = os.path.join(store_dir.path(), "b", "static", "style.css")
+
+    assert os.stat(style_a).st_ino == os.stat(style_b).st_ino
+    assert store.size() == len("a") + len("b") + len("shared")
+
+    # Restore into a new directory
+    restore_dir = testdirectory.mkdir("restore")
+    store.restore(key="b", path=restore_dir.path())
+
+    assert restore_dir.contains_file("static/style.css")
+
+    with open(os.path.join(restore_dir.path(), "index.html")) as f:
+        assert f.read() == "b"
+
+    # Detaching breaks the link to the store
+    store.detach(path=restore_dir.path())
+
+    with open(os.path.join(restore_dir.path(), "index.html"), "w") as f:
+        f.write("changed")
+
+    with open(os.path.join(store_dir.path(), "b", "index.html")) as f:
+        assert f.read() == "b"
+
+
+def test_artifact_store_evict(testdirectory):
+
+    store_dir = testdirectory.mkdir("store")
+    output_dir = testdirectory.mkdir("output")
+
+    store = giit.artifact_store.ArtifactStore(
+        store_path=store_dir.path(), size_budget=10, log=mock.Mock()
+    )
+
+    for key, mtime in [("old", 1000), ("new", 2000)]:
+        output_dir.write_text(filename="data.txt", data=key * 3, encoding="utf-8")
+        store.store(key=key, path=output_dir.path())
+
+        # Set the time the snapshot was last used
+        os.utime(os.path.join(store_dir.path(), key), (mtime, mtime))
+
+    assert store.size() == 18
+
+    store.evict()
+
+    assert not store.contains(key="old")
+    assert store.contains(key="new")
+    assert store.size() == 9
+
+    # An evicted snapshot cannot be restored
+    assert not store.restore(key="old", path=output_dir.path())
+    assert store.restore(key="new", path=output_dir.path())
+
+    # The store is locked while evicting
+    assert os.path.isfile(store_dir.path() + ".lock")
+
+
+def test_artifact_store_restore_replaces(testdirectory):
+
+    store_dir = testdirectory.mkdir("store")
+    output_dir = testdirectory.mkdir("output")
+
+    store = giit.artifact_store.ArtifactStore(
+        store_path=store_dir.path(), size_budget=None, log=mock.Mock()
+    )
+
+    output_dir.write_text(filename="index.html", data="stored", encoding="utf-8")
+    store.store(key="a", path=output_dir.path())
+
+    # The output directory now holds files from some other build
+    output_dir.write_text(filename="index.html", data="other", encoding="utf-8")
+    output_dir.write_text(filename="stale.html", data="other", encoding="utf-8")
+    output_dir.mkdir("old").write_text(
+        filename="page.html", data="other", encoding="utf-8"
+    )
+
+    store.restore(key="a", path=output_dir.path())
+
+    assert sorted(os.listdir(output_dir.path())) == ["index.html"]
+
+    with open(os.path.join(output_dir.path(), "index.html")) as f:
+        assert f.read() == "stored"
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import asyncio
+import mock
+import pytest
+
+import giit.async_prompt
+import giit.logs
+import giit.run_error
+import giit.run_report
+
+
+def test_async_prompt_run(testdirectory):
+
+    report = giit.run_report.RunReport(log=mock.Mock())
+    prompt = giit.async_prompt.AsyncPrompt(report=report)
+
+    try:
+        with report.task(name="test") as record:
+            record["status"] = "ran"
+            result = prompt.run(
+                ["python", "-c", "print('hello')"], cwd=testdirectory.path()
+            )
+
+        assert result.stdout == "hello\n"
+        assert result.output_bytes > 0
+        assert report.commands[0]["task"] == "test"
+
+        with pytest.raises(giit.run_error.RunError):
+            prompt.run('python -c "import sys; sys.exit(1)"')
+    finally:
+        prompt.close()
+
+
+def test_async_prompt_stream(testdirectory):
+
+    log = mock.Mock()
+    prompt = giit.async_prompt.AsyncPrompt(log=log)
+
+    log_path = os.path.join(testdirectory.path(), "logs", "task.log")
+
+    try:
+        with giit.logs.task_log(path=log_path), giit.logs.task_scope(name="docs"):
+            result = prompt.run(
+                'python -c "for i in range(200): print(i)"', stream=True
+            )
+    finally:
+        prompt.close()
+
+    lines = result.stdout.splitlines()
+    assert len(lines) == giit.async_prompt.AsyncPrompt.TAIL_LINES
+    assert lines[-1] == "199"
+
+    # The lines are logged by the event loop on behalf of the task
+    log.debug.assert_any_call("%s", "0", extra={"task_name": "docs"})
+
+    with open(log_path) as log_file:
+        assert len(log_file.read().splitlines()) == 201
+
+
+def test_async_prompt_stream_long_line(testdirectory):
+
+    prompt = giit.async_prompt.AsyncPrompt(log=mock.Mock())
+
+    log_path = os.path.join(testdirectory.path(), "task.log")
+    size = 3 * giit.async_prompt.AsyncPrompt.LINE_LIMIT
+
+    try:
+        with giit.logs.task_log(path=log_path):
+            result = prompt.run(
+                "python -c \"print('x' * {}); print('done')\"".format(size),
+                stream=True,
+            )
+    finally:
+        prompt.close()
+
+    assert result.stdout.endswith("done\n")
+
+    with open(log_path) as log_file:
+        # The first line is the command
+        output = log_file.read().split("\n", 1)[1]
+
+    assert output.count("x") == size
+    assert output.endswith("done\n")
+
+
+def test_async_prompt_limits():
+
+    prompt = giit.async_prompt.AsyncPrompt(max_processes=4, limits={"scripts": 2})
+
+    running = []
+    peak = []
+
+    # Count the processes running at once
+    async def spawn(command, stream, timeout, log_file, **kwargs):
+        running.append(command)
+        peak.append(len(running))
+        await asyncio.sleep(0.05)
+        running.remove(command)
+
+    prompt._spawn = spawn
+
+    async def run_all():
+        commands = [["python", str(i)] for i in range(6)]
+        commands += [["git", str(i)] for i in range(6)]
+
+        await asyncio.gather(*(prompt._run(command=c) for c in commands))
+
+    try:
+        prompt.run_coroutine(run_all())
+    finally:
+        prompt.close()
+
+    assert max(peak) == 4
+
+
+def test_category():
+
+    assert giit.async_prompt._category(["git", "fetch"]) == "git"
+    assert giit.async_prompt._category("python -m pip install -U sphinx") == "pip"
+    assert giit.async_prompt._category("sphinx-build . html") == "scripts"
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import json
+import shutil
+import pytest
+
+import giit.build
+import giit.factory
+import giit.run_error
+
+
+def commit_file(directory, filename, content):
+    directory.write_text(filename, content, encoding="utf-8")
+    directory.run(["git", "add", "."])
+    directory.run(
+        [
+            "git",
+            "-c",
+            "user.name=John",
+            "-c",
+            "user.email=doe@email.org",
+            "commit",
+            "-m",
+            "oki",
+        ]
+    )
+
+
+def mkdir_project(directory, tags):
+    """Create a repository where each tag has a version.txt file"""
+
+    project_dir = directory.mkdir("project")
+    project_dir.run(["git", "init"])
+
+    for tag in tags:
+        commit_file(directory=project_dir, filename="version.txt", content=tag)
+        project_dir.run(["git", "tag", tag])
+
+    return project_dir
+
+
+def write_config(directory, config):
+    return directory.write_text(
+        filename="giit.json", data=json.dumps(config), encoding="utf-8"
+    )
+
+
+# Copies the version.txt file of the checkout to the build path
+copy_script = (
+    "python -c \"import shutil; shutil.copy('version.txt', "
+    "r'${build_path}/${name}.txt')\""
+)
+
+
+@pytest.mark.parametrize(
+    "checkout_backend, command_runner",
+    [(None, "subprocess"), ("archive", "subprocess"), (None, "asyncio")],
+)
+def test_build_jobs(testdirectory, checkout_backend, command_runner):
+
+    tags = ["1.0.0", "1.1.0", "2.0.0", "2.1.0"]
+
+    project_dir = mkdir_project(directory=testdirectory, tags=tags)
+    build_dir = testdirectory.mkdir("build")
+    giit_dir = testdirectory.mkdir("giit")
+
+    config = {
+        "docs": {
+            "tags.semver.filters": [">=1.0.0"],
+            "scripts": [copy_script],
+            "cwd": "${source_path}",
+        }
+    }
+
+    config_path = write_config(directory=testdirectory, config=config)
+
+    build = giit.build.Build(
+        step="docs",
+        repository=project_dir.path(),
+        factory=giit.factory,
+        build_path=build_dir.path(),
+        giit_path=giit_dir.path(),
+        config_path=config_path,
+        jobs=3,
+        checkout_backend=checkout_backend,
+        command_runner=command_runner,
+    )
+
+    build.run()
+
+    for tag in tags:
+        assert build_dir.contains_file(tag + ".txt")
+
+        with open(os.path.join(build_dir.path(), tag + ".txt")) as f:
+            assert f.read() == tag
+
+
+def test_build_cache(testdirectory, caplog):
+
+    tags = ["1.0.0", "2.0.0"]
+
+    project_dir = mkdir_project(directory=testdirectory, tags=tags)
+    build_dir = testdirectory.mkdir("build")
+    giit_dir = testdirectory.mkdir("giit")
+
+    config = {
+        "docs": {
+            "tags.semver.filters": [">=1.0.0"],
+            "scripts": [
+                "python -c \"import shutil; shutil.copytree('.', "
+                "r'${output_path}', ignore=shutil.ignore_patterns('.git'))\""
+            ],
+            "cwd": "${source_path}",
+            "output_path": "${build_path}/${name}",
+        }
+    }
+
+    config_path = write_config(directory=testdirectory, config=config)
+
+    def run_build():
+        build = giit.build.Build(
+            step="docs",
+            repository=project_dir.path(),
+            factory=giit.factory,
+            build_path=build_dir.path(),
+            giit_path=giit_dir.path(),
+            config_path=config_path,
+        )
+
+        build.run()
+
+    run_build()
+
+    assert build_dir.contains_file("1.0.0/version.txt")
+    assert build_dir.contains_file("2.0.0/version.txt")
+
+    caplog.clear()
+    run_build()
+
+    # The tags did not change so the output is reused
+    assert caplog.text.count("Up to date task") == 2
+
+    # If the output is removed it is restored from the artifact store
+    shutil.rmtree(os.path.join(build_dir.path(), "1.0.0"))
+
+    caplog.clear()
+    run_build()
+
+    assert caplog.text.count("Up to date task") == 1
+    assert caplog.text.count("Restored task") == 1
+    assert build_dir.contains_file("1.0.0/version.txt")
+
+    # The run report records what happened to each task
+    reports_path = os.path.join(giit_dir.path(), "reports")
+    (report_file,) = os.listdir(reports_path)
+
+    with open(os.path.join(reports_path, report_file)) as f:
+        report = json.load(f)
+
+    statuses = {task["name"]: task["status"] for task in report["tasks"]}
+    assert statuses == {"1.0.0": "restored", "2.0.0": "up_to_date"}
+
+
+def test_build_timeout(testdirectory):
+
+    tags = ["1.0.0", "2.0.0"]
+
+    project_dir = mkdir_project(directory=testdirectory, tags=tags)
+    build_dir = testdirectory.mkdir("build")
+    giit_dir = testdirectory.mkdir("giit")
+
+    # The 1.0.0 task hangs, the build carries on since failures are allowed
+    config = {
+        "docs": {
+            "tags.semver.filters": [">=1.0.0"],
+            "scripts": [
+                "python -c \"import time; time.sleep(30 if '${name}' == '1.0.0' else 0)\"",
+                copy_script,
+            ],
+            "cwd": "${source_path}",
+            "allow_failure": True,
+        }
+    }
+
+    config_path = write_config(directory=testdirectory, config=config)
+
+    build = giit.build.Build(
+        step="docs",
+        repository=project_dir.path(),
+        factory=giit.factory,
+        build_path=build_dir.path(),
+        giit_path=giit_dir.path(),
+        config_path=config_path,
+        task_timeout=1,
+    )
+
+    build.run()
+
+    assert not build_dir.contains_file("1.0.0.txt")
+    assert build_dir.contains_file("2.0.0.txt")
+
+    statuses = {task["name"]: task["status"] for task in build.report.tasks}
+    assert statuses == {"1.0.0": "timed_out", "2.0.0": "ran"}
+
+
+def test_build_needs(testdirectory):
+
+    tags = ["1.0.0", "2.0.0"]
+
+    project_dir = mkdir_project(directory=testdirectory, tags=tags)
+    build_dir = testdirectory.mkdir("build")
+    giit_dir = testdirectory.mkdir("giit")
+
+    # The publish step lists the files written by the docs step
+    config = {
+        "docs": {
+            "tags.semver.filters": [">=1.0.0"],
+            "scripts": [copy_script],
+            "cwd": "${source_path}",
+        },
+        "publish": {
+            "needs": ["docs"],
+            "scripts": [
+                "python -c \"import os; names = sorted(os.listdir(r'${build_path}')); "
+                "open(r'${build_path}/published.txt', 'w').write(' '.join(names))\""
+            ],
+        },
+    }
+
+    config_path = write_config(directory=testdirectory, config=config)
+
+    build = giit.build.Build(
+        step="publish",
+        repository=project_dir.path(),
+        factory=giit.factory,
+        build_path=build_dir.path(),
+        giit_path=giit_dir.path(),
+        config_path=config_path,
+        jobs=2,
+    )
+
+    build.run()
+
+    with open(os.path.join(build_dir.path(), "published.txt")) as f:
+        assert f.read() == "1.0.0.txt 2.0.0.txt"
+
+    names = [task["name"] for task in build.report.tasks]
+    assert sorted(names) == ["docs:1.0.0", "docs:2.0.0", "publish:no_git"]
+
+    # The steps must not need each other in a cycle
+    config["docs"]["needs"] = ["publish"]
+    write_config(directory=testdirectory, config=config)
+
+    with pytest.raises(RuntimeError, match="cycle"):
+        build.run()
+
+
+def test_build_resume(testdirectory):
+
+    tags = ["1.0.0", "2.0.0"]
+
+    project_dir = mkdir_project(directory=testdirectory, tags=tags)
+    build_dir = testdirectory.mkdir("build")
+    giit_dir = testdirectory.mkdir("giit")
+    testdirectory.write_text("fail", "", encoding="utf-8")
+    marker = os.path.join(testdirectory.path(), "fail")
+
+    # The 1.0.0 task fails while the marker file exists
+    config = {
+        "docs": {
+            "tags.semver.filters": [">=1.0.0"],
+            "scripts": [
+                "python -c \"import os, sys; sys.exit('${name}' == '1.0.0' "
+                "and os.path.exists(r'" + marker + "'))\"",
+                copy_script,
+            ],
+            "cwd": "${source_path}",
+        }
+    }
+
+    config_path = write_config(directory=testdirectory, config=config)
+
+    def run_build(resume):
+        build = giit.build.Build(
+            step="docs",
+            repository=project_dir.path(),
+            factory=giit.factory,
+            build_path=build_dir.path(),
+            giit_path=giit_dir.path(),
+            config_path=config_path,
+            resume=resume,
+        )
+
+        try:
+            build.run()
+        finally:
+            statuses = {task["name"]: task["status"] for task in build.report.tasks}
+
+        return statuses
+
+    with pytest.raises(giit.run_error.RunError):
+        run_build(resume=False)
+
+    assert build_dir.contains_file("2.0.0.txt")
+    assert not build_dir.contains_file("1.0.0.txt")
+
+    os.remove(marker)
+
+    # The task which succeeded is skipped
+    assert run_build(resume=True) == {"1.0.0": "ran", "2.0.0": "resumed"}
+    assert build_dir.contains_file("1.0.0.txt")
+
+    assert run_build(resume=True) == {"1.0.0": "resumed", "2.0.0": "resumed"}
+
+    # Without resume all tasks are run
+    assert run_build(resume=False) == {"1.0.0": "ran", "2.0.0": "ran"}
+
+
+def test_build_resume_output(testdirectory):
+
+    tags = ["1.0.0", "2.0.0"]
+
+    project_dir = mkdir_project(directory=testdirectory, tags=tags)
+    build_dir = testdirectory.mkdir("build")
+    giit_dir = testdirectory.mkdir("giit")
+
+    config = {
+        "docs": {
+            "tags.semver.filters": [">=1.0.0"],
+            "scripts": [
+                "python -c \"import shutil; shutil.copytree('.', "
+                "r'${output_path}', ignore=shutil.ignore_patterns('.git'))\""
+            ],
+            "cwd": "${source_path}",
+            "output_path": "${build_path}/${name}",
+        }
+    }
+
+    config_path = write_config(directory=testdirectory, config=config)
+
+    def run_build(resume):
+        build = giit.build.Build(
+            step="docs",
+            repository=project_dir.path(),
+            factory=giit.factory,
+            build_path=build_dir.path(),
+            giit_path=giit_dir.path(),
+            config_path=config_path,
+            resume=resume,
+        )
+
+        build.run()
+
+        return {task["name"]: task["status"] for task in build.report.tasks}
+
+    assert run_build(resume=False) == {"1.0.0": "ran", "2.0.0": "ran"}
+
+    # A task whose output was removed is not skipped when resuming
+    shutil.rmtree(os.path.join(build_dir.path(), "1.0.0"))
+
+    assert run_build(resume=True) == {"1.0.0": "restored", "2.0.0": "resumed"}
+    assert build_dir.contains_file("1.0.0/version.txt")
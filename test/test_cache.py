@@ -1,12 +1,107 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
+import json
+import os
+import shutil
+
 from giit.cache import Cache
 
 
 def test_cache(testdirectory):
 
     testdir = testdirectory.mkdir("testdir")
+    testdir.write_binary("index.html", b"x" * 100)
+
+    with Cache(cache_path=testdirectory.path(), unique_name="std-932") as c:
+        assert not c.match(sha1="32423")
+
+        c.update(sha1="32423", path=testdir.path(), task="master", duration=2.0)
+        assert c.match(sha1="32423")
+
+        # Restoring the output does not change the duration
+        c.update(sha1="32423", path=testdir.path(), task="master")
+
+        assert c.stats() == {"builds": 1, "size": 100, "duration": 2.0}
+
+        # The durations are averaged with the previous run
+        c.record_duration(step="docs", task="master", duration=4.0)
+        c.record_duration(step="docs", task="master", duration=2.0)
+
+        assert c.durations() == {("docs", "master"): 3.0}
+
+    # Other repositories do not see the build
+    with Cache(cache_path=testdirectory.path(), unique_name="other-123") as c:
+        assert not c.match(sha1="32423")
+
+    # The output was removed
+    shutil.rmtree(testdir.path())
 
     with Cache(cache_path=testdirectory.path(), unique_name="std-932") as c:
-        c.update(sha1="32423", path=testdir.path())
+        assert not c.match(sha1="32423")
+
+        c.clear()
+        assert c.stats()["builds"] == 0
+        assert c.durations() == {}
+
+
+def test_cache_shared_output(testdirectory):
+    """Builds for different commits may write to the same output directory"""
+
+    testdir = testdirectory.mkdir("testdir")
+
+    with Cache(cache_path=testdirectory.path(), unique_name="std-932") as c:
+        c.update(sha1="old", path=testdir.path())
+        c.update(sha1="new", path=testdir.path())
+
+        # The directory holds the output of the last build
+        assert not c.match(sha1="old")
+        assert c.match(sha1="new")
+
+        # E.g. restored from the artifact store
+        c.update(sha1="old", path=testdir.path())
+
+        assert c.match(sha1="old")
+        assert not c.match(sha1="new")
+
+        # E.g. a task started writing to the directory
+        c.invalidate(path=testdir.path())
+
+        assert not c.match(sha1="old")
+        assert not c.match(sha1="new")
+
+
+def test_cache_concurrent(testdirectory):
+    """Two caches open at the same time, e.g. in two processes sharing the
+    giit_path, must not lose each others updates.
+    """
+
+    dir_a = testdirectory.mkdir("a")
+    dir_b = testdirectory.mkdir("b")
+
+    with Cache(cache_path=testdirectory.path(), unique_name="std-932") as a:
+        with Cache(cache_path=testdirectory.path(), unique_name="std-932") as b:
+            a.update(sha1="aaa", path=dir_a.path())
+            b.update(sha1="bbb", path=dir_b.path())
+
+            assert a.match(sha1="bbb")
+
+    with Cache(cache_path=testdirectory.path(), unique_name="std-932") as c:
+        assert c.match(sha1="aaa")
+        assert c.match(sha1="bbb")
+
+
+def test_cache_legacy(testdirectory):
+
+    testdir = testdirectory.mkdir("testdir")
+
+    testdirectory.write_text(
+        "cache-std-932.json",
+        json.dumps({"32423": testdir.path()}),
+        encoding="utf-8",
+    )
+
+    with Cache(cache_path=testdirectory.path(), unique_name="std-932") as c:
+        assert c.match(sha1="32423")
+
+    assert not os.path.exists(os.path.join(testdirectory.path(), "cache-std-932.json"))
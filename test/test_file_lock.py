@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import sys
+import time
+import threading
+import pytest
+
+import giit.file_lock
+
+
+def test_file_lock(testdirectory):
+
+    path = os.path.join(testdirectory.path(), "locks", "test.lock")
+
+    acquired = threading.Event()
+
+    def worker():
+        with giit.file_lock.FileLock(path=path):
+            acquired.set()
+
+    with giit.file_lock.FileLock(path=path):
+        thread = threading.Thread(target=worker)
+        thread.start()
+
+        time.sleep(0.2)
+        assert not acquired.is_set()
+
+    thread.join()
+    assert acquired.is_set()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="No shared locks on Windows")
+def test_file_lock_shared(testdirectory):
+
+    path = os.path.join(testdirectory.path(), "test.lock")
+
+    with giit.file_lock.FileLock(path=path, shared=True):
+        with giit.file_lock.FileLock(path=path, shared=True):
+            pass
+
+        # An exclusive lock is not given while shared locks are held
+        lock = giit.file_lock.FileLock(path=path)
+        assert not lock.acquire(blocking=False)
+
+    assert lock.acquire(blocking=False)
+    lock.release()
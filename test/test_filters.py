@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import mock
+
+import giit.config
+import giit.filters
+
+
+def test_compile_regex_filters():
+
+    match = giit.filters.compile_regex_filters(
+        regex_filters=["origin/master", r"origin/(\d+\.\d+)-LTS"]
+    )
+
+    assert match("origin/master")
+    assert match("origin/1.2-LTS")
+    assert not match("upstream/origin/master")
+
+    # Back references are kept working by not combining the filters
+    match = giit.filters.compile_regex_filters(regex_filters=["master", r"(\d)\.\1"])
+
+    assert match("1.1")
+    assert not match("1.2")
+
+    assert not giit.filters.compile_regex_filters(regex_filters=[])("master")
+
+
+def test_branch_filter():
+
+    config = giit.config.validate_config(
+        config={
+            "scripts": [],
+            "branches.regex.filters": ["origin/master"],
+            "branches.source_branch": True,
+        }
+    )
+
+    source_branch = mock.Mock(return_value="origin/feature")
+
+    branch_filter = giit.filters.BranchFilter(
+        config=config, source_branch=source_branch
+    )
+
+    assert branch_filter.match("origin/master")
+    assert branch_filter.match("origin/feature")
+    assert not branch_filter.match("origin/other")
+    assert not branch_filter.match("origin/another")
+
+    # The source branch is only resolved once
+    assert source_branch.call_count == 1
+
+
+def test_tag_filter():
+
+    config = giit.config.validate_config(
+        config={
+            "scripts": [],
+            "tags.regex.filters": ["^nightly-"],
+            "tags.semver.filters": [">=1.0.0", "<0.2.0"],
+        }
+    )
+
+    tag_filter = giit.filters.TagFilter(config=config)
+
+    assert tag_filter.match("1.0.0")
+    assert tag_filter.match("0.1.0")
+    assert not tag_filter.match("0.5.0")
+    assert tag_filter.match("nightly-2020")
+
+    # Tags which are not versions do not stop the build
+    assert not tag_filter.match("not-a-version")
+    assert not tag_filter.match("1.2")
+
+    config["tags"]["semver"]["relaxed"] = True
+    assert giit.filters.TagFilter(config=config).match("1.2")
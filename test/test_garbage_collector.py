@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import time
+import mock
+
+import giit.build
+import giit.cache
+import giit.factory
+import giit.file_lock
+import giit.garbage_collector
+
+
+def mkdir_item(directory, path, size, last_used):
+    """Create a directory containing a file of the given size"""
+
+    item_dir = directory.mkdir(path)
+    item_dir.write_binary("data", b"x" * size)
+    os.utime(item_dir.path(), (last_used, last_used))
+
+
+def test_garbage_collector(testdirectory):
+
+    giit_dir = testdirectory.mkdir("giit")
+    now = time.time()
+    day = 24 * 60 * 60
+
+    giit_dir.mkdir("clones")
+    giit_dir.mkdir("build")
+    giit_dir.mkdir("virtualenvs")
+
+    mkdir_item(giit_dir, "clones/old-123456", 1000, now - 10 * day)
+    mkdir_item(giit_dir, "build/old-123456", 1000, now - 10 * day)
+    mkdir_item(giit_dir, "clones/new-123456", 1000, now)
+    mkdir_item(giit_dir, "virtualenvs/giit-virtualenv-1", 500, now - 5 * day)
+    mkdir_item(giit_dir, "virtualenvs/giit-virtualenv-2", 500, now - 1 * day)
+
+    # The builds recorded in the cache are removed with the repository. A
+    # cache file of an earlier version is imported when the cache is opened
+    for name in ["old-123456", "new-123456"]:
+        with giit.cache.Cache(cache_path=giit_dir.path(), unique_name=name) as cache:
+            cache.update(sha1="aaa", path=giit_dir.path())
+
+    giit_dir.write_text("cache-old-123456.json", "{}", encoding="utf-8")
+    cache_path = os.path.join(giit_dir.path(), "cache-old-123456.json")
+    os.utime(cache_path, (now - 10 * day, now - 10 * day))
+
+    collector = giit.garbage_collector.GarbageCollector(
+        giit_path=giit_dir.path(), log=mock.Mock()
+    )
+
+    items = collector.items()
+
+    # The least recently used first
+    assert [str(item) for item in items] == [
+        "repository old-123456",
+        "virtualenv giit-virtualenv-1",
+        "virtualenv giit-virtualenv-2",
+        "repository new-123456",
+    ]
+
+    # The clone, build directory and cache are one item
+    assert len(items[0].paths) == 3
+    assert items[0].size == 2002
+
+    removed = collector.collect(max_age=7 * day)
+
+    assert [str(item) for item in removed] == ["repository old-123456"]
+    assert not os.path.exists(cache_path)
+    assert not giit_dir.contains_dir("build/old-123456")
+
+    with giit.cache.Cache(cache_path=giit_dir.path(), unique_name="old-123456") as c:
+        assert not c.match(sha1="aaa")
+
+    with giit.cache.Cache(cache_path=giit_dir.path(), unique_name="new-123456") as c:
+        assert c.match(sha1="aaa")
+
+    # Remove until the rest fits in 1600 bytes
+    removed = collector.collect(max_size=1600)
+
+    assert [str(item) for item in removed] == ["virtualenv giit-virtualenv-1"]
+    assert giit_dir.contains_dir("virtualenvs/giit-virtualenv-2")
+    assert giit_dir.contains_dir("clones/new-123456")
+
+
+def test_garbage_collector_in_use(testdirectory):
+
+    giit_dir = testdirectory.mkdir("giit")
+    giit_dir.mkdir("clones")
+
+    mkdir_item(giit_dir, "clones/old-123456", 1000, 0.0)
+
+    collector = giit.garbage_collector.GarbageCollector(
+        giit_path=giit_dir.path(), log=mock.Mock()
+    )
+
+    # A build is using the clone
+    use_lock = giit.file_lock.FileLock(
+        path=os.path.join(giit_dir.path(), "clones", "old-123456.use.lock"),
+        shared=True,
+    )
+
+    with use_lock:
+        assert collector.collect(max_age=1) == []
+        assert giit_dir.contains_dir("clones/old-123456")
+
+    assert len(collector.collect(max_age=1)) == 1
+    assert not giit_dir.contains_dir("clones/old-123456")
+
+
+def test_build_gc(testdirectory):
+
+    giit_dir = testdirectory.mkdir("giit")
+    giit_dir.mkdir("virtualenvs")
+
+    mkdir_item(giit_dir, "virtualenvs/giit-virtualenv-1", 500, 0.0)
+
+    build = giit.build.Build(
+        step="gc",
+        repository=None,
+        factory=giit.factory,
+        giit_path=giit_dir.path(),
+        gc_max_age=1,
+    )
+
+    build.run()
+
+    assert not giit_dir.contains_dir("virtualenvs/giit-virtualenv-1")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import json
+import mock
+import pytest
+
+import giit.factory
+import giit.giit_json
+
+
+def commit_file(directory, filename, content):
+    directory.write_text(filename, content, encoding="utf-8")
+    directory.run(["git", "add", "."])
+    directory.run(
+        [
+            "git",
+            "-c",
+            "user.name=John",
+            "-c",
+            "user.email=doe@email.org",
+            "commit",
+            "-m",
+            "oki",
+        ]
+    )
+
+
+def test_giit_json_config_branch(testdirectory):
+
+    giit_dir = testdirectory.mkdir("giit")
+    repo_dir = testdirectory.mkdir("repo")
+
+    repo_dir.run(["git", "init", "-b", "main"])
+    commit_file(
+        directory=repo_dir, filename="giit.json", content=json.dumps({"docs": {}})
+    )
+    repo_dir.run(["git", "checkout", "-b", "next"])
+    commit_file(
+        directory=repo_dir, filename="giit.json", content=json.dumps({"next": {}})
+    )
+    repo_dir.run(["git", "checkout", "main"])
+
+    factory = giit.factory.resolve_factory(
+        giit_path=giit_dir.path(), repository=repo_dir.path()
+    )
+
+    git_repository = factory.build()
+    git_repository.clone()
+
+    giit_json = giit.giit_json.GiitJson(
+        git_repository=git_repository, log=mock.Mock(), config_branch="origin/next"
+    )
+
+    assert giit_json.read() == {"next": {}}
+
+    # The branch was not checked out in the clone
+    head = git_repository.git.current_commit(cwd=git_repository.repository_path())
+    assert head == git_repository.commit(checkout="origin/main")
+
+    giit_json = giit.giit_json.GiitJson(
+        git_repository=git_repository, log=mock.Mock(), config_branch="origin/nope"
+    )
+
+    with pytest.raises(RuntimeError):
+        giit_json.read()
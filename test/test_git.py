@@ -5,6 +5,7 @@ import mock
 
 import giit.git
 import giit.prompt
+import giit.run_report
 
 
 def test_git(testdirectory):
@@ -14,3 +15,111 @@ def test_git(testdirectory):
     git = giit.git.Git(git_binary="git", prompt=giit.prompt.Prompt(), log=log)
 
     print(git.version())
+
+
+def test_git_refs(testdirectory):
+
+    repo_dir = testdirectory.mkdir("repo")
+    repo_dir.run(["git", "init"])
+    repo_dir.write_text("ok.txt", "hello", encoding="utf-8")
+    repo_dir.run(["git", "add", "."])
+    repo_dir.run(
+        [
+            "git",
+            "-c",
+            "user.name=John",
+            "-c",
+            "user.email=doe@email.org",
+            "commit",
+            "-m",
+            "oki",
+        ]
+    )
+    repo_dir.run(["git", "tag", "1.0.0"])
+    repo_dir.run(
+        [
+            "git",
+            "-c",
+            "user.name=John",
+            "-c",
+            "user.email=doe@email.org",
+            "tag",
+            "-a",
+            "2.0.0",
+            "-m",
+            "annotated",
+        ]
+    )
+
+    clone_dir = testdirectory.mkdir("clone")
+    clone_dir.run(["git", "clone", repo_dir.path(), "."])
+
+    git = giit.git.Git(git_binary="git", prompt=giit.prompt.Prompt(), log=mock.Mock())
+
+    commit = git.current_commit(cwd=clone_dir.path())
+    refs = git.refs(cwd=clone_dir.path())
+
+    # The origin/HEAD symbolic ref is skipped
+    assert len(refs.remote_branches()) == 1
+    assert refs.tag_names() == ["1.0.0", "2.0.0"]
+
+    # The annotated tag is peeled to the commit
+    assert refs.commit(ref="1.0.0") == commit
+    assert refs.commit(ref="2.0.0") == commit
+    assert refs.commit(ref=refs.remote_branches()[0]) == commit
+    assert refs.commit(ref="3.0.0") is None
+
+    tree = git.current_commit(cwd=clone_dir.path(), ref="HEAD^{tree}")
+
+    assert refs.tree(ref="1.0.0") == tree
+    assert refs.tree(ref="2.0.0") == tree
+    assert refs.tree(ref="3.0.0") is None
+
+
+def test_git_cat_file(testdirectory):
+
+    repo_dir = testdirectory.mkdir("repo")
+    repo_dir.run(["git", "init"])
+    repo_dir.write_text("giit.json", '{"docs": {}}', encoding="utf-8")
+    repo_dir.run(["git", "add", "."])
+    repo_dir.run(
+        [
+            "git",
+            "-c",
+            "user.name=John",
+            "-c",
+            "user.email=doe@email.org",
+            "commit",
+            "-m",
+            "oki",
+        ]
+    )
+    repo_dir.run(["git", "tag", "1.0.0"])
+
+    report = giit.run_report.RunReport(log=mock.Mock())
+    prompt = giit.prompt.Prompt(report=report)
+
+    git = giit.git.Git(git_binary="git", prompt=prompt, log=mock.Mock())
+
+    content = git.cat_file(ref="1.0.0", path="giit.json", cwd=repo_dir.path())
+    assert content == b'{"docs": {}}'
+
+    # The same process is used for the following reads
+    assert git.cat_file(ref="1.0.0", path="missing.txt", cwd=repo_dir.path()) is None
+    assert (
+        git.cat_file(ref="1.0.0", path="docs/my reqs.txt", cwd=repo_dir.path()) is None
+    )
+    assert git.cat_file(ref="2.0.0", path="giit.json", cwd=repo_dir.path()) is None
+    assert len(git._cat_files) == 1
+
+    content = git.cat_file(ref="HEAD", path="giit.json", cwd=repo_dir.path())
+    assert content == b'{"docs": {}}'
+
+    git.close()
+    assert len(git._cat_files) == 0
+
+    # The process is recorded in the run report when stopped
+    (command,) = report.commands
+    assert command["command"] == "git cat-file --batch"
+    assert command["returncode"] == 0
+    assert command["output_bytes"] > 0
@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
+import os
 import mock
 
 import giit.factory
+import giit.git_refs
 
 
 def fake_git():
@@ -13,14 +15,14 @@ def fake_git():
     git.version.return_value = (1, 2, 3)
     git.remote_origin_url.return_value = "git@github.com:steinwurf/giit.git"
 
-    git.remote_branches.return_value = [
+    branches = [
         "origin/add-prune",
         "origin/improvements-v2",
         "origin/initial-push",
         "origin/master",
     ]
 
-    git.tags.return_value = [
+    tags = [
         "1.0.0",
         "1.0.1",
         "1.0.2",
@@ -30,6 +32,11 @@ def fake_git():
         "3.0.0",
     ]
 
+    git.refs.return_value = giit.git_refs.GitRefs(
+        branches={branch: "0" * 40 for branch in branches},
+        tags={tag: "1" * 40 for tag in tags},
+    )
+
     return git
 
 
@@ -93,3 +100,262 @@ def test_git_source_branch(testdirectory, caplog):
     git_repository = factory.build()
 
     assert git_repository.source_branch() == "origin/master"
+
+
+def commit_file(directory, filename, content):
+    directory.write_text(filename, content, encoding="utf-8")
+    directory.run(["git", "add", "."])
+    directory.run(
+        [
+            "git",
+            "-c",
+            "user.name=John",
+            "-c",
+            "user.email=doe@email.org",
+            "commit",
+            "-m",
+            "oki",
+        ]
+    )
+
+
+def test_git_repository_worktrees(testdirectory):
+    """Test that each checkout gets its own worktree when running jobs in
+    parallel
+    """
+
+    giit_dir = testdirectory.mkdir("giit")
+    repo_dir = testdirectory.mkdir("repo")
+
+    repo_dir.run(["git", "init"])
+    commit_file(directory=repo_dir, filename="version.txt", content="1.0.0")
+    repo_dir.run(["git", "tag", "1.0.0"])
+    commit_file(directory=repo_dir, filename="version.txt", content="2.0.0")
+    repo_dir.run(["git", "tag", "2.0.0"])
+
+    factory = giit.factory.resolve_factory(
+        giit_path=giit_dir.path(), repository=repo_dir.path(), jobs=2
+    )
+
+    git_repository = factory.build()
+    git_repository.clone()
+
+    git_repository.checkout_tag(tag="1.0.0")
+    git_repository.checkout_tag(tag="2.0.0")
+
+    path_1 = git_repository.checkout_path(checkout="1.0.0")
+    path_2 = git_repository.checkout_path(checkout="2.0.0")
+
+    assert path_1 != path_2
+    assert path_1 != git_repository.repository_path()
+
+    with open(os.path.join(path_1, "version.txt")) as f:
+        assert f.read() == "1.0.0"
+
+    with open(os.path.join(path_2, "version.txt")) as f:
+        assert f.read() == "2.0.0"
+
+    # Checking out again reuses the worktree
+    git_repository.checkout_tag(tag="1.0.0")
+
+
+def test_git_repository_sync(testdirectory):
+    """Test that sync fetches new tags without touching the working tree"""
+
+    giit_dir = testdirectory.mkdir("giit")
+    repo_dir = testdirectory.mkdir("repo")
+
+    repo_dir.run(["git", "init"])
+    commit_file(directory=repo_dir, filename="version.txt", content="1.0.0")
+    repo_dir.run(["git", "tag", "1.0.0"])
+
+    factory = giit.factory.resolve_factory(
+        giit_path=giit_dir.path(), repository=repo_dir.path()
+    )
+
+    git_repository = factory.build()
+    git_repository.clone()
+
+    assert git_repository.tags() == ["1.0.0"]
+
+    commit_file(directory=repo_dir, filename="version.txt", content="2.0.0")
+    repo_dir.run(["git", "tag", "2.0.0"])
+    repo_dir.run(["git", "tag", "-d", "1.0.0"])
+
+    git_repository.sync()
+
+    assert git_repository.tags() == ["2.0.0"]
+
+    # The working tree of the clone is untouched
+    path = os.path.join(git_repository.repository_path(), "version.txt")
+
+    with open(path) as f:
+        assert f.read() == "1.0.0"
+
+
+def test_git_repository_partial_clone(testdirectory):
+    """Test a shallow, blobless and sparse clone of a local bare repository"""
+
+    giit_dir = testdirectory.mkdir("giit")
+    repo_dir = testdirectory.mkdir("repo")
+
+    repo_dir.run(["git", "init"])
+    repo_dir.mkdir("docs")
+    repo_dir.mkdir("src")
+    commit_file(directory=repo_dir, filename="docs/index.rst", content="1.0.0")
+    commit_file(directory=repo_dir, filename="src/main.py", content="1.0.0")
+    repo_dir.run(["git", "tag", "1.0.0"])
+    commit_file(directory=repo_dir, filename="docs/index.rst", content="2.0.0")
+    repo_dir.run(["git", "tag", "2.0.0"])
+
+    testdirectory.run(["git", "clone", "--bare", "repo", "remote.git"])
+    remote_dir = testdirectory.join("remote.git")
+    remote_dir.run(["git", "config", "uploadpack.allowFilter", "true"])
+
+    factory = giit.factory.resolve_factory(
+        giit_path=giit_dir.path(),
+        repository=remote_dir.path(),
+        clone_filter="blob:none",
+        clone_depth=1,
+        sparse_paths=["docs"],
+    )
+
+    git_repository = factory.build()
+    git_repository.clone()
+    git_repository.sync()
+
+    assert sorted(git_repository.tags()) == ["1.0.0", "2.0.0"]
+
+    git_repository.checkout_tag(tag="1.0.0")
+
+    path = git_repository.checkout_path(checkout="1.0.0")
+
+    with open(os.path.join(path, "docs", "index.rst")) as f:
+        assert f.read() == "1.0.0"
+
+    # Only the sparse paths are checked out
+    assert not os.path.exists(os.path.join(path, "src"))
+
+    # The clone is shallow
+    result = git_repository.git.prompt.run(
+        ["git", "rev-parse", "--is-shallow-repository"], cwd=path
+    )
+    assert result.stdout.strip() == "true"
+
+
+def test_git_repository_mirror(testdirectory):
+    """Test that clones in different giit_paths borrow the objects of a
+    shared mirror
+    """
+
+    mirror_dir = testdirectory.mkdir("mirror")
+    repo_dir = testdirectory.mkdir("repo")
+
+    repo_dir.run(["git", "init"])
+    commit_file(directory=repo_dir, filename="version.txt", content="1.0.0")
+    repo_dir.run(["git", "tag", "1.0.0"])
+
+    clones = []
+
+    for name in ["giit_a", "giit_b"]:
+        giit_dir = testdirectory.mkdir(name)
+
+        factory = giit.factory.resolve_factory(
+            giit_path=giit_dir.path(),
+            repository=repo_dir.path(),
+            mirror_path=mirror_dir.path(),
+        )
+
+        git_repository = factory.build()
+        git_repository.clone()
+        git_repository.sync()
+
+        assert git_repository.tags() == ["1.0.0"]
+
+        clones.append(git_repository)
+
+    mirror_path = clones[0].mirror_repository_path()
+    assert mirror_path == clones[1].mirror_repository_path()
+    assert os.path.isdir(mirror_path)
+
+    for git_repository in clones:
+        alternates = os.path.join(
+            git_repository.repository_path(), ".git", "objects", "info", "alternates"
+        )
+
+        with open(alternates) as f:
+            assert f.read().strip() == os.path.join(mirror_path, "objects")
+
+    # New tags reach the clones through the mirror
+    commit_file(directory=repo_dir, filename="version.txt", content="2.0.0")
+    repo_dir.run(["git", "tag", "2.0.0"])
+
+    factory = giit.factory.resolve_factory(
+        giit_path=testdirectory.join("giit_a").path(),
+        repository=repo_dir.path(),
+        mirror_path=mirror_dir.path(),
+    )
+
+    git_repository = factory.build()
+    git_repository.clone()
+    git_repository.sync()
+
+    assert sorted(git_repository.tags()) == ["1.0.0", "2.0.0"]
+
+    git_repository.checkout_tag(tag="2.0.0")
+
+    path = os.path.join(git_repository.repository_path(), "version.txt")
+
+    with open(path) as f:
+        assert f.read() == "2.0.0"
+
+
+def test_git_repository_archive(testdirectory):
+    """Test that the archive backend exports each tree once"""
+
+    giit_dir = testdirectory.mkdir("giit")
+    repo_dir = testdirectory.mkdir("repo")
+
+    repo_dir.run(["git", "init"])
+    repo_dir.mkdir("docs")
+    repo_dir.mkdir("src")
+    commit_file(directory=repo_dir, filename="docs/index.rst", content="1.0.0")
+    commit_file(directory=repo_dir, filename="src/main.py", content="1.0.0")
+    repo_dir.run(["git", "tag", "1.0.0"])
+    repo_dir.run(["git", "tag", "1.0.1"])
+    commit_file(directory=repo_dir, filename="docs/index.rst", content="2.0.0")
+    repo_dir.run(["git", "tag", "2.0.0"])
+
+    factory = giit.factory.resolve_factory(
+        giit_path=giit_dir.path(),
+        repository=repo_dir.path(),
+        checkout_backend="archive",
+        sparse_paths=["docs"],
+    )
+
+    git_repository = factory.build()
+    git_repository.clone()
+
+    path_1 = git_repository.checkout_path(checkout="1.0.0")
+    path_2 = git_repository.checkout_path(checkout="2.0.0")
+
+    # Tags pointing to the same tree share the export
+    assert path_1 == git_repository.checkout_path(checkout="1.0.1")
+    assert path_1 != path_2
+
+    git_repository.checkout_tag(tag="1.0.0")
+    git_repository.checkout_tag(tag="2.0.0")
+
+    with open(os.path.join(path_1, "docs", "index.rst")) as f:
+        assert f.read() == "1.0.0"
+
+    with open(os.path.join(path_2, "docs", "index.rst")) as f:
+        assert f.read() == "2.0.0"
+
+    # Only the requested paths are exported
+    assert not os.path.exists(os.path.join(path_1, "src"))
+
+    # Existing exports are reused
+    git_repository.git = mock.Mock()
+    git_repository.checkout_tag(tag="1.0.1")
+    assert not git_repository.git.archive.called
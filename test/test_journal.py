@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+
+from giit.journal import Journal
+
+
+def test_journal(testdirectory):
+
+    path = os.path.join(testdirectory.path(), "build", "journal.jsonl")
+
+    revision = {"commit": "abc", "config_hash": "123"}
+
+    with Journal(path=path, resume=False) as journal:
+        journal.start(step="docs", task="1.0.0", revision=revision)
+        journal.success(step="docs", task="1.0.0", revision=revision)
+        journal.start(step="docs", task="2.0.0", revision=revision)
+        journal.failure(step="docs", task="2.0.0", revision=revision)
+        journal.start(step="docs", task="3.0.0", revision=revision)
+
+    # The build was killed while writing a record
+    with open(path, "a") as f:
+        f.write('{"event": "succ')
+
+    with Journal(path=path, resume=True) as journal:
+        assert journal.completed(step="docs", task="1.0.0", revision=revision)
+        assert not journal.completed(step="docs", task="2.0.0", revision=revision)
+        assert not journal.completed(step="docs", task="3.0.0", revision=revision)
+
+        # The commit or config changed
+        assert not journal.completed(
+            step="docs", task="1.0.0", revision={"commit": "def", "config_hash": "123"}
+        )
+        assert not journal.completed(
+            step="docs", task="1.0.0", revision={"commit": "abc", "config_hash": "456"}
+        )
+
+    # The records appended after resuming are read back
+    with Journal(path=path, resume=True) as journal:
+        journal.success(step="docs", task="3.0.0", revision=revision)
+
+    with Journal(path=path, resume=True) as journal:
+        assert journal.completed(step="docs", task="1.0.0", revision=revision)
+        assert journal.completed(step="docs", task="3.0.0", revision=revision)
+
+    # Without resume the journal starts over
+    with Journal(path=path, resume=False) as journal:
+        assert not journal.completed(step="docs", task="1.0.0", revision=revision)
+
+    with Journal(path=path, resume=True) as journal:
+        assert not journal.completed(step="docs", task="1.0.0", revision=revision)
@@ -21,3 +21,5 @@ def test_venv_name_to_path_adapter(testdirectory):
     expected_path = os.path.join(root_path, "ok")
 
     virtual_environment.create_environment.assert_called_once_with(path=expected_path)
+
+    assert adapter.path(name="ok") == expected_path
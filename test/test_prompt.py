@@ -1,10 +1,123 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
+import os
+import json
+import time
+import mock
+import pytest
+
+import giit.logs
 import giit.prompt
+import giit.run_error
+import giit.run_report
 
 
 def test_run(testdirectory):
 
     prompt = giit.prompt.Prompt()
     prompt.run("python --version", cwd=testdirectory.path())
+
+
+def test_run_resource_usage(testdirectory):
+
+    report = giit.run_report.RunReport(log=mock.Mock())
+    prompt = giit.prompt.Prompt(report=report)
+
+    with report.task(name="test") as record:
+        record["status"] = "ran"
+        result = prompt.run("python --version", cwd=testdirectory.path())
+
+    assert result.output_bytes > 0
+
+    if hasattr(os, "wait4"):
+        assert result.user_time is not None
+        assert result.system_time is not None
+        assert result.max_rss > 0
+
+    # The returncode is set when the process is waited for
+    with pytest.raises(giit.run_error.RunError) as e:
+        prompt.run('python -c "import sys; sys.exit(3)"')
+
+    assert e.value.run_result.returncode == 3
+
+    assert len(report.commands) == 2
+    assert report.commands[0]["task"] == "test"
+    assert report.tasks[0]["commands"] == 1
+    assert report.tasks[0]["output_bytes"] == result.output_bytes
+
+    report_path = os.path.join(testdirectory.path(), "report.json")
+    report.write(report_path=report_path)
+
+    with open(report_path) as f:
+        data = json.load(f)
+
+    assert data["tasks"][0]["name"] == "test"
+    assert data["commands"][0]["command"] == "python --version"
+
+
+def test_run_stream(testdirectory):
+
+    log = mock.Mock()
+    prompt = giit.prompt.Prompt(log=log)
+
+    script = "import sys\nfor i in range(500): print(i)\nsys.stderr.write('done')\n"
+    testdirectory.write_text("count.py", script, encoding="utf-8")
+
+    log_path = os.path.join(testdirectory.path(), "logs", "task.log")
+
+    with giit.logs.task_log(path=log_path):
+        result = prompt.run(
+            ["python", "count.py"], cwd=testdirectory.path(), stream=True
+        )
+
+    # Only the tail of the output is kept, the standard error is merged
+    lines = result.stdout.splitlines()
+    assert len(lines) == giit.prompt.Prompt.TAIL_LINES
+    assert lines[0] == "401"
+    assert lines[-1] == "done"
+    assert result.stderr == ""
+
+    # Every line is logged at debug level and written to the task log
+    log.debug.assert_any_call("%s", "0")
+    assert not log.error.called
+
+    with open(log_path) as log_file:
+        content = log_file.read().splitlines()
+
+    assert content[0] == "$ python count.py"
+    assert content[1:] == [str(i) for i in range(500)] + ["done"]
+
+    # The tail of the output is shown if the command fails
+    with pytest.raises(giit.run_error.RunError):
+        prompt.run('python -c "print(42); exit(1)"', stream=True)
+
+    assert "42" in log.error.call_args[0][-1]
+
+
+def test_run_timeout(testdirectory):
+
+    prompt = giit.prompt.Prompt()
+
+    # The shell starts the sleeping child, both are killed
+    script = "import subprocess; subprocess.call(['python', '-c', 'import time; time.sleep(30)'])"
+    testdirectory.write_text("hang.py", script, encoding="utf-8")
+
+    start_time = time.time()
+
+    with pytest.raises(giit.run_error.RunTimeoutError) as error:
+        prompt.run("python hang.py", cwd=testdirectory.path(), timeout=0.5)
+
+    assert time.time() - start_time < 10
+    assert error.value.run_result.timed_out
+
+    # The task timeout also applies to the commands
+    with giit.prompt.task_timeout(timeout=0.5):
+        with pytest.raises(giit.run_error.RunTimeoutError):
+            prompt.run(
+                "python hang.py", cwd=testdirectory.path(), stream=True, timeout=60
+            )
+
+    # Commands which finish in time are not affected
+    result = prompt.run("python --version", timeout=60)
+    assert not result.timed_out
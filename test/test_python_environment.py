@@ -2,8 +2,12 @@
 # encoding: utf-8
 
 import mock
+import pytest
 import os
+import json
+import time
 import giit.python_environment
+import giit.name_to_path_adapter
 
 
 def test_python_environment(testdirectory):
@@ -16,7 +20,9 @@ def test_python_environment(testdirectory):
     )
 
     env = {"PATH": "/oki/doki"}
-    virtual_environment.create_environment.side_effect = lambda name: env
+    virtual_environment.create_environment.side_effect = lambda name, base_name: env
+    virtual_environment.path.side_effect = lambda name: testdirectory.path()
+    prompt.run.return_value.stdout = "sphinx==1.0.0\n"
 
     python_environment = giit.python_environment.PythonEnvironment(
         prompt=prompt, virtual_environment=virtual_environment, log=log
@@ -31,4 +37,152 @@ def test_python_environment(testdirectory):
     command = "python -m pip install -U -r {}".format(
         os.path.join(testdirectory.path(), "requirements.txt")
     )
-    prompt.run.assert_called_once_with(command=command, env=env)
+    prompt.run.assert_any_call(command=command, env=env, stream=True)
+    prompt.run.assert_called_with(command="python -m pip freeze", env=env)
+
+    # The environment is sealed with the installed packages
+    assert testdirectory.contains_file("giit-seal.json")
+
+
+def test_python_environment_sealed(testdirectory):
+
+    prompt = mock.Mock()
+    virtual_environment = mock.Mock()
+    log = mock.Mock()
+    requirements = testdirectory.write_text(
+        filename="requirements.txt", data="sphinx", encoding="utf-8"
+    )
+
+    env = {"PATH": "/oki/doki"}
+    virtual_environment.create_environment.side_effect = lambda name, base_name: env
+    virtual_environment.path.side_effect = lambda name: testdirectory.path()
+    prompt.run.return_value.stdout = "sphinx==1.0.0\n"
+
+    def from_requirements(refresh_time):
+        python_environment = giit.python_environment.PythonEnvironment(
+            prompt=prompt,
+            virtual_environment=virtual_environment,
+            log=log,
+            refresh_time=refresh_time,
+        )
+
+        return python_environment.from_requirements(
+            requirements=requirements, pip_packages=["sphinx-rtd-theme"]
+        )
+
+    refresh_time = time.time()
+
+    assert from_requirements(refresh_time=refresh_time) == env
+    assert prompt.run.call_count == 3
+
+    with open(os.path.join(testdirectory.path(), "giit-seal.json")) as f:
+        assert json.load(f)["freeze"] == ["sphinx==1.0.0"]
+
+    # The environment was sealed after the refresh time, pip is not run
+    prompt.run.reset_mock()
+    assert from_requirements(refresh_time=refresh_time) == env
+    assert prompt.run.call_count == 0
+
+    # A newer refresh time updates the environment
+    assert from_requirements(refresh_time=time.time() + 1) == env
+    assert prompt.run.call_count == 3
+
+    # Without a refresh time pip is always run
+    prompt.run.reset_mock()
+    assert from_requirements(refresh_time=None) == env
+    assert prompt.run.call_count == 3
+
+
+@pytest.mark.parametrize("install", ["wheelhouse", "offline"])
+def test_python_environment_wheelhouse(testdirectory, install):
+
+    prompt = mock.Mock()
+    virtual_environment = mock.Mock()
+    log = mock.Mock()
+    requirements = testdirectory.write_text(
+        filename="requirements.txt", data="sphinx", encoding="utf-8"
+    )
+    wheelhouse_path = os.path.join(testdirectory.path(), "wheelhouse")
+
+    env = {"PATH": "/oki/doki"}
+    virtual_environment.create_environment.side_effect = lambda name, base_name: env
+    virtual_environment.path.side_effect = lambda name: testdirectory.path()
+    prompt.run.return_value.stdout = "sphinx==1.0.0\n"
+
+    python_environment = giit.python_environment.PythonEnvironment(
+        prompt=prompt,
+        virtual_environment=virtual_environment,
+        log=log,
+        wheelhouse_path=wheelhouse_path,
+        install=install,
+    )
+
+    python_environment.from_requirements(requirements=requirements, pip_packages=None)
+
+    wheel = "python -m pip wheel --find-links {0} -w {0} -r {1}".format(
+        wheelhouse_path, requirements
+    )
+    offline = "python -m pip install -U --no-index --find-links {} -r {}".format(
+        wheelhouse_path, requirements
+    )
+
+    commands = [c.kwargs["command"] for c in prompt.run.call_args_list]
+
+    if install == "wheelhouse":
+        assert commands[:2] == [wheel, offline]
+    else:
+        assert commands[:1] == [offline]
+
+
+def test_python_environment_closest(testdirectory):
+
+    prompt = mock.Mock()
+    env = mock.Mock()
+    log = mock.Mock()
+    prompt.run.return_value.stdout = ""
+
+    def create_environment(path, base_path=None):
+        os.makedirs(path)
+        return {}
+
+    env.create_environment.side_effect = create_environment
+
+    root_dir = testdirectory.mkdir("virtualenvs")
+
+    virtual_environment = giit.name_to_path_adapter.NameToPathAdapter(
+        env=env, root_path=root_dir.path()
+    )
+
+    python_environment = giit.python_environment.PythonEnvironment(
+        prompt=prompt, virtual_environment=virtual_environment, log=log
+    )
+
+    # Two existing sealed environments
+    for requirements, freeze in [
+        ("sphinx==1.0.0", ["Sphinx==1.0.0", "Jinja2==2.0"]),
+        ("sphinx==2.0.0", ["Sphinx==2.0.0", "Jinja2==3.0"]),
+    ]:
+        name = python_environment.environment_name(
+            requirements_content=requirements, pip_packages=None
+        )
+        env_dir = root_dir.mkdir(name)
+        env_dir.write_text(
+            "giit-seal.json",
+            json.dumps({"time": 0.0, "freeze": freeze}),
+            encoding="utf-8",
+        )
+
+    requirements = testdirectory.write_text(
+        filename="requirements.txt",
+        data="sphinx==2.0.0\nsphinx_rtd_theme==1.0.0\n",
+        encoding="utf-8",
+    )
+
+    python_environment.from_requirements(requirements=requirements, pip_packages=None)
+
+    base_name = python_environment.environment_name(
+        requirements_content="sphinx==2.0.0", pip_packages=None
+    )
+
+    _, kwargs = env.create_environment.call_args
+    assert kwargs["base_path"] == os.path.join(root_dir.path(), base_name)
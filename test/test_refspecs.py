@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import giit.config
+import giit.refspecs
+
+
+def test_branch_refspec():
+
+    assert (
+        giit.refspecs.branch_refspec(remote_branch="origin/bug/567")
+        == "+refs/heads/bug/567:refs/remotes/origin/bug/567"
+    )
+
+
+def test_from_configs():
+
+    config = giit.config.validate_config(
+        config={
+            "scripts": ["ok"],
+            "branches.regex.filters": ["origin/master", "origin/release/1\\.0$"],
+            "tags.semver.filters": [">=1.0.0"],
+        }
+    )
+
+    refspecs, tags = giit.refspecs.from_configs(configs=[config], current_branch=None)
+
+    assert refspecs == [
+        "+refs/heads/master*:refs/remotes/origin/master*",
+        "+refs/heads/release/1.0:refs/remotes/origin/release/1.0",
+    ]
+    assert tags
+
+
+def test_from_configs_all_branches():
+
+    config = giit.config.validate_config(
+        config={"scripts": ["ok"], "branches.regex.filters": ["origin/(\\d+)-LTS"]}
+    )
+
+    refspecs, tags = giit.refspecs.from_configs(configs=[config], current_branch=None)
+
+    assert refspecs == [giit.refspecs.ALL_BRANCHES]
+    assert not tags
+
+
+def test_from_configs_source_branch():
+
+    config = giit.config.validate_config(
+        config={"scripts": ["ok"], "branches.source_branch": True}
+    )
+
+    refspecs, tags = giit.refspecs.from_configs(
+        configs=[config], current_branch="feature"
+    )
+
+    assert refspecs == ["+refs/heads/feature:refs/remotes/origin/feature"]
+    assert not tags
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import giit.tag_index
+
+
+def test_tag_index():
+
+    # In the lexical order of git tag -l
+    tags = ["1.0.0", "1.0.1", "1.1.0", "1.10.0", "1.2.0", "2.0.0", "docs", "1.9.3"]
+
+    index = giit.tag_index.TagIndex(tags=tags, relaxed=False)
+
+    def match(tag):
+        return True
+
+    assert index.select(match=match) == [
+        "2.0.0",
+        "1.10.0",
+        "1.9.3",
+        "1.2.0",
+        "1.1.0",
+        "1.0.1",
+        "1.0.0",
+        "docs",
+    ]
+
+    assert index.select(match=match, limit=3) == ["2.0.0", "1.10.0", "1.9.3"]
+
+    assert index.select(match=match, latest_per="major") == ["2.0.0", "1.10.0", "docs"]
+
+    # The latest patch release of each minor version
+    assert index.select(match=lambda tag: tag.startswith("1."), latest_per="minor") == [
+        "1.10.0",
+        "1.9.3",
+        "1.2.0",
+        "1.1.0",
+        "1.0.1",
+    ]
+
+
+def test_tag_index_relaxed():
+
+    index = giit.tag_index.TagIndex(tags=["1.2", "1.10", "1.9"], relaxed=True)
+
+    assert index.select(match=lambda tag: True) == ["1.10", "1.9", "1.2"]
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import threading
+
+import pytest
+
+import giit.task_graph
+
+
+def test_task_graph():
+
+    graph = giit.task_graph.TaskGraph()
+
+    a = graph.add(item="a")
+    b = graph.add(item="b")
+    c = graph.add(item="c", dependencies=[a, b])
+    graph.add(item="d", dependencies=[c])
+
+    assert len(graph) == 4
+
+    with pytest.raises(ValueError):
+        graph.add(item="e", dependencies=[10])
+
+    order = []
+    lock = threading.Lock()
+
+    def run(item):
+        with lock:
+            order.append(item)
+        return item.upper()
+
+    assert graph.run(function=run) == ["A", "B", "C", "D"]
+    assert order == ["a", "b", "c", "d"]
+
+    del order[:]
+
+    assert graph.run(function=run, jobs=2) == ["A", "B", "C", "D"]
+    assert sorted(order[:2]) == ["a", "b"]
+    assert order[2:] == ["c", "d"]
+
+
+def test_task_graph_error():
+
+    graph = giit.task_graph.TaskGraph()
+
+    a = graph.add(item="a")
+    graph.add(item="b", dependencies=[a])
+    graph.add(item="c")
+
+    ran = []
+
+    def run(item):
+        ran.append(item)
+        if item == "a":
+            raise RuntimeError("a failed")
+
+    # The dependents of a failed item are not run
+    with pytest.raises(RuntimeError):
+        graph.run(function=run, jobs=2)
+
+    assert "b" not in ran
+
+
+def test_task_graph_costs():
+
+    graph = giit.task_graph.TaskGraph()
+
+    short = graph.add(item="short")
+    graph.add(item="long")
+    graph.add(item="after_short", dependencies=[short])
+    graph.add(item="workingtree", first=True)
+
+    order = []
+
+    # The items on the longest path are started first, after the items
+    # which must run first
+    graph.run(function=order.append, costs=[1.0, 5.0, 10.0, 1.0])
+    assert order == ["workingtree", "short", "after_short", "long"]
+
+    del order[:]
+
+    graph.run(function=order.append, costs=[1.0, 5.0, 1.0, 1.0])
+    assert order == ["workingtree", "long", "short", "after_short"]
+
+    # Without costs the items run in the order they were added
+    del order[:]
+
+    graph.run(function=order.append)
+    assert order == ["workingtree", "short", "long", "after_short"]
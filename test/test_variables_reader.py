@@ -84,3 +84,58 @@ def test_optional_pound():
 
     r = v.expand(element="£removed$build_path £replaced you get ££10")
     assert r == "/tmp/build great success! you get £10"
+
+
+def test_variables_escape():
+
+    context = {"scope": "tag", "checkout": "1.0.0", "build_path": "/tmp/build"}
+
+    v = giit.variables_reader.VariablesReader(variables={}, context=context)
+
+    assert v.expand(element="$$HOME ${build_path}/x") == "$HOME /tmp/build/x"
+
+    with pytest.raises(ValueError):
+        v.expand(element="price: $ 10")
+
+
+def test_variables_cycle():
+
+    # The cycle is found when compiling, not when a task expands it
+    with pytest.raises(RuntimeError) as error:
+        giit.variables_reader.CompiledVariables(
+            variables={"a": "${b}", "tag:b": "x ${c}", "c": "${a}"}
+        )
+
+    assert "a -> tag:b -> c -> a" in str(error.value)
+
+    with pytest.raises(RuntimeError):
+        giit.variables_reader.CompiledVariables(
+            variables={"a": "${a}", "tag:1.0.0:a": "ok"}
+        )
+
+    # The variables only refer to each other in different scopes
+    giit.variables_reader.CompiledVariables(
+        variables={"tag:a": "${b}", "branch:b": "${a}", "a": "x", "b": "y"}
+    )
+
+
+def test_compiled_variables():
+
+    variables = giit.variables_reader.CompiledVariables(
+        variables={"tag:out": "${build_path}/${name}", "tag:1.0.0:out": "latest"}
+    )
+
+    names = []
+
+    for name in ["1.0.0", "2.0.0"]:
+        context = {
+            "scope": "tag",
+            "checkout": name,
+            "name": name,
+            "build_path": "/tmp/build",
+        }
+
+        reader = variables.reader(context=context)
+        names.append(reader.expand(element="${out}"))
+
+    assert names == ["latest", "/tmp/build/2.0.0"]
@@ -4,6 +4,7 @@
 import mock
 import os
 import sys
+import pytest
 
 import giit.virtualenv as virtualenv
 
@@ -14,6 +15,8 @@ def test_virtualenv(testdirectory):
     log = mock.Mock()
     path = os.path.join(testdirectory.path(), "virtualenv")
 
+    prompt.run.side_effect = lambda command: os.makedirs(path, exist_ok=True)
+
     virtual_environment = virtualenv.VirtualEnv(prompt=prompt, log=log)
 
     env = virtual_environment.create_environment(path=path)
@@ -28,3 +31,121 @@ def test_virtualenv(testdirectory):
 
     # We should be first in the PATH environment variable
     assert env["PATH"].startswith(expected_path)
+
+
+def write_file(directory, filename, content):
+    path = os.path.join(directory.path(), filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "w") as f:
+        f.write(content)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the POSIX layout")
+def test_virtualenv_copy_packages(testdirectory):
+
+    prompt = mock.Mock()
+    log = mock.Mock()
+
+    base_dir = testdirectory.mkdir("base")
+    site_packages = "lib/python3.8/site-packages/"
+
+    write_file(base_dir, site_packages + "foo/__init__.py", "")
+    write_file(base_dir, site_packages + "foo-1.0.dist-info/RECORD", "")
+    write_file(base_dir, site_packages + "pip-19.0.dist-info/RECORD", "")
+    write_file(base_dir, "bin/foo", "#!{}/bin/python\n".format(base_dir.path()))
+
+    new_dir = testdirectory.mkdir("new")
+    write_file(new_dir, site_packages + "pip-20.0.dist-info/RECORD", "")
+    new_dir.mkdir("bin")
+
+    virtual_environment = virtualenv.VirtualEnv(prompt=prompt, log=log)
+    virtual_environment._copy_packages(base_path=base_dir.path(), path=new_dir.path())
+
+    assert new_dir.contains_file(site_packages + "foo/__init__.py")
+    assert new_dir.contains_file(site_packages + "foo-1.0.dist-info/RECORD")
+
+    # The other version of pip is not copied
+    assert not new_dir.contains_dir(site_packages + "pip-19.0.dist-info")
+
+    # The packages are hardlinked
+    base_file = os.path.join(base_dir.path(), site_packages, "foo", "__init__.py")
+    new_file = os.path.join(new_dir.path(), site_packages, "foo", "__init__.py")
+    assert os.stat(base_file).st_ino == os.stat(new_file).st_ino
+
+    # The scripts use the Python of the new virtualenv
+    with open(os.path.join(new_dir.path(), "bin", "foo")) as f:
+        assert f.read() == "#!{}/bin/python\n".format(new_dir.path())
+
+
+def test_virtualenv_incomplete(testdirectory):
+
+    prompt = mock.Mock()
+    log = mock.Mock()
+
+    # A virtualenv where the creation was interrupted
+    venv_dir = testdirectory.mkdir("virtualenv")
+    venv_dir.write_text("half.txt", "", encoding="utf-8")
+
+    prompt.run.side_effect = lambda command: os.makedirs(venv_dir.path(), exist_ok=True)
+
+    virtual_environment = virtualenv.VirtualEnv(prompt=prompt, log=log)
+    virtual_environment.create_environment(path=venv_dir.path())
+
+    # It was created again
+    prompt.run.assert_called_once_with(
+        command=["python", "-m", "virtualenv", venv_dir.path()]
+    )
+    assert not venv_dir.contains_file("half.txt")
+    assert venv_dir.contains_file(virtualenv.VirtualEnv.COMPLETE_FILE)
+    assert not venv_dir.contains_file(virtualenv.VirtualEnv.INCOMPLETE_FILE)
+
+    # Now it is used as it is
+    prompt.run.reset_mock()
+    virtual_environment.create_environment(path=venv_dir.path())
+    assert not prompt.run.called
+
+
+def test_virtualenv_adopt(testdirectory):
+
+    prompt = mock.Mock()
+    log = mock.Mock()
+
+    # A working virtualenv created by an earlier version without the marker
+    venv_dir = testdirectory.mkdir("virtualenv")
+    scripts = "Scripts" if sys.platform == "win32" else "bin"
+    python = "python.exe" if sys.platform == "win32" else "python"
+    venv_dir.mkdir(scripts).write_text(python, "", encoding="utf-8")
+
+    virtual_environment = virtualenv.VirtualEnv(prompt=prompt, log=log)
+    virtual_environment.create_environment(path=venv_dir.path())
+
+    # The interpreter was checked and the virtualenv kept
+    prompt.run.assert_called_once_with(
+        command=[os.path.join(venv_dir.path(), scripts, python), "-c", "import pip"]
+    )
+    assert venv_dir.contains_file(os.path.join(scripts, python))
+    assert venv_dir.contains_file(virtualenv.VirtualEnv.COMPLETE_FILE)
+
+
+def test_virtualenv_interrupted(testdirectory):
+
+    prompt = mock.Mock()
+    log = mock.Mock()
+
+    # The interpreter was copied, but the creation was interrupted
+    venv_dir = testdirectory.mkdir("virtualenv")
+    scripts = "Scripts" if sys.platform == "win32" else "bin"
+    python = "python.exe" if sys.platform == "win32" else "python"
+    venv_dir.mkdir(scripts).write_text(python, "", encoding="utf-8")
+    venv_dir.write_text(virtualenv.VirtualEnv.INCOMPLETE_FILE, "", encoding="utf-8")
+
+    virtual_environment = virtualenv.VirtualEnv(prompt=prompt, log=log)
+    virtual_environment.create_environment(path=venv_dir.path())
+
+    # It was not adopted but created again
+    prompt.run.assert_called_once_with(
+        command=["python", "-m", "virtualenv", venv_dir.path()]
+    )
+    assert not venv_dir.contains_file(os.path.join(scripts, python))
+    assert venv_dir.contains_file(virtualenv.VirtualEnv.COMPLETE_FILE)